@@ -0,0 +1,767 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from PIL import Image
+
+from disk_crawler import run_crawl
+from file_processor import (
+	get_file_settings,
+	hash_file,
+)
+from folder_processor import FolderWalker
+from hash_algorithms import resolve_hash_name
+from image_processor import get_image_settings
+from inventory_index import InventoryIndex
+from inventory_processor import (
+	INVENTORY_BACKENDS,
+	inventory_settings,
+	apply_journal_entry,
+)
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+	recursive_update,
+)
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+# GLOBAL VARIABLES
+EXIF_TAG_DATETIME = 0x0132
+EXIF_TAG_MAKE = 0x010f
+EXIF_TAG_MODEL = 0x0110
+EXIF_DEVICES = [
+	("Canon", "EOS 5D"),
+	("NIKON", "D750"),
+	("Apple", "iPhone 12"),
+]
+INDEX_EXTENSIONS = ["jpg", "png", "mp4", "pdf", "txt", "bin"]
+INDEX_PROJECTED_ENTRIES = 10_000_000
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+benchmark_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+# FUNCTIONS
+def get_file_size(
+		random_generator:random.Random,
+		size_distribution:list,
+) -> int:
+	"""
+	Draw a file size from weighted size ranges
+	"""
+	size_range = random_generator.choices(
+		size_distribution,
+		weights=[size_range["weight"] for size_range in size_distribution],
+	)[0]
+
+	return random_generator.randint(size_range["min"], size_range["max"])
+
+def write_image(
+		file_path:str,
+		random_generator:random.Random,
+		image_size:list,
+		with_exif:bool,
+):
+	"""
+	Write a noise JPEG image, optionally with EXIF date and device
+	"""
+	width, height = image_size
+	image_object = Image.frombytes(
+		'RGB',
+		(width, height),
+		random_generator.randbytes(width * height * 3),
+	)
+
+	exif_data = Image.Exif()
+	if with_exif:
+		make, model = random_generator.choice(EXIF_DEVICES)
+		exif_data[EXIF_TAG_MAKE] = make
+		exif_data[EXIF_TAG_MODEL] = model
+		exif_data[EXIF_TAG_DATETIME] = time.strftime(
+			"%Y:%m:%d %H:%M:%S",
+			time.gmtime(random_generator.randint(946684800, 1609459200)),
+		)
+
+	image_object.save(
+		file_path,
+		format='JPEG',
+		exif=exif_data,
+	)
+
+def generate_tree(
+		root_path:str,
+		tree_settings:dict,
+) -> dict:
+	"""
+	Generate a reproducible synthetic folder tree
+	"""
+	random_generator = random.Random(tree_settings["seed"])
+	generated_files = list()
+	tree_stats = {
+		"files": 0,
+		"bytes": 0,
+		"folders": 0,
+		"duplicates": 0,
+		"images": 0,
+		"images_with_exif": 0,
+	}
+
+	folder_stack = [(root_path, 0)]
+	while folder_stack:
+		folder_path, folder_depth = folder_stack.pop()
+		os.makedirs(folder_path, exist_ok=True)
+		tree_stats["folders"] += 1
+
+		for file_index in range(tree_settings["files_per_folder"]):
+			if (
+				generated_files
+				and random_generator.random() < tree_settings["duplicate_ratio"]
+			):
+				source_path = random_generator.choice(generated_files)
+				file_path = os.path.join(
+					folder_path,
+					f'duplicate_{file_index}{os.path.splitext(source_path)[1]}',
+				)
+				shutil.copyfile(source_path, file_path)
+				tree_stats["duplicates"] += 1
+
+			elif random_generator.random() < tree_settings["image_ratio"]:
+				with_exif = random_generator.random() < tree_settings["exif_ratio"]
+				file_path = os.path.join(folder_path, f'image_{file_index}.jpg')
+				write_image(
+					file_path=file_path,
+					random_generator=random_generator,
+					image_size=tree_settings["image_size"],
+					with_exif=with_exif,
+				)
+				tree_stats["images"] += 1
+				tree_stats["images_with_exif"] += int(with_exif)
+
+			else:
+				file_path = os.path.join(folder_path, f'file_{file_index}.bin')
+				with open(file_path, 'wb') as file_descriptor:
+					file_descriptor.write(
+						random_generator.randbytes(
+							get_file_size(
+								random_generator=random_generator,
+								size_distribution=tree_settings["size_distribution"],
+							)
+						)
+					)
+
+			generated_files.append(file_path)
+			tree_stats["files"] += 1
+			tree_stats["bytes"] += os.path.getsize(file_path)
+
+		if folder_depth < tree_settings["depth"]:
+			for folder_index in range(tree_settings["fanout"]):
+				folder_stack.append((
+					os.path.join(folder_path, f'folder_{folder_index}'),
+					folder_depth + 1,
+				))
+
+	return tree_stats
+
+def get_rates(
+		elapsed_seconds:float,
+		files_count:int,
+		bytes_count:int=None,
+) -> dict:
+	"""
+	Get files/s and MB/s rates of a stage
+	"""
+	stage_stats = {
+		"seconds": elapsed_seconds,
+		"files": files_count,
+		"files_per_second": files_count / elapsed_seconds if elapsed_seconds > 0 else float(0),
+	}
+
+	if bytes_count is not None:
+		stage_stats["bytes"] = bytes_count
+		stage_stats["mb_per_second"] = (
+			bytes_count / (1024 * 1024) / elapsed_seconds
+			if elapsed_seconds > 0 else float(0)
+		)
+
+	return stage_stats
+
+def get_peak_rss() -> dict:
+	"""
+	Get peak resident memory in KB, when the platform exposes it
+	"""
+	if resource is None:
+		return None
+
+	scale = 1024 if sys.platform == 'darwin' else 1
+	return {
+		"self_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+		"children_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+	}
+
+def benchmark_hashes(
+		file_paths:list,
+		hash_names:list,
+) -> dict:
+	"""
+	Time each hash algorithm alone over the same files,
+	which are expected to be in page cache already
+	"""
+	hash_results = dict()
+
+	for hash_name in hash_names:
+		computed_name = resolve_hash_name(hash_name)
+		hashed_bytes = 0
+		start_time = time.perf_counter()
+
+		for file_path in file_paths:
+			with open(file_path, 'rb', buffering=0) as file_descriptor:
+				hash_dict, file_bytes, header_bytes = hash_file(
+					file_descriptor=file_descriptor,
+					hash_names=[computed_name],
+				)
+			hashed_bytes += file_bytes
+
+		hash_results[hash_name] = get_rates(
+			elapsed_seconds=time.perf_counter() - start_time,
+			files_count=len(file_paths),
+			bytes_count=hashed_bytes,
+		)
+		hash_results[hash_name]["computed"] = computed_name
+
+	return hash_results
+
+def benchmark_stages(
+		root_path:str,
+		work_path:str,
+		backend_name:str,
+) -> dict:
+	"""
+	Time walk, hash, EXIF and store stages one after the other
+	"""
+	stage_results = dict()
+	found_files = list()
+
+	start_time = time.perf_counter()
+	walk_stats = FolderWalker(
+		file_handler=lambda file_path, file_stat: found_files.append(file_path),
+	).walk(
+		folder_paths=[root_path],
+	)
+	stage_results["walk"] = get_rates(
+		elapsed_seconds=time.perf_counter() - start_time,
+		files_count=len(found_files),
+	)
+	stage_results["walk"]["entries_per_second"] = walk_stats["entries_per_second"]
+
+	entries = list()
+	hashed_bytes = 0
+	start_time = time.perf_counter()
+	for file_path in found_files:
+		file_hash, file_details, header_bytes = get_file_settings(file_path)
+		hashed_bytes += file_details["file"]["bytes"]
+		entries.append({
+			"hashes": {
+				file_hash: file_details
+			}
+		})
+	stage_results["hash"] = get_rates(
+		elapsed_seconds=time.perf_counter() - start_time,
+		files_count=len(found_files),
+		bytes_count=hashed_bytes,
+	)
+
+	stage_results["hash_algorithms"] = benchmark_hashes(
+		file_paths=found_files,
+		hash_names=benchmark_settings.get("hash_algorithms", ["md5"]),
+	)
+
+	image_paths = [
+		file_path
+		for file_path in found_files
+		if file_path.endswith('.jpg')
+	]
+	start_time = time.perf_counter()
+	for file_path in image_paths:
+		get_image_settings(file_path)
+	stage_results["exif"] = get_rates(
+		elapsed_seconds=time.perf_counter() - start_time,
+		files_count=len(image_paths),
+	)
+
+	backend = INVENTORY_BACKENDS[backend_name](
+		**get_backend_options(
+			backend_name=backend_name,
+			work_path=os.path.join(work_path, 'stages'),
+		)
+	)
+	batch_size = inventory_settings.get("writer_batch_size", 500)
+	start_time = time.perf_counter()
+	for batch_start in range(0, len(entries), batch_size):
+		backend.store(
+			entries=entries[batch_start:batch_start + batch_size],
+		)
+	backend.close()
+	stage_results["store"] = get_rates(
+		elapsed_seconds=time.perf_counter() - start_time,
+		files_count=len(entries),
+	)
+
+	return stage_results
+
+def make_entry(
+		entry_index:int,
+		random_generator:random.Random,
+) -> dict:
+	"""
+	Get a synthetic inventory entry shaped as process_file output
+	"""
+	file_extension = random_generator.choice(INDEX_EXTENSIONS)
+	file_details = {
+		"file": {
+			"bytes": random_generator.randint(1024, 8388608),
+			"type": "image" if file_extension in ("jpg", "png") else "unknown",
+			"path": f'/srv/share/folder_{entry_index % 1000}/file_{entry_index}.{file_extension}',
+			"name": f'file_{entry_index}',
+			"extension": file_extension,
+		},
+		"hash": {
+			"md5": random_generator.randbytes(16).hex(),
+			"sha256": random_generator.randbytes(32).hex(),
+		},
+		"date": {
+			"date_type": "CREATION",
+			"date_field": "mtime",
+			"date_confidence": "Medium",
+			"date_timestamp": float(1600000000 + entry_index),
+			"date_human": "2020-09-13 - 12:26:40",
+		},
+	}
+
+	if file_details["file"]["type"] == "image":
+		make, model = random_generator.choice(EXIF_DEVICES)
+		file_details["quality"] = {
+			"resolution": {
+				"width": 4032,
+				"height": 3024,
+			},
+			"format": "jpeg",
+			"mode": "rgb",
+		}
+		file_details["device"] = {
+			"Make": make,
+			"Model": model,
+			"Artist": None,
+		}
+
+	return {
+		"hashes": {
+			file_details["hash"]["md5"]: file_details
+		}
+	}
+
+def make_overlap_entries(
+		entry_count:int,
+		seed:int,
+		overlap_ratio:float,
+) -> list:
+	"""
+	Get entries holding the same content as the first entries
+	generated from seed, found at another path
+	"""
+	merge_entries = list()
+	random_generator = random.Random(seed)
+
+	for entry_index in range(int(entry_count * overlap_ratio)):
+		entry_dict = make_entry(entry_index, random_generator)
+		for file_details in entry_dict["hashes"].values():
+			file_details["file"]["path"] = file_details["file"]["path"] + '.copy'
+		merge_entries.append(entry_dict)
+
+	return merge_entries
+
+def build_inventories(
+		entry_count:int,
+		seed:int,
+		overlap_ratio:float=0.5,
+):
+	"""
+	Build the nested dict inventory and the compact index from the
+	same synthetic entries, then merge a second, overlapping batch
+	"""
+	results = {
+		"dict": dict(),
+		"index": dict(),
+	}
+	inventory_dict = dict()
+	inventory_index = InventoryIndex()
+
+	for layout, add_entry in (
+		("dict", lambda entry_dict: apply_journal_entry(inventory_dict, entry_dict)),
+		("index", inventory_index.add_entry),
+	):
+		random_generator = random.Random(seed)
+		start_time = time.perf_counter()
+		for entry_index in range(entry_count):
+			add_entry(make_entry(entry_index, random_generator))
+		results[layout]["build_seconds"] = time.perf_counter() - start_time
+
+	merge_entries = make_overlap_entries(
+		entry_count=entry_count,
+		seed=seed,
+		overlap_ratio=overlap_ratio,
+	)
+
+	start_time = time.perf_counter()
+	for entry_dict in merge_entries:
+		apply_journal_entry(inventory_dict, entry_dict)
+	results["dict"]["merge_seconds"] = time.perf_counter() - start_time
+
+	merge_index = InventoryIndex()
+	for entry_dict in merge_entries:
+		merge_index.add_entry(entry_dict)
+	start_time = time.perf_counter()
+	inventory_index.merge(merge_index)
+	results["index"]["merge_seconds"] = time.perf_counter() - start_time
+	results["merged_entries"] = len(merge_entries)
+
+	return results
+
+def measure_inventory_memory(
+		entry_count:int,
+		seed:int,
+) -> dict:
+	"""
+	Get bytes retained per entry by each layout, entries
+	being generated inside the traced section and only kept
+	through the references the layout holds
+	"""
+	memory_results = dict()
+
+	for layout in ("dict", "index"):
+		random_generator = random.Random(seed)
+		inventory_dict = dict()
+		inventory_index = InventoryIndex()
+
+		tracemalloc.start()
+		for entry_index in range(entry_count):
+			entry_dict = make_entry(entry_index, random_generator)
+			if layout == "dict":
+				apply_journal_entry(inventory_dict, entry_dict)
+			else:
+				inventory_index.add_entry(entry_dict)
+		del entry_dict
+		retained_bytes = tracemalloc.get_traced_memory()[0]
+		tracemalloc.stop()
+
+		memory_results[layout] = {
+			"bytes_per_entry": retained_bytes / entry_count,
+			"projected_mb": retained_bytes / entry_count * INDEX_PROJECTED_ENTRIES / (1024 * 1024),
+		}
+
+	return memory_results
+
+def benchmark_index(
+		index_settings:dict,
+) -> dict:
+	"""
+	Compare nested dict and compact index inventories on build
+	time, merge time and memory, memory being measured on a sample
+	and projected to INDEX_PROJECTED_ENTRIES entries
+	"""
+	entry_count = index_settings["entries"]
+	sample_count = min(entry_count, index_settings["memory_sample"])
+
+	index_results = build_inventories(
+		entry_count=entry_count,
+		seed=index_settings["seed"],
+	)
+	memory_results = measure_inventory_memory(
+		entry_count=sample_count,
+		seed=index_settings["seed"],
+	)
+
+	for layout, layout_memory in memory_results.items():
+		index_results[layout].update(layout_memory)
+
+	index_results["entries"] = entry_count
+	index_results["memory_sample"] = sample_count
+	index_results["projected_entries"] = INDEX_PROJECTED_ENTRIES
+
+	logger.info(
+		f'Benchmarked inventory layouts with index_results="{index_results}"'
+	)
+
+	return index_results
+
+def apply_legacy_entry(
+		inventory_dict:dict,
+		entry_dict:dict,
+) -> dict:
+	"""
+	Merge a journal entry with recursive_update, as
+	inventories were merged before the merge engine
+	"""
+	for section, section_items in entry_dict.items():
+		section_dict = inventory_dict.setdefault(section, dict())
+
+		for key, value in section_items.items():
+			if key in section_dict:
+				section_dict[key] = recursive_update(
+					src_item=section_dict.get(key),
+					new_item=value,
+				)
+			else:
+				section_dict[key] = value
+
+	return inventory_dict
+
+def count_field_types(
+		inventory_dict:dict,
+) -> dict:
+	"""
+	Count the types found for path and timestamp fields,
+	a type-stable merge holding a single type per field
+	"""
+	field_types = {
+		"path": dict(),
+		"date_timestamp": dict(),
+	}
+
+	for file_details in inventory_dict.get("hashes", dict()).values():
+		for field_name, field_value in (
+			("path", file_details["file"]["path"]),
+			("date_timestamp", file_details["date"]["date_timestamp"]),
+		):
+			type_name = type(field_value).__name__
+			field_types[field_name][type_name] = field_types[field_name].get(type_name, 0) + 1
+
+	return field_types
+
+def benchmark_merge(
+		merge_settings:dict,
+) -> dict:
+	"""
+	Compare the merge engine with the former recursive_update
+	merge on the same synthetic journal, part of the contents
+	being seen a second time at another path
+	"""
+	entry_count = merge_settings["entries"]
+	seed = merge_settings["seed"]
+	merge_results = {
+		"entries": entry_count,
+	}
+
+	for implementation, apply_entry in (
+		("recursive_update", apply_legacy_entry),
+		("merge_engine", apply_journal_entry),
+	):
+		inventory_dict = dict()
+		random_generator = random.Random(seed)
+		journal_entries = [
+			make_entry(entry_index, random_generator)
+			for entry_index in range(entry_count)
+		]
+		journal_entries.extend(
+			make_overlap_entries(
+				entry_count=entry_count,
+				seed=seed,
+				overlap_ratio=merge_settings["overlap_ratio"],
+			)
+		)
+
+		start_time = time.perf_counter()
+		for entry_dict in journal_entries:
+			apply_entry(inventory_dict, entry_dict)
+		elapsed_seconds = time.perf_counter() - start_time
+
+		merge_results[implementation] = {
+			"seconds": elapsed_seconds,
+			"entries_per_second": len(journal_entries) / elapsed_seconds,
+			"field_types": count_field_types(inventory_dict),
+		}
+
+	logger.info(
+		f'Benchmarked inventory merge with merge_results="{merge_results}"'
+	)
+
+	return merge_results
+
+def get_backend_options(
+		backend_name:str,
+		work_path:str,
+) -> dict:
+	"""
+	Get backend options storing the inventory below a work folder
+	"""
+	os.makedirs(work_path, exist_ok=True)
+
+	if backend_name == "sqlite":
+		return {
+			"database_file": os.path.join(work_path, 'hash_inventory.sqlite'),
+		}
+
+	return {
+		"snapshot_file": os.path.join(work_path, 'hash_inventory.json'),
+		"journal_file": os.path.join(work_path, 'hash_inventory.jsonl'),
+	}
+
+def run_benchmark(
+		root_path:str,
+		execution_mode:str,
+		worker_count:int,
+		backend_name:str,
+) -> dict:
+	"""
+	Generate a synthetic tree then measure stages and full pipeline
+	"""
+	tree_settings = benchmark_settings["tree"]
+	work_path = tempfile.mkdtemp(prefix=SCRIPT_NAME + '_')
+
+	try:
+		start_time = time.perf_counter()
+		tree_stats = generate_tree(
+			root_path=root_path,
+			tree_settings=tree_settings,
+		)
+		tree_stats["seconds"] = time.perf_counter() - start_time
+
+		logger.info(
+			f'Generated synthetic tree at root_path="{root_path}" '
+			f'with tree_stats="{tree_stats}"'
+		)
+
+		stage_results = benchmark_stages(
+			root_path=root_path,
+			work_path=work_path,
+			backend_name=backend_name,
+		)
+
+		start_time = time.perf_counter()
+		crawl_stats = run_crawl(
+			folder_paths=[root_path],
+			execution_mode=execution_mode,
+			worker_count=worker_count,
+			backend_name=backend_name,
+			backend_options=get_backend_options(
+				backend_name=backend_name,
+				work_path=os.path.join(work_path, 'pipeline'),
+			),
+			cache_file=os.path.join(work_path, 'change_cache.jsonl'),
+			incremental=False,
+			checkpoint_file=os.path.join(work_path, 'crawl_checkpoint.json'),
+		)
+		pipeline_stats = get_rates(
+			elapsed_seconds=time.perf_counter() - start_time,
+			files_count=tree_stats["files"],
+			bytes_count=tree_stats["bytes"],
+		)
+		pipeline_stats.update(crawl_stats)
+
+	finally:
+		shutil.rmtree(work_path, ignore_errors=True)
+
+	return {
+		"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"platform": platform.platform(),
+		"python": platform.python_version(),
+		"parameters": {
+			"tree": tree_settings,
+			"execution_mode": execution_mode,
+			"worker_count": worker_count,
+			"backend": backend_name,
+		},
+		"tree": tree_stats,
+		"stages": stage_results,
+		"pipeline": pipeline_stats,
+		"index": benchmark_index(
+			index_settings=benchmark_settings["index"],
+		),
+		"merge": benchmark_merge(
+			merge_settings=benchmark_settings["merge"],
+		),
+		"peak_rss": get_peak_rss(),
+	}
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Benchmark the crawler on a synthetic folder tree',
+	)
+	parser.add_argument(
+		'--root',
+		default=None,
+		help='folder where the synthetic tree is generated, kept after run',
+	)
+	parser.add_argument(
+		'--mode',
+		default='process',
+		choices=['thread', 'process', 'asyncio'],
+	)
+	parser.add_argument(
+		'--workers',
+		type=int,
+		default=None,
+	)
+	parser.add_argument(
+		'--backend',
+		default='journal',
+		choices=sorted(INVENTORY_BACKENDS),
+	)
+	parser.add_argument(
+		'--output',
+		default=None,
+		help='JSON file receiving results, printed when omitted',
+	)
+	arguments = parser.parse_args()
+
+	root_path = arguments.root
+	if root_path is None:
+		root_path = tempfile.mkdtemp(prefix=SCRIPT_NAME + '_tree_')
+
+	try:
+		benchmark_results = run_benchmark(
+			root_path=root_path,
+			execution_mode=arguments.mode,
+			worker_count=arguments.workers,
+			backend_name=arguments.backend,
+		)
+
+	finally:
+		if arguments.root is None:
+			shutil.rmtree(root_path, ignore_errors=True)
+
+	benchmark_json = json.dumps(
+		benchmark_results,
+		indent=4,
+	)
+
+	if arguments.output is None:
+		print(benchmark_json)
+
+	else:
+		with open(arguments.output, 'w', encoding='utf8') as output_file:
+			output_file.write(benchmark_json)
@@ -0,0 +1,173 @@
+import os
+import json
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+# GLOBAL VARIABLES
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_CACHE = os.path.join(SCRIPT_HOME, 'var', 'lib', 'change_cache.jsonl')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class ChangeCacheWriter:
+	"""
+	Build the change cache of current run next to the previous one,
+	only replacing it once the run stopped; a partial run keeps
+	previous entries of files it did not reach
+	"""
+
+	def __init__(
+			self,
+			cache_file:str=PATH_FILE_CACHE,
+			signature:str=None,
+	):
+		self.cache_file = cache_file
+		self.signature = signature
+		self.temporary_file = cache_file + '.tmp'
+		os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+		self.cache_stream = open(self.temporary_file, 'w', encoding='utf8')
+		self.cache_stream.write(
+			json.dumps({
+				"signature": signature,
+			}) + '\n'
+		)
+		self.count = 0
+		self.file_paths = set()
+
+	def append(
+			self,
+			file_path:str,
+			stat_key:list,
+			entry_dict:dict,
+	):
+		self.cache_stream.write(
+			json.dumps({
+				"path": file_path,
+				"key": list(stat_key),
+				"entry": entry_dict,
+			}) + '\n'
+		)
+		self.count += 1
+		self.file_paths.add(file_path)
+
+	def append_previous(self):
+		"""
+		Copy entries of the previous cache for files
+		not written by current run
+		"""
+		merged_count = 0
+
+		try:
+			with open(self.cache_file, 'r', encoding='utf8') as cache_stream:
+				cache_header = json.loads(cache_stream.readline() or '{}')
+
+				if cache_header.get("signature") != self.signature:
+					return
+
+				for line in cache_stream:
+					if json.loads(line)["path"] not in self.file_paths:
+						self.cache_stream.write(line)
+						merged_count += 1
+
+		except FileNotFoundError:
+			return
+
+		self.count += merged_count
+
+		logger.info(
+			f'Merged previous change cache with merged_count="{merged_count}"'
+		)
+
+	def commit(
+			self,
+			merge_previous:bool=False,
+	):
+		if merge_previous:
+			self.append_previous()
+
+		self.cache_stream.close()
+		os.replace(self.temporary_file, self.cache_file)
+
+		logger.info(
+			f'Stored change cache with entries_count="{self.count}" '
+			f'at file_path="{self.cache_file}"'
+		)
+
+	def abort(self):
+		self.cache_stream.close()
+		os.remove(self.temporary_file)
+
+# FUNCTIONS
+def get_stat_key(
+		file_stat:os.stat_result,
+) -> tuple:
+	"""
+	Get the values identifying an unchanged file
+	"""
+	return (
+		file_stat.st_dev,
+		file_stat.st_ino,
+		file_stat.st_size,
+		file_stat.st_mtime_ns,
+	)
+
+def read_change_cache(
+		cache_file:str=PATH_FILE_CACHE,
+		signature:str=None,
+) -> dict:
+	"""
+	Load the change cache of previous run, indexed by file path,
+	dropping it when produced under settings of another signature
+	"""
+	cache_dict = dict()
+
+	try:
+		with open(cache_file, 'r', encoding='utf8') as cache_stream:
+			cache_header = json.loads(cache_stream.readline() or '{}')
+
+			if cache_header.get("signature") != signature:
+				logger.info(
+					f'Change cache at file_path="{cache_file}" was produced with '
+					f'other settings, every file will be processed'
+				)
+				return cache_dict
+
+			for line in cache_stream:
+				cache_item = json.loads(line)
+				cache_dict[cache_item["path"]] = (
+					tuple(cache_item["key"]),
+					cache_item["entry"],
+				)
+
+	except FileNotFoundError:
+		logger.info(
+			f'Change cache at file_path="{cache_file}" '
+			f'does not exist, every file will be processed'
+		)
+
+	return cache_dict
+
+def lookup_change_cache(
+		cache_dict:dict,
+		file_path:str,
+		stat_key:tuple,
+):
+	"""
+	Get the previous inventory entry of a file
+	if it did not change since previous run
+	"""
+	cache_item = cache_dict.get(file_path)
+
+	if cache_item is None or cache_item[0] != stat_key:
+		return None
+
+	return cache_item[1]
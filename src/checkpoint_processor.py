@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import threading
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+CHECKPOINT_INTERVAL = 60
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+PATH_FILE_CHECKPOINT = os.path.join(SCRIPT_HOME, 'var', 'lib', 'crawl_checkpoint.json')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+checkpoint_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+# CLASSES
+class CrawlCheckpoint:
+	"""
+	Track which folders are fully processed: a folder completes once
+	it was listed, the results of its files were stored and its
+	subfolders completed; files whose processing failed keep their
+	folder pending, so that a resumed crawl walks it again
+	"""
+
+	def __init__(
+			self,
+			folder_paths:list,
+			completed_folders:list=None,
+	):
+		self.folder_paths = list(folder_paths)
+		self.lock = threading.Lock()
+		self.pending = dict()
+		self.parents = dict()
+		self.children = dict()
+		self.files = dict()
+		self.completed = set(completed_folders or ())
+
+	def is_completed(
+			self,
+			folder_path:str,
+	) -> bool:
+		with self.lock:
+			return folder_path in self.completed
+
+	def add_folder(
+			self,
+			folder_path:str,
+			parent_path:str=None,
+	):
+		"""
+		Register a folder about to be walked, holding
+		a token released once its listing is over
+		"""
+		with self.lock:
+			self.pending[folder_path] = 1
+			self.parents[folder_path] = parent_path
+			self.children[folder_path] = list()
+
+			if parent_path is not None:
+				self.pending[parent_path] += 1
+				self.children[parent_path].append(folder_path)
+
+	def add_file(
+			self,
+			folder_path:str,
+			file_path:str,
+	):
+		"""
+		Hold a token on a folder until the result
+		of one of its files is stored
+		"""
+		with self.lock:
+			self.pending[folder_path] += 1
+			self.files[file_path] = folder_path
+
+	def release_files(
+			self,
+			file_paths:list,
+	):
+		"""
+		Release the folder tokens held by stored files
+		"""
+		for file_path in file_paths:
+			with self.lock:
+				folder_path = self.files.pop(file_path, None)
+
+			if folder_path is not None:
+				self.release(folder_path)
+
+	def release(
+			self,
+			folder_path:str,
+	):
+		"""
+		Release a token of a folder, completing it
+		and its ancestors when nothing is left pending
+		"""
+		with self.lock:
+			while folder_path is not None:
+				self.pending[folder_path] -= 1
+				if self.pending[folder_path] > 0:
+					return
+
+				del self.pending[folder_path]
+				self.completed.difference_update(
+					self.children.pop(folder_path)
+				)
+				self.completed.add(folder_path)
+				folder_path = self.parents.pop(folder_path)
+
+	def snapshot(self) -> dict:
+		with self.lock:
+			return {
+				"roots": self.folder_paths,
+				"completed": sorted(self.completed),
+				"frontier": sorted(self.pending),
+				"timestamp": time.time(),
+			}
+
+class Checkpointer(threading.Thread):
+	"""
+	Periodically store the crawl checkpoint, once the inventory
+	writer flushed results received so far and the files it
+	acknowledged storing released their folders
+	"""
+
+	def __init__(
+			self,
+			checkpoint:CrawlCheckpoint,
+			flush_function,
+			interval:float,
+			acknowledge_function=None,
+			checkpoint_file:str=PATH_FILE_CHECKPOINT,
+	):
+		super().__init__(name=SCRIPT_NAME, daemon=True)
+		self.checkpoint = checkpoint
+		self.flush_function = flush_function
+		self.acknowledge_function = acknowledge_function
+		self.interval = interval
+		self.checkpoint_file = checkpoint_file
+		self.stop_event = threading.Event()
+
+	def store(
+			self,
+			flush:bool=True,
+	):
+		if flush and not self.flush_function():
+			logger.warning(
+				'Inventory writer did not confirm flush, '
+				'skipping checkpoint'
+			)
+			return
+
+		if self.acknowledge_function is not None:
+			self.acknowledge_function()
+
+		checkpoint_dict = self.checkpoint.snapshot()
+		write_checkpoint(
+			checkpoint_dict=checkpoint_dict,
+			checkpoint_file=self.checkpoint_file,
+		)
+
+	def run(self):
+		while not self.stop_event.wait(self.interval):
+			self.store()
+
+	def stop(self):
+		self.stop_event.set()
+		self.join()
+
+# FUNCTIONS
+def write_checkpoint(
+		checkpoint_dict:dict,
+		checkpoint_file:str=PATH_FILE_CHECKPOINT,
+):
+	"""
+	Atomically replace the checkpoint file
+	"""
+	temporary_file = checkpoint_file + '.tmp'
+	os.makedirs(os.path.dirname(os.path.abspath(checkpoint_file)), exist_ok=True)
+
+	with open(temporary_file, 'w', encoding='utf8') as checkpoint_stream:
+		json.dump(
+			checkpoint_dict,
+			checkpoint_stream,
+		)
+
+	os.replace(temporary_file, checkpoint_file)
+
+	logger.info(
+		f'Stored checkpoint with completed_count="{len(checkpoint_dict["completed"])}" '
+		f'and frontier_count="{len(checkpoint_dict["frontier"])}"'
+	)
+
+def read_checkpoint(
+		checkpoint_file:str=PATH_FILE_CHECKPOINT,
+) -> dict:
+	try:
+		with open(checkpoint_file, 'r', encoding='utf8') as checkpoint_stream:
+			return json.load(checkpoint_stream)
+
+	except FileNotFoundError:
+		logger.warning(
+			f'No checkpoint found at file_path="{checkpoint_file}", '
+			f'starting from scratch'
+		)
+		return None
+
+def remove_checkpoint(
+		checkpoint_file:str=PATH_FILE_CHECKPOINT,
+):
+	if os.path.exists(checkpoint_file):
+		os.remove(checkpoint_file)
+
+def create_checkpoint(
+		folder_paths:list,
+		resume:bool,
+		checkpoint_file:str=PATH_FILE_CHECKPOINT,
+) -> CrawlCheckpoint:
+	"""
+	Create checkpoint tracking, restoring completed
+	folders of an interrupted crawl when resuming
+	"""
+	completed_folders = None
+
+	if resume:
+		checkpoint_dict = read_checkpoint(
+			checkpoint_file=checkpoint_file,
+		)
+
+		if checkpoint_dict is not None:
+			if sorted(checkpoint_dict["roots"]) != sorted(folder_paths):
+				logger.warning(
+					f'Checkpoint roots="{checkpoint_dict["roots"]}" differ '
+					f'from requested folder_paths="{folder_paths}"'
+				)
+
+			completed_folders = checkpoint_dict["completed"]
+			logger.info(
+				f'Resuming crawl with completed_count="{len(completed_folders)}" '
+				f'and frontier_count="{len(checkpoint_dict["frontier"])}"'
+			)
+
+	return CrawlCheckpoint(
+		folder_paths=folder_paths,
+		completed_folders=completed_folders,
+	)
+
+def start_checkpointer(
+		checkpoint:CrawlCheckpoint,
+		flush_function,
+		acknowledge_function=None,
+		checkpoint_file:str=PATH_FILE_CHECKPOINT,
+):
+	"""
+	Start periodic checkpoints unless disabled in settings
+	"""
+	interval = checkpoint_settings.get("checkpoint_interval", CHECKPOINT_INTERVAL)
+	if not interval:
+		return None
+
+	checkpointer = Checkpointer(
+		checkpoint=checkpoint,
+		flush_function=flush_function,
+		interval=interval,
+		acknowledge_function=acknowledge_function,
+		checkpoint_file=checkpoint_file,
+	)
+	checkpointer.start()
+
+	return checkpointer
@@ -1,20 +1,78 @@
 import os
+import sys
+import argparse
 import multiprocessing
 
-from folder_processor import process_folder
+from change_cache import PATH_FILE_CACHE
+from checkpoint_processor import (
+	PATH_FILE_CHECKPOINT,
+	create_checkpoint,
+	start_checkpointer,
+	write_checkpoint,
+	remove_checkpoint,
+)
+from execution_engine import (
+	EXECUTION_MODES,
+	create_executor,
+)
+from file_processor import verify_collisions
+from hash_algorithms import HASH_NAMES
+from image_processor import PERCEPTUAL_HASHES
+from folder_processor import (
+	FileFilter,
+	process_folders,
+)
+from inventory_processor import (
+	INVENTORY_BACKENDS,
+	create_backend,
+	init_worker,
+)
+from io_throttle import (
+	IoThrottle,
+	create_throttle,
+	init_throttle,
+	lower_priority,
+)
+from inventory_writer import (
+	start_writer,
+	stop_writer,
+	request_flush,
+	get_acknowledged,
+)
+from metrics import (
+	CrawlMetrics,
+	init_metrics,
+	start_monitoring,
+	stop_monitoring,
+)
+from processing_settings import (
+	ProcessingSettings,
+	compile_settings,
+	install_settings,
+)
 from utilities import (
 	setup_logger,
 	get_script_details,
-	run_child,
+	read_settings,
+	init_worker_logging,
+	start_log_listener,
+	stop_log_listener,
 )
 
 
 # GLOBAL VARIABLES
-SRC_PATH = r'C:\Users\pault\Pictures\Sélection Noël 2019'
 CPU_FREE = 2
+EXECUTION_MODE = 'process'
+SIZE_UNITS = {
+	'K': 1024,
+	'M': 1024 ** 2,
+	'G': 1024 ** 3,
+	'T': 1024 ** 4,
+}
 
 SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
 PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
 
 # DEFINING LOGGING SETTINGS
 logger = setup_logger(
@@ -22,14 +80,34 @@ logger = setup_logger(
 	file_path=PATH_FILE_LOG,
 )
 
-# MAIN CODE
-if __name__ == '__main__':
+crawler_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
 
-	logger = setup_logger(
-		name=SCRIPT_NAME,
-		file_path=PATH_FILE_LOG,
-	)
+# FUNCTIONS
+def init_crawl_worker(
+		result_queue,
+		writer_stats,
+		crawl_metrics:CrawlMetrics,
+		log_queue,
+		processing_settings:ProcessingSettings,
+		io_throttle:IoThrottle=None,
+):
+	"""
+	Share the result queue, metrics, log queue, read
+	throttle and compiled settings with a worker
+	"""
+	init_worker_logging(log_queue)
+	init_worker(result_queue, writer_stats)
+	init_metrics(crawl_metrics)
+	init_throttle(io_throttle)
+	install_settings(processing_settings)
 
+def get_worker_count() -> int:
+	"""
+	Get the number of workers leaving some CPUs to the OS
+	"""
 	cpu_total = multiprocessing.cpu_count()
 	cpu_used = max(cpu_total - CPU_FREE, 1)
 	logger.info(
@@ -38,14 +116,390 @@ if __name__ == '__main__':
 		f'which should leave cpu_free="{CPU_FREE} for OS'
 	)
 
-	lock = multiprocessing.Lock()
-	pool = multiprocessing.Pool(
-		processes=cpu_used,
+	return cpu_used
+
+def run_crawl(
+		folder_paths:list,
+		execution_mode:str=EXECUTION_MODE,
+		worker_count:int=None,
+		backend_name:str=None,
+		backend_options:dict=None,
+		cache_file:str=PATH_FILE_CACHE,
+		incremental:bool=None,
+		resume:bool=False,
+		checkpoint_file:str=PATH_FILE_CHECKPOINT,
+		walker_count:int=None,
+		file_filter:FileFilter=None,
+		hash_names:list=None,
+		metadata:bool=None,
+		perceptual_names:list=None,
+		drop_cache:bool=None,
+		tiered:bool=None,
+		read_rate:int=None,
+		iops:int=None,
+		adaptive:bool=None,
+		low_priority:bool=False,
+) -> dict:
+	"""
+	Crawl source folders, storing results in the inventory
+	"""
+	if worker_count is None:
+		worker_count = get_worker_count()
+
+	if low_priority:
+		lower_priority()
+
+	processing_settings = compile_settings(
+		hash_names=hash_names,
+		metadata=metadata,
+		perceptual_names=perceptual_names,
+		drop_cache=drop_cache,
+		tiered=tiered,
+	)
+	log_queue, log_listener = start_log_listener()
+	crawl_metrics = CrawlMetrics()
+	writer, result_queue, writer_stats = start_writer(
+		backend_name=backend_name,
+		backend_options=backend_options,
+		cache_file=cache_file,
+		settings_signature=processing_settings.get_signature(),
+		crawl_metrics=crawl_metrics,
+		acknowledge=True,
+		log_queue=log_queue,
+	)
+	io_throttle = create_throttle(
+		read_rate=read_rate,
+		iops=iops,
+		concurrency=worker_count,
+		adaptive=adaptive,
+	)
+	worker_arguments = (
+		result_queue,
+		writer_stats,
+		crawl_metrics,
+		log_queue,
+		processing_settings,
+		io_throttle,
+	)
+	init_crawl_worker(*worker_arguments)
+	progress_reporter, metrics_server = start_monitoring(crawl_metrics)
+
+	executor = create_executor(
+		mode=execution_mode,
+		worker_count=worker_count,
+		initializer=init_crawl_worker,
+		initargs=worker_arguments,
 	)
 
-	run_child(
-		pool=pool,
-		function=process_folder,
-		args=(pool, SRC_PATH, lock),
-		logger_object=logger,
+	checkpoint = create_checkpoint(
+		folder_paths=folder_paths,
+		resume=resume,
+		checkpoint_file=checkpoint_file,
 	)
+	stored_paths = dict()
+
+	def acknowledge_function():
+		"""
+		Release folders of files stored by the writer, keeping
+		their paths by index hash to verify collisions
+		"""
+		stored_keys = get_acknowledged(writer)
+		checkpoint.release_files(
+			file_path
+			for file_hash, file_path in stored_keys
+		)
+
+		if processing_settings.tiered:
+			for file_hash, file_path in stored_keys:
+				stored_paths.setdefault(file_hash, set()).add(file_path)
+
+	checkpointer = start_checkpointer(
+		checkpoint=checkpoint,
+		flush_function=lambda: request_flush(writer, result_queue, writer_stats),
+		acknowledge_function=acknowledge_function,
+		checkpoint_file=checkpoint_file,
+	)
+	interrupted = False
+
+	try:
+		walk_stats = process_folders(
+			pool=executor,
+			folder_paths=folder_paths,
+			incremental=incremental,
+			cache_file=cache_file,
+			checkpoint=checkpoint,
+			walker_count=walker_count,
+			file_filter=file_filter,
+		)
+		crawl_metrics.set_walk_done()
+		executor_stats = executor.shutdown()
+
+	except KeyboardInterrupt:
+		logger.warning(
+			'Crawl interrupted, cancelling pending tasks'
+		)
+		executor_stats = executor.shutdown(cancel=True)
+		walk_stats = None
+		interrupted = True
+
+	if checkpointer is not None:
+		checkpointer.stop()
+
+	stop_writer(
+		writer=writer,
+		result_queue=result_queue,
+		partial=interrupted or resume,
+		acknowledge_function=acknowledge_function,
+	)
+
+	writer_failed = (
+		writer.exitcode != 0
+		or writer_stats.get("failed") > 0
+		or writer_stats.get("dequeued") != writer_stats.get("enqueued")
+	)
+	if writer_failed:
+		logger.error(
+			f'Inventory writer lost results with writer_exitcode="{writer.exitcode}", '
+			f'writer_stats="{writer_stats.as_dict()}", keeping checkpoint '
+			f'at file_path="{checkpoint_file}" to resume the crawl'
+		)
+
+	verify_stats = None
+	if interrupted or writer_failed:
+		write_checkpoint(
+			checkpoint_dict=checkpoint.snapshot(),
+			checkpoint_file=checkpoint_file,
+		)
+	else:
+		remove_checkpoint(checkpoint_file)
+
+		if processing_settings.tiered:
+			backend = create_backend(
+				backend_name=backend_name,
+				backend_options=backend_options,
+			)
+			verify_stats = verify_collisions(
+				backend=backend,
+				stored_paths=stored_paths,
+			)
+			backend.close()
+	stop_monitoring(
+		progress_reporter=progress_reporter,
+		metrics_server=metrics_server,
+	)
+	stop_log_listener(log_listener)
+	logger.info(
+		f'Inventory writer completed with '
+		f'writer_stats="{writer_stats.as_dict()}", '
+		f'cache_hits="{writer_stats.get("cache_hits")}", '
+		f'cache_misses="{writer_stats.get("cache_misses")}"'
+	)
+
+	return {
+		"walk": walk_stats,
+		"executor": executor_stats,
+		"writer": writer_stats.as_dict(),
+		"metrics": crawl_metrics.snapshot(),
+		"throttle": io_throttle.get_stats() if io_throttle is not None else None,
+		"verify": verify_stats,
+		"writer_failed": writer_failed,
+	}
+
+def parse_size(
+		size_text:str,
+) -> int:
+	"""
+	Get a number of bytes from a size such as 512, 64K or 2G
+	"""
+	size_text = size_text.strip().upper().rstrip('B')
+
+	if size_text and size_text[-1] in SIZE_UNITS:
+		return int(float(size_text[:-1]) * SIZE_UNITS[size_text[-1]])
+
+	return int(size_text)
+
+def parse_arguments(
+		argument_list:list=None,
+) -> dict:
+	"""
+	Get crawl options from command line, on top of
+	the selected profile and default settings
+	"""
+	profiles = crawler_settings.get("profiles", dict())
+
+	parser = argparse.ArgumentParser(
+		description='Crawl folders to build a file inventory',
+	)
+	parser.add_argument(
+		'folder_paths',
+		nargs='+',
+		metavar='SOURCE',
+		help='source folders to crawl',
+	)
+	parser.add_argument(
+		'--profile',
+		choices=sorted(profiles),
+		help='named set of options, overridden by explicit options',
+	)
+	parser.add_argument(
+		'--mode',
+		dest='execution_mode',
+		choices=sorted(EXECUTION_MODES),
+		help='execution mode of file processing workers',
+	)
+	parser.add_argument(
+		'--workers',
+		dest='worker_count',
+		type=int,
+		help='number of file processing workers',
+	)
+	parser.add_argument(
+		'--walkers',
+		dest='walker_count',
+		type=int,
+		help='number of folder walking threads',
+	)
+	parser.add_argument(
+		'--hash',
+		dest='hash_names',
+		action='append',
+		choices=HASH_NAMES,
+		metavar='ALGORITHM',
+		help='hash algorithm to compute, overriding file_processor.yaml',
+	)
+	parser.add_argument(
+		'--tiered',
+		dest='tiered',
+		action=argparse.BooleanOptionalAction,
+		help='index files with a fast hash, verifying collisions with a cryptographic one',
+	)
+	parser.add_argument(
+		'--perceptual',
+		dest='perceptual_names',
+		action='append',
+		choices=sorted(PERCEPTUAL_HASHES),
+		help='perceptual hash to compute on images, for near-duplicate search',
+	)
+	parser.add_argument(
+		'--include',
+		action='append',
+		metavar='GLOB',
+		help='only process files matching this glob',
+	)
+	parser.add_argument(
+		'--exclude',
+		action='append',
+		metavar='GLOB',
+		help='skip files matching this glob',
+	)
+	parser.add_argument(
+		'--max-size',
+		dest='max_size',
+		type=parse_size,
+		help='skip files larger than this size, such as 4G',
+	)
+	parser.add_argument(
+		'--backend',
+		dest='backend_name',
+		choices=sorted(INVENTORY_BACKENDS),
+		help='inventory storage backend',
+	)
+	parser.add_argument(
+		'--metadata',
+		dest='metadata',
+		action=argparse.BooleanOptionalAction,
+		help='extract image metadata',
+	)
+	parser.add_argument(
+		'--incremental',
+		dest='incremental',
+		action=argparse.BooleanOptionalAction,
+		help='skip files unchanged since previous crawl',
+	)
+	parser.add_argument(
+		'--max-read-rate',
+		dest='read_rate',
+		type=parse_size,
+		help='read bandwidth shared by workers per second, such as 20M',
+	)
+	parser.add_argument(
+		'--max-iops',
+		dest='iops',
+		type=int,
+		help='read operations shared by workers per second',
+	)
+	parser.add_argument(
+		'--adaptive',
+		dest='adaptive',
+		action=argparse.BooleanOptionalAction,
+		help='lower read concurrency when read latency rises',
+	)
+	parser.add_argument(
+		'--low-priority',
+		dest='low_priority',
+		action=argparse.BooleanOptionalAction,
+		help='lower CPU and I/O scheduling priority',
+	)
+	parser.add_argument(
+		'--drop-cache',
+		dest='drop_cache',
+		action=argparse.BooleanOptionalAction,
+		help='evict hashed pages from page cache',
+	)
+	parser.add_argument(
+		'--resume',
+		action='store_true',
+		default=None,
+		help='skip folders completed by an interrupted crawl',
+	)
+	arguments = parser.parse_args(argument_list)
+
+	crawl_options = dict(crawler_settings.get("defaults", dict()))
+	if arguments.profile is not None:
+		crawl_options.update(profiles[arguments.profile])
+
+	crawl_options.update({
+		option: value
+		for option, value in vars(arguments).items()
+		if value is not None and option != 'profile'
+	})
+
+	return crawl_options
+
+def get_crawl_arguments(
+		crawl_options:dict,
+) -> dict:
+	"""
+	Turn crawl options into run_crawl arguments
+	"""
+	crawl_arguments = dict(crawl_options)
+
+	max_size = crawl_arguments.pop("max_size", None)
+	if isinstance(max_size, str):
+		max_size = parse_size(max_size)
+
+	if isinstance(crawl_arguments.get("read_rate"), str):
+		crawl_arguments["read_rate"] = parse_size(crawl_arguments["read_rate"])
+
+	crawl_arguments["file_filter"] = FileFilter(
+		include=crawl_arguments.pop("include", None),
+		exclude=crawl_arguments.pop("exclude", None),
+		max_size=max_size,
+	)
+
+	return crawl_arguments
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	crawl_options = parse_arguments()
+	logger.info(
+		f'Starting crawl with crawl_options="{crawl_options}"'
+	)
+
+	crawl_stats = run_crawl(
+		**get_crawl_arguments(crawl_options)
+	)
+
+	if crawl_stats["writer_failed"]:
+		sys.exit(1)
@@ -0,0 +1,265 @@
+import os
+import json
+import argparse
+import collections
+
+from file_processor import hash_file
+from folder_processor import FolderWalker
+from hash_algorithms import (
+	new_hash,
+	resolve_hash_name,
+)
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+PARTIAL_HASH_SIZE = 4096
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+PATH_FILE_OUTPUT = os.path.join(SCRIPT_HOME, 'var', 'lib', 'duplicates.json')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+duplicate_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+# FUNCTIONS
+def group_by_size(
+		folder_paths:list,
+		min_size:int,
+) -> dict:
+	"""
+	Group files by size, keeping a single path
+	for files hard linked to the same inode
+	"""
+	found_files = list()
+	folder_walker = FolderWalker(
+		file_handler=lambda file_path, file_stat: found_files.append(
+			(file_path, file_stat)
+		),
+	)
+	folder_walker.walk(
+		folder_paths=folder_paths,
+	)
+
+	size_groups = collections.defaultdict(list)
+	seen_inodes = set()
+
+	for file_path, file_stat in found_files:
+		if file_stat.st_size < min_size:
+			continue
+
+		inode_key = (file_stat.st_dev, file_stat.st_ino)
+		if inode_key in seen_inodes:
+			continue
+
+		seen_inodes.add(inode_key)
+		size_groups[file_stat.st_size].append(file_path)
+
+	return size_groups
+
+def get_partial_hash(
+		file_path:str,
+		file_size:int,
+		hash_name:str,
+		partial_size:int,
+) -> str:
+	"""
+	Hash only the first and last blocks of a file,
+	which covers the whole content of small files
+	"""
+	hash_object = new_hash(hash_name)
+
+	with open(file_path, 'rb') as file_descriptor:
+		hash_object.update(file_descriptor.read(partial_size))
+
+		if file_size > partial_size:
+			file_descriptor.seek(max(file_size - partial_size, partial_size))
+			hash_object.update(file_descriptor.read(partial_size))
+
+	return hash_object.hexdigest()
+
+def get_full_hash(
+		file_path:str,
+		hash_name:str,
+) -> str:
+	with open(file_path, 'rb', buffering=0) as file_descriptor:
+		hash_dict, file_bytes, header_bytes = hash_file(
+			file_descriptor=file_descriptor,
+			hash_names=[hash_name],
+		)
+
+	return hash_dict[hash_name]
+
+def split_groups(
+		file_groups:dict,
+		hash_function,
+) -> dict:
+	"""
+	Split groups of candidate files by the result of a hash function,
+	dropping files left alone in their group
+	"""
+	split_dict = collections.defaultdict(list)
+
+	for group_key, file_paths in file_groups.items():
+		file_size = group_key[0]
+
+		for file_path in file_paths:
+			try:
+				file_hash = hash_function(file_path, file_size)
+
+			except OSError:
+				logger.warning(
+					f'Could not read content of file_path="{file_path}"'
+				)
+				continue
+
+			split_dict[(file_size, file_hash)].append(file_path)
+
+	return {
+		group_key: file_paths
+		for group_key, file_paths in split_dict.items()
+		if len(file_paths) > 1
+	}
+
+def find_duplicates(
+		folder_paths:list,
+) -> list:
+	"""
+	Find clusters of identical files, only reading
+	what is needed to tell candidates apart
+	"""
+	hash_name = resolve_hash_name(
+		duplicate_settings.get("hash_algorithm", "md5")
+	)
+	partial_size = duplicate_settings.get("partial_hash_size", PARTIAL_HASH_SIZE)
+	min_size = duplicate_settings.get("min_size", 1)
+
+	size_groups = group_by_size(
+		folder_paths=folder_paths,
+		min_size=min_size,
+	)
+	files_count = sum(len(file_paths) for file_paths in size_groups.values())
+	total_bytes = sum(
+		file_size * len(file_paths)
+		for file_size, file_paths in size_groups.items()
+	)
+	candidate_groups = {
+		(file_size,): file_paths
+		for file_size, file_paths in size_groups.items()
+		if len(file_paths) > 1
+	}
+
+	logger.info(
+		f'Grouped files_count="{files_count}" by size, '
+		f'keeping size_groups="{len(candidate_groups)}" with candidates'
+	)
+
+	partial_groups = split_groups(
+		file_groups=candidate_groups,
+		hash_function=lambda file_path, file_size: get_partial_hash(
+			file_path=file_path,
+			file_size=file_size,
+			hash_name=hash_name,
+			partial_size=partial_size,
+		),
+	)
+
+	full_candidates = dict()
+	duplicate_groups = dict()
+	for group_key, file_paths in partial_groups.items():
+		if group_key[0] <= 2 * partial_size:
+			duplicate_groups[group_key] = file_paths
+		else:
+			full_candidates[group_key] = file_paths
+
+	partial_bytes = sum(
+		min(group_key[0], 2 * partial_size) * len(file_paths)
+		for group_key, file_paths in candidate_groups.items()
+	)
+	full_bytes = sum(
+		group_key[0] * len(file_paths)
+		for group_key, file_paths in full_candidates.items()
+	)
+
+	logger.info(
+		f'Partial hashes kept partial_groups="{len(partial_groups)}", '
+		f'with full_hash_groups="{len(full_candidates)}" left to read, '
+		f'reading partial_bytes="{partial_bytes}" and full_bytes="{full_bytes}" '
+		f'out of total_bytes="{total_bytes}"'
+	)
+
+	duplicate_groups.update(
+		split_groups(
+			file_groups=full_candidates,
+			hash_function=lambda file_path, file_size: get_full_hash(
+				file_path=file_path,
+				hash_name=hash_name,
+			),
+		)
+	)
+
+	duplicate_clusters = [
+		{
+			"bytes": group_key[0],
+			"hash": group_key[1],
+			"paths": sorted(file_paths),
+			"reclaimable_bytes": group_key[0] * (len(file_paths) - 1),
+		}
+		for group_key, file_paths in duplicate_groups.items()
+	]
+	duplicate_clusters.sort(
+		key=lambda cluster: cluster["reclaimable_bytes"],
+		reverse=True,
+	)
+
+	logger.info(
+		f'Found clusters_count="{len(duplicate_clusters)}" with '
+		f'reclaimable_bytes="{sum(c["reclaimable_bytes"] for c in duplicate_clusters)}"'
+	)
+
+	return duplicate_clusters
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Find duplicate files below source folders',
+	)
+	parser.add_argument(
+		'folder_paths',
+		nargs='+',
+	)
+	parser.add_argument(
+		'--output',
+		default=PATH_FILE_OUTPUT,
+	)
+	arguments = parser.parse_args()
+
+	duplicate_clusters = find_duplicates(
+		folder_paths=arguments.folder_paths,
+	)
+
+	with open(arguments.output, 'w', encoding='utf8') as output_file:
+		json.dump(
+			{
+				"clusters": duplicate_clusters,
+				"reclaimable_bytes": sum(
+					cluster["reclaimable_bytes"]
+					for cluster in duplicate_clusters
+				),
+			},
+			output_file,
+			indent=4,
+		)
@@ -0,0 +1,317 @@
+import os
+import abc
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+# GLOBAL VARIABLES
+PENDING_PER_WORKER = 64
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class BaseExecutor(abc.ABC):
+	"""
+	Common behaviour of execution modes: bounded number of
+	pending tasks, failure logging, statistics and shutdown
+	"""
+	mode = None
+
+	def __init__(
+			self,
+			worker_count:int,
+			max_pending:int=None,
+	):
+		if max_pending is None:
+			max_pending = worker_count * PENDING_PER_WORKER
+
+		self.worker_count = worker_count
+		self.pending_slots = threading.BoundedSemaphore(max_pending)
+		self.stats_lock = threading.Lock()
+		self.submitted = 0
+		self.completed = 0
+		self.failed = 0
+		self.first_exception = None
+		self.start_time = time.perf_counter()
+
+	@abc.abstractmethod
+	def submit_task(
+			self,
+			function,
+			args:tuple,
+	) -> concurrent.futures.Future:
+		"""
+		Schedule a function call in the underlying pool or loop
+		"""
+
+	@abc.abstractmethod
+	def shutdown_tasks(
+			self,
+			wait:bool,
+			cancel:bool,
+	):
+		"""
+		Stop the underlying pool or loop
+		"""
+
+	def submit(
+			self,
+			function,
+			*args,
+	) -> concurrent.futures.Future:
+		"""
+		Schedule a function call, waiting for a free slot
+		when too many tasks are already pending
+		"""
+		self.pending_slots.acquire()
+
+		try:
+			future = self.submit_task(function, args)
+
+		except BaseException:
+			self.pending_slots.release()
+			raise
+
+		with self.stats_lock:
+			self.submitted += 1
+
+		future.add_done_callback(
+			lambda done_future: self.complete(function, done_future)
+		)
+
+		return future
+
+	def complete(
+			self,
+			function,
+			future:concurrent.futures.Future,
+	):
+		self.pending_slots.release()
+
+		if future.cancelled():
+			return
+
+		exception = future.exception()
+
+		with self.stats_lock:
+			if exception is None:
+				self.completed += 1
+			else:
+				self.failed += 1
+				if self.first_exception is None:
+					self.first_exception = exception
+
+		if exception is not None:
+			logger.error(
+				f'Task function_name="{function.__name__}" failed '
+				f'in execution_mode="{self.mode}"',
+				exc_info=exception,
+			)
+
+	def get_stats(self) -> dict:
+		elapsed_seconds = time.perf_counter() - self.start_time
+
+		with self.stats_lock:
+			return {
+				"mode": self.mode,
+				"workers": self.worker_count,
+				"submitted": self.submitted,
+				"completed": self.completed,
+				"failed": self.failed,
+				"elapsed_seconds": elapsed_seconds,
+				"tasks_per_second": (
+					self.completed / elapsed_seconds
+					if elapsed_seconds > 0 else float(0)
+				),
+			}
+
+	def shutdown(
+			self,
+			wait:bool=True,
+			cancel:bool=False,
+	) -> dict:
+		"""
+		Stop accepting tasks, waiting for pending ones unless cancelled
+		"""
+		self.shutdown_tasks(
+			wait=wait,
+			cancel=cancel,
+		)
+		executor_stats = self.get_stats()
+
+		logger.info(
+			f'Stopped execution_mode="{self.mode}" with '
+			f'executor_stats="{executor_stats}"'
+		)
+
+		return executor_stats
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exception_type, exception_value, traceback):
+		self.shutdown(
+			wait=True,
+			cancel=exception_type is not None,
+		)
+
+class PoolExecutor(BaseExecutor):
+	"""
+	Execution mode relying on a concurrent.futures pool
+	"""
+	pool_class = None
+
+	def __init__(
+			self,
+			worker_count:int,
+			initializer=None,
+			initargs:tuple=(),
+			max_pending:int=None,
+	):
+		super().__init__(worker_count, max_pending)
+		self.pool = self.pool_class(
+			max_workers=worker_count,
+			initializer=initializer,
+			initargs=initargs,
+		)
+
+	def submit_task(self, function, args):
+		return self.pool.submit(function, *args)
+
+	def shutdown_tasks(self, wait, cancel):
+		self.pool.shutdown(
+			wait=wait,
+			cancel_futures=cancel,
+		)
+
+class ThreadExecutor(PoolExecutor):
+	"""
+	Thread pool, suited for I/O bound work and hashing
+	since hashlib releases the GIL on large buffers
+	"""
+	mode = "thread"
+	pool_class = concurrent.futures.ThreadPoolExecutor
+
+class ProcessExecutor(PoolExecutor):
+	"""
+	Process pool, suited for CPU bound work such as image decoding
+	"""
+	mode = "process"
+	pool_class = concurrent.futures.ProcessPoolExecutor
+
+class AsyncioExecutor(BaseExecutor):
+	"""
+	Event loop bounding the number of concurrent operations,
+	suited for high latency network mounts; blocking file
+	operations are offloaded to the loop default executor
+	"""
+	mode = "asyncio"
+
+	def __init__(
+			self,
+			worker_count:int,
+			initializer=None,
+			initargs:tuple=(),
+			max_pending:int=None,
+	):
+		super().__init__(worker_count, max_pending)
+		self.thread_pool = concurrent.futures.ThreadPoolExecutor(
+			max_workers=worker_count,
+			initializer=initializer,
+			initargs=initargs,
+			thread_name_prefix=SCRIPT_NAME,
+		)
+		self.loop = asyncio.new_event_loop()
+		self.loop.set_default_executor(self.thread_pool)
+		self.loop_thread = threading.Thread(
+			target=self.loop.run_forever,
+			name=f'{SCRIPT_NAME}-loop',
+			daemon=True,
+		)
+		self.loop_thread.start()
+		self.semaphore = asyncio.run_coroutine_threadsafe(
+			self.create_semaphore(),
+			self.loop,
+		).result()
+		self.futures_lock = threading.Lock()
+		self.futures = set()
+
+	async def create_semaphore(self):
+		return asyncio.Semaphore(self.worker_count)
+
+	async def run_task(self, function, args):
+		async with self.semaphore:
+			return await self.loop.run_in_executor(None, function, *args)
+
+	def submit_task(self, function, args):
+		future = asyncio.run_coroutine_threadsafe(
+			self.run_task(function, args),
+			self.loop,
+		)
+		with self.futures_lock:
+			self.futures.add(future)
+		future.add_done_callback(self.forget_future)
+
+		return future
+
+	def forget_future(self, future):
+		with self.futures_lock:
+			self.futures.discard(future)
+
+	def shutdown_tasks(self, wait, cancel):
+		with self.futures_lock:
+			pending_futures = list(self.futures)
+
+		if cancel:
+			for future in pending_futures:
+				future.cancel()
+
+		if wait:
+			concurrent.futures.wait(pending_futures)
+
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.loop_thread.join()
+		self.thread_pool.shutdown(wait=wait)
+		self.loop.close()
+
+EXECUTION_MODES = {
+	"thread": ThreadExecutor,
+	"process": ProcessExecutor,
+	"asyncio": AsyncioExecutor,
+}
+
+# FUNCTIONS
+def create_executor(
+		mode:str,
+		worker_count:int,
+		initializer=None,
+		initargs:tuple=(),
+		max_pending:int=None,
+) -> BaseExecutor:
+	"""
+	Create an executor for the requested execution mode
+	"""
+	logger.info(
+		f'Starting execution_mode="{mode}" '
+		f'with worker_count="{worker_count}"'
+	)
+
+	return EXECUTION_MODES[mode](
+		worker_count=worker_count,
+		initializer=initializer,
+		initargs=initargs,
+		max_pending=max_pending,
+	)
@@ -1,21 +1,62 @@
 import os
-import hashlib
+import mmap
+import time
 
+from hash_algorithms import new_hash
 from image_processor import get_image_settings
+from video_processor import get_video_settings
+from io_throttle import (
+    throttle_read,
+    observe_read,
+    read_slot,
+)
+from inventory_index import build_index
 from inventory_processor import (
 	store_inventory,
 )
+from metrics import (
+    instrument,
+    add_metric,
+)
+from processing_settings import (
+    HASH_BLOCK_SIZE,
+    get_settings,
+)
 from utilities import (
+    LOG_PER_FILE,
     setup_logger,
     get_script_details,
-    read_settings,
 )
 
 # GLOBAL VARIABLES
+SNIFF_SIZE = 64
+MAGIC_SIGNATURES = (
+    (0, b'\xff\xd8\xff', "image"),
+    (0, b'\x89PNG\r\n\x1a\n', "image"),
+    (0, b'GIF87a', "image"),
+    (0, b'GIF89a', "image"),
+    (0, b'II*\x00', "image"),
+    (0, b'MM\x00*', "image"),
+    (8, b'WEBP', "image"),
+    (4, b'ftypheic', "image"),
+    (4, b'ftypheix', "image"),
+    (4, b'ftypmif1', "image"),
+    (4, b'ftypavif', "image"),
+    (4, b'ftyp', "video"),
+    (4, b'moov', "video"),
+    (4, b'mdat', "video"),
+    (4, b'wide', "video"),
+    (0, b'\x1a\x45\xdf\xa3', "video"),
+    (8, b'AVI ', "video"),
+    (0, b'\x00\x00\x01\xba', "video"),
+    (0, b'\x00\x00\x01\xb3', "video"),
+    (0, b'%PDF-', "document"),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', "document"),
+    (0, b'PK\x03\x04', None),
+)
 
 SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
 PATH_FILE_LOG = os.path.join(SCRIPT_HOME,'var','log',SCRIPT_NAME + '.log')
-PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
 
 # DEFINING LOGGING SETTINGS
 logger = setup_logger(
@@ -23,14 +64,215 @@ logger = setup_logger(
 	file_path=PATH_FILE_LOG,
 )
 
-file_settings = read_settings(
-	settings_file=PATH_FILE_SETTINGS,
-	logger_object=logger,
-)
-
 # FUNCTIONS
+def compile_magic_signatures(
+    magic_signatures: tuple,
+) -> list:
+    """
+    Group signatures by position into dicts, longest first,
+    so that sniffing costs one lookup per position
+    """
+    magic_tables = dict()
+
+    for offset, signature, file_type in magic_signatures:
+        magic_tables.setdefault(
+            (offset, offset + len(signature)),
+            dict(),
+        )[signature] = file_type
+
+    return sorted(
+        magic_tables.items(),
+        key=lambda magic_item: magic_item[0][0] - magic_item[0][1],
+    )
+
+MAGIC_TABLES = compile_magic_signatures(MAGIC_SIGNATURES)
+
+def sniff_file_type(
+    header_bytes: bytes,
+):
+    """
+    Get the type of a file from its first bytes, returning
+    None for containers only the extension can tell apart
+    and "unknown" when no signature matches
+    """
+    for (start, end), magic_table in MAGIC_TABLES:
+        magic_bytes = header_bytes[start:end]
+
+        if magic_bytes in magic_table:
+            return magic_table[magic_bytes]
+
+    return "unknown"
+
+def get_file_type(
+    file_ext: str,
+    header_bytes: bytes,
+) -> str:
+    """
+    Get the type of a file from its content, falling
+    back on its extension when content is not conclusive
+    """
+    sniffed_type = sniff_file_type(header_bytes)
+
+    if sniffed_type is not None and sniffed_type != "unknown":
+        return sniffed_type
+
+    return get_settings().extension_types.get(file_ext, "unknown")
+
+def hash_file(
+    file_descriptor,
+    hash_names: list,
+    block_size: int = HASH_BLOCK_SIZE,
+    header_size: int = 0,
+    drop_cache: bool = False,
+):
+    """
+    Feed every requested hash algorithm in a single pass,
+    reading fixed-size blocks into a reused buffer so that
+    memory usage stays bounded whatever the file size;
+    the first header_size bytes are kept for metadata parsing
+    """
+    hash_objects = {
+        name: new_hash(name)
+        for name in hash_names
+    }
+
+    buffer = bytearray(block_size)
+    buffer_view = memoryview(buffer)
+    bytes_read = 0
+    header_parts = list()
+
+    while True:
+        read_start = time.perf_counter()
+        block_length = file_descriptor.readinto(buffer)
+        if not block_length:
+            break
+
+        observe_read(time.perf_counter() - read_start)
+        throttle_read(block_length)
+
+        block_view = buffer_view[:block_length]
+        for hash_object in hash_objects.values():
+            hash_object.update(block_view)
+
+        if bytes_read < header_size:
+            header_parts.append(
+                bytes(block_view[:header_size - bytes_read])
+            )
+
+        if drop_cache:
+            drop_start = max(bytes_read - block_size, 0)
+            drop_page_cache(
+                file_descriptor,
+                drop_start,
+                bytes_read + block_length - drop_start,
+            )
+
+        bytes_read += block_length
+
+    if drop_cache:
+        drop_page_cache(file_descriptor, 0, 0)
+
+    hash_dict = {
+        name: hash_object.hexdigest()
+        for name, hash_object in hash_objects.items()
+    }
+
+    return hash_dict, bytes_read, b''.join(header_parts)
+
+def drop_page_cache(
+    file_descriptor,
+    offset: int,
+    length: int,
+):
+    """
+    Let the kernel evict pages already hashed, so that
+    crawling does not push other workloads out of page cache;
+    callers overlap ranges as pages are dropped by whole folios
+    """
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(
+            file_descriptor.fileno(),
+            offset,
+            length,
+            os.POSIX_FADV_DONTNEED,
+        )
+
+def hash_mapped_file(
+    file_descriptor,
+    file_size: int,
+    hash_names: list,
+    block_size: int = HASH_BLOCK_SIZE,
+    header_size: int = 0,
+    drop_cache: bool = False,
+):
+    """
+    Feed every requested hash algorithm with slices of a read-only
+    memory map, without copying blocks into Python bytes; pages
+    already hashed are unmapped and dropped from page cache
+
+    Each block is faulted in by touching one byte per page before
+    hashing, so that its read latency is observed apart from hashing
+    """
+    hash_objects = {
+        name: new_hash(name)
+        for name in hash_names
+    }
+
+    with mmap.mmap(
+        file_descriptor.fileno(),
+        0,
+        access=mmap.ACCESS_READ,
+    ) as file_map:
+
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            file_map.madvise(mmap.MADV_SEQUENTIAL)
+
+        with memoryview(file_map) as map_view:
+            for offset in range(0, file_size, block_size):
+                block_length = min(block_size, file_size - offset)
+                throttle_read(block_length)
+
+                with map_view[offset:offset + block_length] as block_view:
+                    read_start = time.perf_counter()
+                    block_view[::mmap.PAGESIZE].tobytes()
+                    observe_read(time.perf_counter() - read_start)
+
+                    for hash_object in hash_objects.values():
+                        hash_object.update(block_view)
+
+                if drop_cache:
+                    if hasattr(mmap, 'MADV_DONTNEED'):
+                        file_map.madvise(mmap.MADV_DONTNEED, offset, block_length)
+                    drop_page_cache(file_descriptor, offset, block_length)
+
+            header_bytes = bytes(map_view[:header_size])
+
+    if drop_cache:
+        drop_page_cache(file_descriptor, 0, 0)
+
+    hash_dict = {
+        name: hash_object.hexdigest()
+        for name, hash_object in hash_objects.items()
+    }
+
+    return hash_dict, file_size, header_bytes
+
+def get_throughput(
+    bytes_count: int,
+    elapsed_seconds: float,
+) -> float:
+    """
+    Get throughput in MB/s from a byte count and a duration
+    """
+    if elapsed_seconds <= 0:
+        return float(0)
+
+    return bytes_count / (1024 * 1024) / elapsed_seconds
+
+@instrument("get_file_settings")
 def get_file_settings(
     file_path: str,
+    header_size: int = 0,
 ):
     """
     Process an input file based only on OS settings
@@ -41,15 +283,58 @@ def get_file_settings(
     file_ext_clean = file_ext.replace('.', '')
 
 
-    with open(file_path, "rb") as file_descriptor:
-        file_data = file_descriptor.read()
-        hash_dict = dict()
+    settings = get_settings()
+    hash_names = settings.hash_names
+    block_size = settings.block_size
+    mmap_threshold = settings.mmap_threshold
+    drop_cache = settings.drop_cache
+
+    start_time = time.perf_counter()
+
+    with open(file_path, "rb", buffering=0) as file_descriptor:
+        file_size = os.fstat(file_descriptor.fileno()).st_size
+        hash_mode = "stream"
+
+        if mmap_threshold and file_size >= mmap_threshold:
+            try:
+                hash_dict, file_bytes, header_bytes = hash_mapped_file(
+                    file_descriptor=file_descriptor,
+                    file_size=file_size,
+                    hash_names=hash_names,
+                    block_size=block_size,
+                    header_size=header_size,
+                    drop_cache=drop_cache,
+                )
+                hash_mode = "mmap"
+
+            except (OSError, ValueError) as error:
+                logger.debug(
+                    'Could not map file_path="%s", error="%s", '
+                    'falling back to streaming reads',
+                    file_path,
+                    error,
+                )
+
+        if hash_mode == "stream":
+            hash_dict, file_bytes, header_bytes = hash_file(
+                file_descriptor=file_descriptor,
+                hash_names=hash_names,
+                block_size=block_size,
+                header_size=header_size,
+                drop_cache=drop_cache,
+            )
 
-        for name, state in file_settings["hash_algorithms"].items():
-            if state == "enabled":
-                hash_method = getattr(hashlib, name)
-                file_hash = hash_method(file_data).hexdigest()
-                hash_dict[name] = file_hash
+    elapsed_seconds = time.perf_counter() - start_time
+
+    logger.debug(
+        'Hashed file_path="%s" with hash_algorithms="%s", '
+        'hash_mode="%s", file_bytes="%s", throughput_mbps="%.2f"',
+        file_path,
+        ",".join(hash_names),
+        hash_mode,
+        file_bytes,
+        get_throughput(file_bytes, elapsed_seconds),
+    )
 
     first_hash = next(
         iter(
@@ -59,7 +344,7 @@ def get_file_settings(
 
     file_object = {
         "file": {
-            "bytes": os.path.getsize(file_path),
+            "bytes": file_bytes,
             "type" : "unknown",
             "path" : file_path,
             "name" : file_name_clean.lower(),
@@ -68,33 +353,60 @@ def get_file_settings(
         "hash": hash_dict,
     }
 
-    return first_hash, file_object
+    return first_hash, file_object, header_bytes
 
 def process_file(
-        folder_settings:dict,
         file_path:str,
-        lock
+        stat_key:tuple=None,
 ):
-        file_type = "unknown"
-        file_hash, file_details = get_file_settings(file_path)
+        file_ext = os.path.splitext(file_path)[1].replace('.', '').lower()
+        settings = get_settings()
+
+        header_size = SNIFF_SIZE
+        if settings.metadata:
+            header_size = max(
+                settings.image_header_size,
+                SNIFF_SIZE,
+            )
+
+        with read_slot():
+            file_hash, file_details, header_bytes = get_file_settings(
+                file_path,
+                header_size=header_size,
+            )
+
+        file_type = get_file_type(
+            file_ext=file_ext,
+            header_bytes=header_bytes,
+        )
 
         logger.info(
-            f'Processing file_path="{file_path}" with '
-            f'file_hash={file_hash}" and '
-            f'file_ext="{file_details["file"]["extension"]}"'
+            'Processing file_path="%s" with file_hash="%s", '
+            'file_ext="%s" and file_type="%s"',
+            file_path,
+            file_hash,
+            file_details["file"]["extension"],
+            file_type,
+            extra=LOG_PER_FILE,
         )
 
-        for file_ext_type, file_ext_list in folder_settings["file_extensions"].items():
-            if file_details["file"]["extension"] in file_ext_list:
+        if file_type != "unknown":
+            file_details["file"]["type"] = file_type
 
-                file_type = file_ext_type
-                file_details["file"]["type"] = file_type
-                logger.info(f'Found matching known file_type="{file_type}"')
+            if file_type == "image" and settings.metadata:
+                file_details.update(
+                    get_image_settings(
+                        file_path,
+                        header_bytes=header_bytes,
+                    )
+                )
 
-                if file_details["file"]["type"] == "image":
-                    file_details.update(
-                        get_image_settings(file_path)
+            elif file_type == "video" and settings.metadata:
+                file_details.update(
+                    get_video_settings(
+                        file_path,
                     )
+                )
 
         file_dict = {
             "hashes": {
@@ -102,4 +414,164 @@ def process_file(
             }
         }
 
-        store_inventory(file_dict, lock)
\ No newline at end of file
+        store_inventory(
+            file_dict,
+            stat_key=stat_key,
+        )
+
+        add_metric("files_done")
+        add_metric("bytes_done", file_details["file"]["bytes"])
+
+def verify_file(
+    file_path: str,
+    verify_name: str,
+):
+    """
+    Get the verify digest of a file, or None when unreadable
+    """
+    try:
+        with open(file_path, "rb", buffering=0) as file_descriptor:
+            hash_dict, file_bytes, header_bytes = hash_file(
+                file_descriptor=file_descriptor,
+                hash_names=[verify_name],
+            )
+
+    except OSError as error:
+        logger.warning(
+            'Could not verify file_path="%s", error="%s"',
+            file_path,
+            error,
+        )
+        return None
+
+    return hash_dict[verify_name]
+
+def verify_collisions(
+    backend,
+    stored_paths: dict,
+    verify_name: str = None,
+) -> dict:
+    """
+    Compute a cryptographic hash only for files stored by current
+    run whose fast index hash is shared with another path
+
+    Groups without verify digest are verified as a whole, verified
+    groups only for their paths stored by current run; paths whose
+    content differs from the rest of the group are moved to records
+    of their own, keyed by their verify digest
+    """
+    if verify_name is None:
+        verify_name = get_settings().verify_hash
+
+    stored_entries = list(
+        backend.lookup_hashes(stored_paths)
+    )
+    inventory_index = build_index(stored_entries)
+    path_details = {
+        (file_hash, file_path): file_details
+        for entry_dict in stored_entries
+        for file_hash, file_details in entry_dict["hashes"].items()
+        for file_path in (
+            file_details["file"]["path"]
+            if isinstance(file_details["file"]["path"], list)
+            else [file_details["file"]["path"]]
+        )
+    }
+    verify_stats = {
+        "groups": 0,
+        "files": 0,
+        "collisions": 0,
+        "split": 0,
+    }
+    verified_entries = list()
+    removed_paths = dict()
+
+    for file_hash, file_record in inventory_index:
+        if len(file_record.paths) < 2:
+            continue
+
+        known_digest = file_record.digests.get(verify_name)
+        if known_digest is None:
+            check_paths = file_record.paths
+        else:
+            check_paths = [
+                file_path
+                for file_path in file_record.paths
+                if file_path in stored_paths.get(file_hash, ())
+            ]
+
+        content_paths = dict()
+        for file_path in check_paths:
+            verify_digest = verify_file(
+                file_path=file_path,
+                verify_name=verify_name,
+            )
+
+            if verify_digest is not None:
+                verify_stats["files"] += 1
+                content_paths.setdefault(verify_digest, list()).append(file_path)
+
+        if not content_paths:
+            continue
+
+        verify_stats["groups"] += 1
+        if known_digest is None:
+            group_digest = max(content_paths, key=lambda digest: len(content_paths[digest]))
+            file_record.add_digests({
+                verify_name: bytes.fromhex(group_digest)
+            })
+        else:
+            group_digest = known_digest.hex()
+
+        for file_path in content_paths.get(group_digest, ()):
+            verified_entries.append({
+                "hashes": {
+                    file_hash: file_record.to_details(file_path)
+                }
+            })
+
+        split_digests = [
+            verify_digest
+            for verify_digest in content_paths
+            if verify_digest != group_digest
+        ]
+        if not split_digests:
+            continue
+
+        verify_stats["collisions"] += 1
+        logger.warning(
+            'Index hash file_hash="%s" is shared by different '
+            'contents, moving paths="%s" to records of their own',
+            file_hash,
+            [content_paths[verify_digest] for verify_digest in split_digests],
+        )
+
+        for verify_digest in split_digests:
+            for file_path in content_paths[verify_digest]:
+                file_details = path_details.get((file_hash, file_path)) or file_record.to_details(file_path)
+                verified_entries.append({
+                    "hashes": {
+                        verify_digest: dict(
+                            file_details,
+                            file=dict(file_details["file"], path=file_path),
+                            hash=dict(file_details["hash"], **{verify_name: verify_digest}),
+                        )
+                    }
+                })
+                removed_paths.setdefault(file_hash, list()).append(file_path)
+                verify_stats["split"] += 1
+
+    if removed_paths:
+        backend.remove_paths(removed_paths)
+
+    if verified_entries:
+        backend.store(verified_entries)
+
+    logger.info(
+        'Verified index hash collisions with verify_hash="%s", '
+        'verify_stats="%s"',
+        verify_name,
+        verify_stats,
+    )
+
+    return verify_stats
@@ -1,9 +1,25 @@
 import os
+import re
+import time
+import queue
+import fnmatch
+import threading
 
+from change_cache import (
+	PATH_FILE_CACHE,
+	get_stat_key,
+	read_change_cache,
+	lookup_change_cache,
+)
 from file_processor import process_file
+from inventory_processor import store_inventory
+from metrics import (
+	instrument,
+	add_metric,
+)
+from processing_settings import get_settings
 from utilities import (
 	setup_logger,
-	read_settings,
 	get_script_details,
 	run_child,
 )
@@ -11,7 +27,6 @@ from utilities import (
 # GLOBAL VARIABLES
 SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
 PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
-PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
 
 # DEFINING LOGGING SETTINGS
 logger = setup_logger(
@@ -19,45 +34,346 @@ logger = setup_logger(
 	file_path=PATH_FILE_LOG,
 )
 
-folder_settings = read_settings(
-	settings_file=PATH_FILE_SETTINGS,
-	logger_object=logger,
-)
+# CLASSES
+class FileFilter:
+	"""
+	Select files from include and exclude globs, matched
+	against file names and full paths, and a maximum size
+	"""
 
-# FUNCTIONS
-def process_folder(pool, folder_path, lock):
+	def __init__(
+			self,
+			include:list=None,
+			exclude:list=None,
+			max_size:int=None,
+	):
+		self.include_pattern = self.compile_globs(include)
+		self.exclude_pattern = self.compile_globs(exclude)
+		self.max_size = max_size
 
-	logger.info(
-		f'Currently processing folder '
-		f'at folder_path="{folder_path}"'
-	)
+	@staticmethod
+	def compile_globs(
+			globs:list,
+	):
+		if not globs:
+			return None
+
+		return re.compile(
+			'|'.join(fnmatch.translate(glob) for glob in globs)
+		)
+
+	@staticmethod
+	def matches(
+			pattern,
+			file_path:str,
+	) -> bool:
+		return bool(
+			pattern.match(os.path.basename(file_path))
+			or pattern.match(file_path)
+		)
+
+	def accepts(
+			self,
+			file_path:str,
+			file_size:int,
+	) -> bool:
+		if self.max_size is not None and file_size > self.max_size:
+			return False
+
+		if self.include_pattern is not None and not self.matches(self.include_pattern, file_path):
+			return False
+
+		if self.exclude_pattern is not None and self.matches(self.exclude_pattern, file_path):
+			return False
+
+		return True
+
+class FolderWalker:
+	"""
+	Walk folder trees with several threads sharing a bounded
+	queue of folders, handing every file found to a callback
+	"""
+
+	def __init__(
+			self,
+			file_handler,
+			walker_count:int=None,
+			queue_size:int=None,
+			checkpoint=None,
+	):
+		if walker_count is None:
+			walker_count = get_settings().walker_count
+		if queue_size is None:
+			queue_size = get_settings().walker_queue_size
+
+		self.file_handler = file_handler
+		self.checkpoint = checkpoint
+		self.walker_count = walker_count
+		self.folder_queue = queue.Queue(maxsize=queue_size)
+		self.stats_lock = threading.Lock()
+		self.entries_count = 0
+		self.files_count = 0
+		self.folders_count = 0
 
-	for item in os.listdir(folder_path):
-		item_path = os.path.join(
+	@instrument("process_folder")
+	def process_folder(
+			self,
+			folder_path:str,
+	) -> list:
+		"""
+		List a folder, handing files over to the file handler
+		and returning subfolders left to walk; when checkpoints
+		are tracked, every file submitted to the pool holds the
+		folder pending until the inventory writer acknowledges
+		storing its result
+		"""
+		subfolder_paths = list()
+		entries_count = 0
+		files_count = 0
+
+		logger.debug(
+			'Currently processing folder at folder_path="%s"',
 			folder_path,
-			item,
 		)
 
-		if os.path.isfile(item_path):
-			run_child(
-				pool=pool,
-				function=process_file,
-				args=(
-					folder_settings,
-					item_path,
-					lock,
+		try:
+			with os.scandir(folder_path) as folder_entries:
+				for folder_entry in folder_entries:
+					entries_count += 1
+
+					try:
+						if folder_entry.is_dir(follow_symlinks=False):
+							subfolder_paths.append(folder_entry.path)
+
+						elif folder_entry.is_file():
+							files_count += 1
+							file_stat = folder_entry.stat()
+
+							if self.checkpoint is not None:
+								self.checkpoint.add_file(
+									folder_path=folder_path,
+									file_path=folder_entry.path,
+								)
+
+							file_future = self.file_handler(
+								folder_entry.path,
+								file_stat,
+							)
+
+							if self.checkpoint is not None and file_future is None:
+								self.checkpoint.release_files([folder_entry.path])
+
+						else:
+							logger.warning(
+								f'Could not determine type of current '
+								f'object at item_path="{folder_entry.path}"'
+							)
+
+					except OSError:
+						logger.warning(
+							f'Could not read status of current '
+							f'object at item_path="{folder_entry.path}"'
+						)
+
+		except OSError:
+			logger.warning(
+				f'Could not list content of folder_path="{folder_path}"'
+			)
+
+		with self.stats_lock:
+			self.entries_count += entries_count
+			self.files_count += files_count
+			self.folders_count += 1
+
+		if self.checkpoint is not None:
+			subfolder_paths = [
+				subfolder_path
+				for subfolder_path in subfolder_paths
+				if not self.checkpoint.is_completed(subfolder_path)
+			]
+			for subfolder_path in subfolder_paths:
+				self.checkpoint.add_folder(
+					folder_path=subfolder_path,
+					parent_path=folder_path,
+				)
+			self.checkpoint.release(folder_path)
+
+		return subfolder_paths
+
+	def walk_worker(self):
+		"""
+		Process folders from the shared queue, keeping subfolders
+		in a local stack whenever the shared queue is full
+		"""
+		while True:
+			folder_path = self.folder_queue.get()
+
+			try:
+				if folder_path is None:
+					return
+
+				folder_stack = [folder_path]
+				while folder_stack:
+					for subfolder_path in self.process_folder(folder_stack.pop()):
+						try:
+							self.folder_queue.put_nowait(subfolder_path)
+
+						except queue.Full:
+							folder_stack.append(subfolder_path)
+
+			except Exception:
+				logger.exception(
+					f'Unexpected error while walking folder_path="{folder_path}"'
 				)
+
+			finally:
+				self.folder_queue.task_done()
+
+	def walk(
+			self,
+			folder_paths:list,
+	) -> dict:
+		"""
+		Walk every folder tree and wait for completion
+		"""
+		start_time = time.perf_counter()
+		walker_threads = [
+			threading.Thread(
+				target=self.walk_worker,
+				name=f'{SCRIPT_NAME}-{walker_index}',
+				daemon=True,
 			)
-			
-		elif os.path.isdir(item_path):
-			run_child(
-				pool=pool,
-				function=process_folder,
-				args=(item_path, lock)
+			for walker_index in range(self.walker_count)
+		]
+
+		for walker_thread in walker_threads:
+			walker_thread.start()
+
+		for folder_path in folder_paths:
+			if self.checkpoint is not None:
+				if self.checkpoint.is_completed(folder_path):
+					logger.info(
+						f'Skipping completed folder_path="{folder_path}"'
+					)
+					continue
+
+				self.checkpoint.add_folder(folder_path)
+
+			self.folder_queue.put(folder_path)
+
+		self.folder_queue.join()
+
+		for walker_thread in walker_threads:
+			self.folder_queue.put(None)
+		for walker_thread in walker_threads:
+			walker_thread.join()
+
+		elapsed_seconds = time.perf_counter() - start_time
+		walk_stats = {
+			"entries": self.entries_count,
+			"files": self.files_count,
+			"folders": self.folders_count,
+			"elapsed_seconds": elapsed_seconds,
+			"entries_per_second": (
+				self.entries_count / elapsed_seconds
+				if elapsed_seconds > 0 else float(0)
+			),
+		}
+
+		logger.info(
+			f'Walked folders_count="{self.folders_count}", '
+			f'files_count="{self.files_count}", '
+			f'entries_count="{self.entries_count}" '
+			f'at walk_rate="{walk_stats["entries_per_second"]:.0f}" entries/s'
+		)
+
+		return walk_stats
+
+# FUNCTIONS
+def dispatch_file(
+		pool,
+		file_path:str,
+		file_stat:os.stat_result,
+		cache_dict:dict=None,
+		file_filter:FileFilter=None,
+):
+	"""
+	Reuse the previous result of an unchanged file,
+	or submit it to hashing workers and return its future
+	"""
+	if file_filter is not None and not file_filter.accepts(file_path, file_stat.st_size):
+		logger.debug(
+			'Skipping filtered file_path="%s"',
+			file_path,
+		)
+		return None
+
+	stat_key = get_stat_key(file_stat)
+	add_metric("files_discovered")
+	add_metric("bytes_discovered", file_stat.st_size)
+
+	if cache_dict is not None:
+		cached_entry = lookup_change_cache(
+			cache_dict=cache_dict,
+			file_path=file_path,
+			stat_key=stat_key,
+		)
+
+		if cached_entry is not None:
+			store_inventory(
+				cached_entry,
+				stat_key=stat_key,
+				cached=True,
 			)
+			add_metric("files_done")
+			add_metric("bytes_done", file_stat.st_size)
+			return None
 
-		else:
-			logger.warn(
-				f'Could not determine type of current '
-				f'object at item_path="{item_path}"'
-			)
\ No newline at end of file
+	return run_child(
+		pool=pool,
+		function=process_file,
+		args=(
+			file_path,
+			stat_key,
+		),
+		logger_object=logger,
+	)
+
+def process_folders(
+		pool,
+		folder_paths:list,
+		incremental:bool=None,
+		cache_file:str=PATH_FILE_CACHE,
+		checkpoint=None,
+		walker_count:int=None,
+		file_filter:FileFilter=None,
+) -> dict:
+	"""
+	Walk source folders and stream their files to the pool,
+	reusing results of the change cache in incremental mode
+	"""
+	if incremental is None:
+		incremental = get_settings().incremental
+
+	cache_dict = None
+	if incremental:
+		cache_dict = read_change_cache(
+			cache_file=cache_file,
+			signature=get_settings().get_signature(),
+		)
+
+	folder_walker = FolderWalker(
+		file_handler=lambda file_path, file_stat: dispatch_file(
+			pool=pool,
+			file_path=file_path,
+			file_stat=file_stat,
+			cache_dict=cache_dict,
+			file_filter=file_filter,
+		),
+		walker_count=walker_count,
+		checkpoint=checkpoint,
+	)
+
+	return folder_walker.walk(
+		folder_paths=folder_paths,
+	)
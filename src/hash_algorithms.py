@@ -0,0 +1,92 @@
+import os
+import hashlib
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+try:
+	import xxhash
+except ImportError:
+	xxhash = None
+
+try:
+	import blake3
+except ImportError:
+	blake3 = None
+
+# GLOBAL VARIABLES
+STANDARD_HASHES = frozenset(
+	hash_name
+	for hash_name in hashlib.algorithms_available
+	if not hash_name.startswith('shake_')
+)
+FAST_HASHES = {
+	"blake2b-64": lambda: hashlib.blake2b(digest_size=8),
+	"blake2b-128": lambda: hashlib.blake2b(digest_size=16),
+}
+if xxhash is not None:
+	FAST_HASHES.update({
+		"xxh64": xxhash.xxh64,
+		"xxh3_64": xxhash.xxh3_64,
+		"xxh3_128": xxhash.xxh3_128,
+	})
+if blake3 is not None:
+	FAST_HASHES["blake3"] = blake3.blake3
+HASH_FALLBACKS = {
+	"xxh64": "sha1",
+	"xxh3_64": "sha1",
+	"xxh3_128": "sha1",
+	"blake3": "sha256",
+}
+HASH_NAMES = sorted(
+	STANDARD_HASHES | set(FAST_HASHES) | set(HASH_FALLBACKS)
+)
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+missing_hashes = set()
+
+# FUNCTIONS
+def resolve_hash_name(
+		hash_name:str,
+) -> str:
+	"""
+	Get the algorithm actually computed for a hash name,
+	replacing fast hashes whose module is not installed
+	by the fastest standard library counterpart, since
+	hashlib's blake2 runs slower than its sha1 and sha256
+	"""
+	if hash_name in FAST_HASHES or hash_name in STANDARD_HASHES:
+		return hash_name
+
+	if hash_name not in HASH_FALLBACKS:
+		raise ValueError(f'Unsupported hash algorithm "{hash_name}"')
+
+	fallback_name = HASH_FALLBACKS[hash_name]
+	if hash_name not in missing_hashes:
+		missing_hashes.add(hash_name)
+		logger.warning(
+			f'Module for hash_name="{hash_name}" is not installed, '
+			f'computing fallback_name="{fallback_name}" instead'
+		)
+
+	return fallback_name
+
+def new_hash(
+		hash_name:str,
+):
+	hash_factory = FAST_HASHES.get(hash_name)
+
+	if hash_factory is not None:
+		return hash_factory()
+
+	return hashlib.new(hash_name)
@@ -1,11 +1,15 @@
+import io
 import os
+import math
 from PIL import Image
 from PIL.ExifTags import TAGS
 from datetime import datetime
 
+from metrics import instrument
+from processing_settings import get_settings
 from utilities import (
+    LOG_PER_FILE,
     setup_logger,
-    read_settings,
     get_creation_date,
     get_script_details,
 )
@@ -13,10 +17,18 @@ from utilities import (
 # GLOBAL VARIABLES
 DATE_FORMAT = "%Y-%m-%d - %H:%M:%S"
 EXIF_EXTRA_FIELDS = ["Make", "Model", "Artist"]
+PERCEPTUAL_HASH_SIZE = 8
+DCT_INPUT_SIZE = 32
+DCT_MATRIX = [
+    [
+        math.cos(math.pi * (2 * column + 1) * row / (2 * DCT_INPUT_SIZE))
+        for column in range(DCT_INPUT_SIZE)
+    ]
+    for row in range(PERCEPTUAL_HASH_SIZE)
+]
 
 SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
 PATH_FILE_LOG = os.path.join(SCRIPT_HOME,'var','log',SCRIPT_NAME + '.log')
-PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
 PATH_FILE_OUTPUT = os.path.join(SCRIPT_HOME, 'var', 'lib', SCRIPT_NAME + '.json')
 
 # DEFINING LOGGING SETTINGS
@@ -25,17 +37,13 @@ logger = setup_logger(
 	file_path=PATH_FILE_LOG,
 )
 
-image_settings = read_settings(
-	settings_file=PATH_FILE_SETTINGS,
-	logger_object=logger,
-)
-
 # FUNCTIONS
 def get_labeled_exif(
+    image_object: Image.Image,
     file_path: str,
 ):
     """
-    Collect EXIF data from an image file
+    Collect EXIF data from an opened image
     with matching labels
     """
 
@@ -46,8 +54,7 @@ def get_labeled_exif(
         return exif_data_labeled
 
     else:
-        image = Image.open(file_path)
-        exif_data_raw = image.getexif()
+        exif_data_raw = image_object.getexif()
 
         if exif_data_raw is not None:
             for (key, val) in exif_data_raw.items():
@@ -56,45 +63,47 @@ def get_labeled_exif(
         return exif_data_labeled
 
 def get_exif_date(
-    exif_settings: dict,
+    exif_dates: tuple,
     exif_data: dict,
 ):
     """
-    Get a date from EXIF data input
+    Get a date from EXIF data input, trying
+    (field, confidence) pairs in priority order
     """
     date_field = None
     date_confidence = None
     exif_date_timestamp = 0
 
-    for field_settings in exif_settings:
-
-        for current_field, current_confidence in field_settings.items():
-
-            if current_field in exif_data:
+    for current_field, current_confidence in exif_dates:
 
-                date_field = current_field
-                date_confidence = current_confidence
-                exif_date = exif_data.get(
-                    current_field
-                )
+        if current_field in exif_data:
 
-                exif_date_timestamp = datetime.timestamp(
-                    datetime.strptime(
-                        exif_date,
-                        "%Y:%m:%d %H:%M:%S"
-                    )
-                )
-                logger.info(
-                    f'Found EXIF date_field="{date_field}" '
-                    f'with date_confidence="{date_confidence}", '
-                    f'collecting date_timestamp="{exif_date_timestamp}"'
-                )
+            date_field = current_field
+            date_confidence = current_confidence
+            exif_date = exif_data.get(
+                current_field
+            )
 
-                return (
-                    date_field,
-                    date_confidence,
-                    exif_date_timestamp,
+            exif_date_timestamp = datetime.timestamp(
+                datetime.strptime(
+                    exif_date,
+                    "%Y:%m:%d %H:%M:%S"
                 )
+            )
+            logger.info(
+                'Found EXIF date_field="%s" with date_confidence="%s", '
+                'collecting date_timestamp="%s"',
+                date_field,
+                date_confidence,
+                exif_date_timestamp,
+                extra=LOG_PER_FILE,
+            )
+
+            return (
+                date_field,
+                date_confidence,
+                exif_date_timestamp,
+            )
 
     return (
         date_field,
@@ -103,9 +112,8 @@ def get_exif_date(
     )
 
 def get_image_quality(
-    file_path:str,
+    image_object: Image.Image,
 ):
-    image_object = Image.open(file_path)
     quality_dict = {
         "quality": {
             "resolution":
@@ -119,8 +127,202 @@ def get_image_quality(
     }
     return quality_dict
 
+def get_bits_hex(
+    bits,
+) -> str:
+    """
+    Pack a sequence of booleans into a fixed width hex string
+    """
+    hash_value = 0
+    bit_count = 0
+
+    for bit in bits:
+        hash_value = hash_value << 1 | bool(bit)
+        bit_count += 1
+
+    return format(hash_value, f'0{bit_count // 4}x')
+
+def get_average_hash(
+    gray_image: Image.Image,
+) -> str:
+    """
+    Compare each pixel of a reduced image with the mean
+    """
+    pixels = list(
+        gray_image.resize(
+            (PERCEPTUAL_HASH_SIZE, PERCEPTUAL_HASH_SIZE),
+            Image.Resampling.BOX,
+        ).getdata()
+    )
+    mean_value = sum(pixels) / len(pixels)
+
+    return get_bits_hex(pixel > mean_value for pixel in pixels)
+
+def get_difference_hash(
+    gray_image: Image.Image,
+) -> str:
+    """
+    Compare each pixel of a reduced image with its right neighbour
+    """
+    row_size = PERCEPTUAL_HASH_SIZE + 1
+    pixels = list(
+        gray_image.resize(
+            (row_size, PERCEPTUAL_HASH_SIZE),
+            Image.Resampling.BOX,
+        ).getdata()
+    )
+
+    return get_bits_hex(
+        pixels[row * row_size + column] > pixels[row * row_size + column + 1]
+        for row in range(PERCEPTUAL_HASH_SIZE)
+        for column in range(PERCEPTUAL_HASH_SIZE)
+    )
+
+def get_dct_hash(
+    gray_image: Image.Image,
+) -> str:
+    """
+    Compare low frequency DCT coefficients of a
+    reduced image with their median, skipping the mean
+    """
+    pixels = list(
+        gray_image.resize(
+            (DCT_INPUT_SIZE, DCT_INPUT_SIZE),
+            Image.Resampling.BOX,
+        ).getdata()
+    )
+    rows = [
+        pixels[row * DCT_INPUT_SIZE:(row + 1) * DCT_INPUT_SIZE]
+        for row in range(DCT_INPUT_SIZE)
+    ]
+    row_coefficients = [
+        [
+            sum(cosine * pixel for cosine, pixel in zip(cosines, row))
+            for cosines in DCT_MATRIX
+        ]
+        for row in rows
+    ]
+    coefficients = [
+        sum(
+            cosines[row_index] * row_coefficients[row_index][column]
+            for row_index in range(DCT_INPUT_SIZE)
+        )
+        for cosines in DCT_MATRIX
+        for column in range(PERCEPTUAL_HASH_SIZE)
+    ]
+    median_value = sorted(coefficients[1:])[len(coefficients[1:]) // 2]
+
+    return get_bits_hex(
+        coefficient > median_value
+        for coefficient in coefficients
+    )
+
+PERCEPTUAL_HASHES = {
+    "ahash": get_average_hash,
+    "dhash": get_difference_hash,
+    "phash": get_dct_hash,
+}
+
+def get_perceptual_hashes(
+    image_object: Image.Image,
+    hash_names: list,
+) -> dict:
+    """
+    Compute perceptual hashes from a grayscale decode,
+    letting JPEG decoders scale down while decoding
+    """
+    image_object.draft('L', (DCT_INPUT_SIZE * 2, DCT_INPUT_SIZE * 2))
+    gray_image = image_object.convert('L')
+
+    return {
+        name: PERCEPTUAL_HASHES[name](gray_image)
+        for name in hash_names
+    }
+
+def read_image_metadata(
+    image_source,
+    file_path: str,
+):
+    """
+    Get EXIF data and quality from a lazily opened
+    image, only parsing headers without decoding pixels
+    """
+    with Image.open(image_source) as image_object:
+        exif_data = get_labeled_exif(
+            image_object=image_object,
+            file_path=file_path,
+        )
+        quality_dict = get_image_quality(
+            image_object=image_object,
+        )
+
+    return exif_data, quality_dict
+
+def read_perceptual_hashes(
+    image_source,
+    perceptual_names: list,
+) -> dict:
+    """
+    Decode image pixels to compute perceptual hashes
+    """
+    with Image.open(image_source) as image_object:
+        return get_perceptual_hashes(
+            image_object=image_object,
+            hash_names=perceptual_names,
+        )
+
+def get_image_metadata(
+    file_path: str,
+    header_bytes: bytes = None,
+    perceptual_names: list = None,
+):
+    """
+    Get image metadata from the header bytes already read
+    while hashing, only opening the file again when
+    metadata lies beyond those bytes, or to decode pixels
+    of an image larger than those bytes
+    """
+    image_metadata = None
+
+    if header_bytes:
+        try:
+            image_metadata = read_image_metadata(
+                image_source=io.BytesIO(header_bytes),
+                file_path=file_path,
+            )
+
+        except (OSError, SyntaxError, ValueError, EOFError):
+            logger.debug(
+                'Header of file_path="%s" is not enough '
+                'to read metadata, opening file',
+                file_path,
+            )
+
+    if image_metadata is None:
+        image_metadata = read_image_metadata(
+            image_source=file_path,
+            file_path=file_path,
+        )
+
+    exif_data, quality_dict = image_metadata
+    perceptual_dict = dict()
+
+    if perceptual_names:
+        image_source = file_path
+        if header_bytes and len(header_bytes) < get_settings().image_header_size:
+            image_source = io.BytesIO(header_bytes)
+
+        perceptual_dict = read_perceptual_hashes(
+            image_source=image_source,
+            perceptual_names=perceptual_names,
+        )
+
+    return exif_data, quality_dict, perceptual_dict
+
+@instrument("get_image_settings")
 def get_image_settings(
     file_path: str,
+    header_bytes: bytes = None,
 ):
     """
     Process an input image file to get settings
@@ -129,14 +331,18 @@ def get_image_settings(
     """
     image_info = dict()
 
-    exif_settings = image_settings["date_confidence"]["exif"]
+    settings = get_settings()
 
     logger.info(
-        f'Processing file_path="{file_path}"'
+        'Processing file_path="%s"',
+        file_path,
+        extra=LOG_PER_FILE,
     )
 
-    exif_data = get_labeled_exif(
+    exif_data, quality_dict, perceptual_dict = get_image_metadata(
         file_path=file_path,
+        header_bytes=header_bytes,
+        perceptual_names=settings.perceptual_names,
     )
 
     (
@@ -144,7 +350,7 @@ def get_image_settings(
         date_confidence,
         date_timestamp,
     ) = get_exif_date(
-        exif_settings=exif_settings,
+        exif_dates=settings.exif_dates,
         exif_data=exif_data,
     )
 
@@ -153,8 +359,6 @@ def get_image_settings(
         or date_confidence is None
         or date_timestamp == 0
     ):
-        file_settings = image_settings["date_confidence"]["file"]
-
         date_type = "CREATION"
 
         (
@@ -163,8 +367,10 @@ def get_image_settings(
             date_value,
         ) = get_creation_date(
             file_path=file_path,
-            file_settings=file_settings,
+            date_confidences=settings.image_file_dates,
+            logger_object=logger,
         )
+        date_timestamp = getattr(os.stat(file_path), 'st_' + date_field)
 
     else:
         date_type = "EXIF"
@@ -195,9 +401,10 @@ def get_image_settings(
     })
 
     image_info.update(
-        get_image_quality(
-            file_path
-        )
+        quality_dict
     )
 
+    if perceptual_dict:
+        image_info.update({"perceptual":perceptual_dict})
+
     return image_info
\ No newline at end of file
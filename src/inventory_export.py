@@ -0,0 +1,433 @@
+import os
+import csv
+import sys
+import json
+import mmap
+import array
+import struct
+import argparse
+
+from inventory_processor import (
+	INVENTORY_BACKENDS,
+	get_backend,
+)
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+EXPORT_COLUMNS = (
+	("path", "str"),
+	("size", "int64"),
+	("hash", "str"),
+	("type", "str"),
+	("extension", "str"),
+	("date_timestamp", "float64"),
+	("width", "int64"),
+	("height", "int64"),
+	("make", "str"),
+	("model", "str"),
+)
+ARRAY_TYPECODES = {
+	"int64": 'q',
+	"float64": 'd',
+	"uint64": 'Q',
+	"bool": 'B',
+}
+COLUMNAR_MAGIC = b'DCCOLS01'
+COLUMNAR_ALIGNMENT = 8
+COLUMNAR_FOOTER = struct.Struct('<Q8s')
+ROW_GROUP_SIZE = 65536
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+PATH_FOLDER_OUTPUT = os.path.join(SCRIPT_HOME, 'var', 'lib')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+export_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+# CLASSES
+class CsvExporter:
+	"""
+	Write rows as CSV, missing values being empty fields
+	"""
+
+	file_extension = '.csv'
+
+	def __init__(
+			self,
+			output_file:str,
+	):
+		self.output_stream = open(output_file, 'w', encoding='utf8', newline='')
+		self.csv_writer = csv.writer(self.output_stream)
+		self.csv_writer.writerow(column_name for column_name, _ in EXPORT_COLUMNS)
+
+	def write_row(
+			self,
+			row_values:tuple,
+	):
+		self.csv_writer.writerow(
+			'' if value is None else value
+			for value in row_values
+		)
+
+	def close(self):
+		self.output_stream.close()
+
+class ColumnarExporter:
+	"""
+	Write rows as column buffers grouped by row_group_size rows,
+	followed by a JSON footer giving the offset of every buffer,
+	so that a column can be read without parsing the others
+
+	Numeric columns are native arrays, string columns are UTF-8
+	data with uint64 end offsets, and each column has a byte per
+	row telling whether the value is set. Buffers are aligned on
+	8 bytes, so a memory map can be cast without copy
+	"""
+
+	file_extension = '.cols'
+
+	def __init__(
+			self,
+			output_file:str,
+			row_group_size:int=None,
+	):
+		self.row_group_size = row_group_size or export_settings.get(
+			"row_group_size",
+			ROW_GROUP_SIZE,
+		)
+		self.output_stream = open(output_file, 'wb')
+		self.output_stream.write(COLUMNAR_MAGIC)
+		self.row_groups = list()
+		self.pending_rows = list()
+
+	def write_row(
+			self,
+			row_values:tuple,
+	):
+		self.pending_rows.append(row_values)
+
+		if len(self.pending_rows) >= self.row_group_size:
+			self.flush()
+
+	def write_buffer(
+			self,
+			buffer_bytes,
+	) -> list:
+		"""
+		Append an aligned buffer, returning its offset and length
+		"""
+		padding = -self.output_stream.tell() % COLUMNAR_ALIGNMENT
+		if padding:
+			self.output_stream.write(b'\0' * padding)
+
+		buffer_offset = self.output_stream.tell()
+		self.output_stream.write(buffer_bytes)
+
+		return [buffer_offset, len(buffer_bytes)]
+
+	def flush(self):
+		"""
+		Write pending rows as a row group
+		"""
+		if not self.pending_rows:
+			return
+
+		column_buffers = dict()
+
+		for column_index, (column_name, column_type) in enumerate(EXPORT_COLUMNS):
+			column_values = [row_values[column_index] for row_values in self.pending_rows]
+			buffers_dict = {
+				"validity": self.write_buffer(
+					bytes(value is not None for value in column_values)
+				),
+			}
+
+			if column_type == "str":
+				encoded_values = [
+					b'' if value is None else value.encode('utf8', 'surrogateescape')
+					for value in column_values
+				]
+				end_offsets = array.array(ARRAY_TYPECODES["uint64"])
+				end_offset = 0
+				for encoded_value in encoded_values:
+					end_offset += len(encoded_value)
+					end_offsets.append(end_offset)
+
+				buffers_dict["offsets"] = self.write_buffer(end_offsets.tobytes())
+				buffers_dict["data"] = self.write_buffer(b''.join(encoded_values))
+
+			else:
+				missing_value = float('nan') if column_type == "float64" else 0
+				buffers_dict["data"] = self.write_buffer(
+					array.array(
+						ARRAY_TYPECODES[column_type],
+						(missing_value if value is None else value for value in column_values),
+					).tobytes()
+				)
+
+			column_buffers[column_name] = buffers_dict
+
+		self.row_groups.append({
+			"rows": len(self.pending_rows),
+			"columns": column_buffers,
+		})
+		self.pending_rows = list()
+
+	def close(self):
+		self.flush()
+
+		footer_bytes = json.dumps({
+			"byteorder": sys.byteorder,
+			"columns": [list(column) for column in EXPORT_COLUMNS],
+			"row_groups": self.row_groups,
+		}).encode('utf8')
+
+		self.output_stream.write(footer_bytes)
+		self.output_stream.write(COLUMNAR_FOOTER.pack(len(footer_bytes), COLUMNAR_MAGIC))
+		self.output_stream.close()
+
+class ColumnarReader:
+	"""
+	Read a columnar export through a memory map, numeric
+	columns being returned as memoryviews over the file
+	"""
+
+	def __init__(
+			self,
+			input_file:str,
+	):
+		self.input_stream = open(input_file, 'rb')
+		self.file_map = mmap.mmap(self.input_stream.fileno(), 0, access=mmap.ACCESS_READ)
+
+		footer_length, footer_magic = COLUMNAR_FOOTER.unpack_from(
+			self.file_map,
+			len(self.file_map) - COLUMNAR_FOOTER.size,
+		)
+		if self.file_map[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC or footer_magic != COLUMNAR_MAGIC:
+			raise ValueError(f'Not a columnar export: {input_file}')
+
+		footer_offset = len(self.file_map) - COLUMNAR_FOOTER.size - footer_length
+		footer_dict = json.loads(self.file_map[footer_offset:footer_offset + footer_length])
+
+		if footer_dict["byteorder"] != sys.byteorder:
+			raise ValueError(f'Columnar export written with byteorder="{footer_dict["byteorder"]}"')
+
+		self.column_types = dict(footer_dict["columns"])
+		self.row_groups = footer_dict["row_groups"]
+
+	def get_buffer(
+			self,
+			buffer_range:list,
+	) -> memoryview:
+		buffer_offset, buffer_length = buffer_range
+		return memoryview(self.file_map)[buffer_offset:buffer_offset + buffer_length]
+
+	def read_column(
+			self,
+			column_name:str,
+			row_group_index:int,
+	):
+		"""
+		Get (values, validity) of a column in a row group, values
+		of numeric columns being cast from the map without copy
+		"""
+		buffers_dict = self.row_groups[row_group_index]["columns"][column_name]
+		column_type = self.column_types[column_name]
+		validity = self.get_buffer(buffers_dict["validity"])
+
+		if column_type != "str":
+			return self.get_buffer(buffers_dict["data"]).cast(ARRAY_TYPECODES[column_type]), validity
+
+		end_offsets = self.get_buffer(buffers_dict["offsets"]).cast(ARRAY_TYPECODES["uint64"])
+		string_data = self.get_buffer(buffers_dict["data"])
+		column_values = list()
+		start_offset = 0
+
+		for end_offset in end_offsets:
+			column_values.append(
+				bytes(string_data[start_offset:end_offset]).decode('utf8', 'surrogateescape')
+			)
+			start_offset = end_offset
+
+		return column_values, validity
+
+	def iter_column(
+			self,
+			column_name:str,
+	):
+		"""
+		Yield values of a column one row group at a time,
+		missing values being None
+		"""
+		for row_group_index in range(len(self.row_groups)):
+			column_values, validity = self.read_column(column_name, row_group_index)
+
+			for value, is_set in zip(column_values, validity):
+				yield value if is_set else None
+
+	def iter_rows(
+			self,
+			column_names:list=None,
+	):
+		"""
+		Yield rows as dicts holding the requested columns
+		"""
+		column_names = column_names or list(self.column_types)
+
+		for row_group_index in range(len(self.row_groups)):
+			column_items = [
+				self.read_column(column_name, row_group_index)
+				for column_name in column_names
+			]
+
+			for row_index in range(self.row_groups[row_group_index]["rows"]):
+				yield {
+					column_name: column_values[row_index] if validity[row_index] else None
+					for column_name, (column_values, validity) in zip(column_names, column_items)
+				}
+
+	def __len__(self):
+		return sum(row_group["rows"] for row_group in self.row_groups)
+
+	def close(self):
+		self.file_map.close()
+		self.input_stream.close()
+
+EXPORT_FORMATS = {
+	"csv": CsvExporter,
+	"columnar": ColumnarExporter,
+}
+
+# FUNCTIONS
+def get_first(
+		value,
+):
+	"""
+	Get the first item of a value which a legacy merge
+	may have turned into a list
+	"""
+	if isinstance(value, list):
+		return value[0] if value else None
+
+	return value
+
+def iter_rows(
+		entries,
+):
+	"""
+	Yield one row per distinct path of every inventory record,
+	records being expected once each as yielded by iter_records
+	"""
+	for entry_dict in entries:
+		for file_hash, file_details in entry_dict.get("hashes", dict()).items():
+			file_info = file_details.get("file") or dict()
+			date_info = file_details.get("date") or dict()
+			resolution = (file_details.get("quality") or dict()).get("resolution") or dict()
+			device_info = file_details.get("device") or dict()
+
+			file_paths = file_info.get("path")
+			if not isinstance(file_paths, list):
+				file_paths = [file_paths]
+
+			for file_path in dict.fromkeys(file_paths):
+				if file_path is None:
+					continue
+
+				yield (
+					file_path,
+					get_first(file_info.get("bytes")),
+					file_hash,
+					get_first(file_info.get("type")),
+					get_first(file_info.get("extension")),
+					get_first(date_info.get("date_timestamp")),
+					get_first(resolution.get("width")),
+					get_first(resolution.get("height")),
+					get_first(device_info.get("Make")),
+					get_first(device_info.get("Model")),
+				)
+
+def export_columns(
+		output_file:str=None,
+		export_format:str=None,
+		backend=None,
+) -> int:
+	"""
+	Stream the records of a backend into a flat export,
+	returning the number of rows written
+	"""
+	if export_format is None:
+		export_format = export_settings.get("format", "columnar")
+
+	exporter_class = EXPORT_FORMATS[export_format]
+	if output_file is None:
+		output_file = os.path.join(
+			PATH_FOLDER_OUTPUT,
+			'hash_inventory' + exporter_class.file_extension,
+		)
+
+	if backend is None:
+		backend = get_backend()
+
+	os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+	temporary_file = output_file + '.tmp'
+	exporter = exporter_class(temporary_file)
+	rows_count = 0
+
+	try:
+		for row_values in iter_rows(backend.iter_records()):
+			exporter.write_row(row_values)
+			rows_count += 1
+
+	finally:
+		exporter.close()
+
+	os.replace(temporary_file, output_file)
+
+	logger.info(
+		f'Exported rows_count="{rows_count}" with export_format="{export_format}" '
+		f'to output_path="{output_file}"'
+	)
+
+	return rows_count
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Export the hash inventory as flat typed columns',
+	)
+	parser.add_argument(
+		'--backend',
+		choices=sorted(INVENTORY_BACKENDS),
+		default=None,
+	)
+	parser.add_argument(
+		'--format',
+		dest='export_format',
+		choices=sorted(EXPORT_FORMATS),
+		default=None,
+	)
+	parser.add_argument(
+		'--output',
+		default=None,
+	)
+	arguments = parser.parse_args()
+
+	export_columns(
+		output_file=arguments.output,
+		export_format=arguments.export_format,
+		backend=get_backend(arguments.backend),
+	)
@@ -0,0 +1,436 @@
+import os
+import sys
+
+from merge_engine import get_confidence_rank
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+# GLOBAL VARIABLES
+DATE_FIELDS = (
+	"date_type",
+	"date_field",
+	"date_confidence",
+	"date_timestamp",
+	"date_human",
+)
+DEVICE_FIELDS = ("Make", "Model", "Artist")
+QUALITY_FIELDS = ("resolution", "format", "mode")
+CONFIDENCE_FIELD = DATE_FIELDS.index("date_confidence")
+
+digest_layouts = dict()
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class FileRecord:
+	"""
+	Compact inventory record of one content, shared by every
+	path holding it: repeated strings are interned, digests are
+	concatenated into a single bytes object described by a shared
+	layout and nested sections are flattened into tuples
+	"""
+
+	__slots__ = (
+		"path_value",
+		"extension",
+		"file_type",
+		"size",
+		"digest_layout",
+		"digest_blob",
+		"date",
+		"quality",
+		"device",
+		"extras",
+	)
+
+	def __init__(self):
+		self.path_value = None
+		self.extension = None
+		self.file_type = None
+		self.size = None
+		self.digest_layout = ()
+		self.digest_blob = b''
+		self.date = None
+		self.quality = None
+		self.device = None
+		self.extras = None
+
+	@property
+	def paths(self) -> list:
+		if self.path_value is None:
+			return list()
+
+		if isinstance(self.path_value, list):
+			return self.path_value
+
+		return [self.path_value]
+
+	def add_path(
+			self,
+			file_path:str,
+	):
+		"""
+		Add a path, only allocating a list once
+		a second path holds the same content
+		"""
+		if self.path_value is None:
+			self.path_value = file_path
+
+		elif isinstance(self.path_value, list):
+			if file_path not in self.path_value:
+				self.path_value.append(file_path)
+
+		elif self.path_value != file_path:
+			self.path_value = [self.path_value, file_path]
+
+	@property
+	def digests(self) -> dict:
+		digests_dict = dict()
+		offset = 0
+
+		for algorithm, digest_size in self.digest_layout:
+			digests_dict[algorithm] = self.digest_blob[offset:offset + digest_size]
+			offset += digest_size
+
+		return digests_dict
+
+	def add_digests(
+			self,
+			new_digests:dict,
+	):
+		"""
+		Add digests of algorithms not known yet
+		"""
+		digests_dict = self.digests
+		for algorithm, digest in new_digests.items():
+			digests_dict.setdefault(algorithm, digest)
+
+		if len(digests_dict) == len(self.digest_layout):
+			return
+
+		self.digest_layout = get_digest_layout(
+			tuple(
+				(algorithm, len(digest))
+				for algorithm, digest in digests_dict.items()
+			)
+		)
+		self.digest_blob = b''.join(digests_dict.values())
+
+	@classmethod
+	def from_details(
+			cls,
+			file_details:dict,
+	):
+		file_record = cls()
+		file_record.merge_details(file_details)
+
+		return file_record
+
+	def merge_details(
+			self,
+			file_details:dict,
+	):
+		"""
+		Merge an inventory entry in place, adding new paths and
+		digests, filling sections not known yet and keeping the
+		date with the highest confidence
+		"""
+		for section, section_value in file_details.items():
+
+			if section == "file":
+				file_paths = section_value.get("path")
+				for file_path in file_paths if isinstance(file_paths, list) else (file_paths,):
+					if file_path is not None:
+						self.add_path(file_path)
+
+				if self.extension is None and isinstance(section_value.get("extension"), str):
+					self.extension = sys.intern(section_value["extension"])
+				if self.file_type is None and isinstance(section_value.get("type"), str):
+					self.file_type = sys.intern(section_value["type"])
+				if self.size is None:
+					self.size = section_value.get("bytes")
+
+			elif section == "hash":
+				self.add_digests({
+					sys.intern(algorithm): encode_digest(digest)
+					for algorithm, digest in section_value.items()
+					if isinstance(digest, str)
+				})
+
+			elif section == "date":
+				self.set_date(tuple(
+					intern_value(section_value.get(field_name))
+					for field_name in DATE_FIELDS
+				))
+
+			elif section == "quality":
+				self.set_quality(section_value)
+
+			elif section == "device":
+				if self.device is None and section_value:
+					self.device = tuple(
+						intern_value(section_value.get(field_name))
+						for field_name in DEVICE_FIELDS
+					)
+
+			else:
+				self.set_extra(section, section_value)
+
+	def set_date(
+			self,
+			date_value:tuple,
+	):
+		"""
+		Keep the date with the highest confidence, the first
+		one winning on equal confidence, as the default
+		merge policy of dates does
+		"""
+		if date_value is None:
+			return
+
+		if self.date is None or (
+			get_confidence_rank(date_value[CONFIDENCE_FIELD])
+			> get_confidence_rank(self.date[CONFIDENCE_FIELD])
+		):
+			self.date = date_value
+
+	def set_quality(
+			self,
+			quality_dict:dict,
+	):
+		"""
+		Flatten the quality of images into a tuple, keeping
+		other layouts such as the quality of videos as is,
+		so that records give back the quality they were given
+		"""
+		if self.quality is not None or "quality" in (self.extras or dict()):
+			return
+
+		if not all(field_name in quality_dict for field_name in QUALITY_FIELDS):
+			self.set_extra("quality", quality_dict)
+			return
+
+		resolution = quality_dict.get("resolution") or dict()
+		self.quality = (
+			resolution.get("width"),
+			resolution.get("height"),
+			intern_value(quality_dict.get("format")),
+			intern_value(quality_dict.get("mode")),
+		)
+
+		extra_quality = {
+			key: value
+			for key, value in quality_dict.items()
+			if key not in ("resolution", "format", "mode")
+		}
+		if extra_quality:
+			self.set_extra("quality", extra_quality)
+
+	def set_extra(
+			self,
+			section:str,
+			section_value,
+	):
+		if self.extras is None:
+			self.extras = dict()
+
+		self.extras.setdefault(sys.intern(section), section_value)
+
+	def merge(
+			self,
+			other_record,
+	):
+		"""
+		Merge another record in place, keeping values already
+		known and the date with the highest confidence, as the
+		default policies of the merge engine do
+		"""
+		for file_path in other_record.paths:
+			self.add_path(file_path)
+
+		if other_record.digest_layout != self.digest_layout:
+			self.add_digests(other_record.digests)
+
+		self.set_date(other_record.date)
+
+		if self.quality is None and "quality" not in (self.extras or dict()):
+			self.quality = other_record.quality
+
+		for field_name in ("extension", "file_type", "size", "device"):
+			if getattr(self, field_name) is None:
+				setattr(self, field_name, getattr(other_record, field_name))
+
+		for section, section_value in (other_record.extras or dict()).items():
+			self.set_extra(section, section_value)
+
+	def to_details(
+			self,
+			file_path:str=None,
+	) -> dict:
+		"""
+		Get the record using the nested layout of inventory
+		entries, for a single path when file_path is given
+		"""
+		if file_path is None:
+			file_path = self.paths[0] if len(self.paths) == 1 else list(self.paths) or None
+		name_path = file_path[0] if isinstance(file_path, list) else file_path
+
+		file_details = {
+			"file": {
+				"bytes": self.size,
+				"type": self.file_type,
+				"path": file_path,
+				"name": (
+					os.path.splitext(os.path.basename(name_path))[0].lower()
+					if name_path is not None else None
+				),
+				"extension": self.extension,
+			},
+			"hash": {
+				algorithm: digest.hex()
+				for algorithm, digest in self.digests.items()
+			},
+		}
+
+		if self.date is not None:
+			file_details["date"] = dict(zip(DATE_FIELDS, self.date))
+
+		if self.quality is not None:
+			width, height, image_format, mode = self.quality
+			file_details["quality"] = {
+				"resolution": {
+					"width": width,
+					"height": height,
+				},
+				"format": image_format,
+				"mode": mode,
+			}
+
+		if self.device is not None:
+			file_details["device"] = dict(zip(DEVICE_FIELDS, self.device))
+
+		for section, section_value in (self.extras or dict()).items():
+			if section == "quality" and "quality" in file_details:
+				file_details["quality"].update(section_value)
+			else:
+				file_details[section] = section_value
+
+		return file_details
+
+class InventoryIndex:
+	"""
+	In-memory inventory keyed by binary content digest,
+	built and merged in place without copying records
+	"""
+
+	__slots__ = ("records",)
+
+	def __init__(self):
+		self.records = dict()
+
+	def add_entry(
+			self,
+			entry_dict:dict,
+	):
+		for file_hash, file_details in entry_dict.get("hashes", dict()).items():
+			record_key = encode_digest(file_hash)
+			file_record = self.records.get(record_key)
+
+			if file_record is None:
+				self.records[record_key] = FileRecord.from_details(file_details)
+			else:
+				file_record.merge_details(file_details)
+
+	def merge(
+			self,
+			other_index,
+	):
+		"""
+		Merge another index in place, taking over its records
+		"""
+		for record_key, other_record in other_index.records.items():
+			file_record = self.records.get(record_key)
+
+			if file_record is None:
+				self.records[record_key] = other_record
+			else:
+				file_record.merge(other_record)
+
+	def get(
+			self,
+			file_hash:str,
+	):
+		return self.records.get(encode_digest(file_hash))
+
+	def iter_entries(self):
+		"""
+		Yield every record as an inventory entry
+		"""
+		for record_key, file_record in self.records.items():
+			yield {
+				"hashes": {
+					decode_digest(record_key): file_record.to_details()
+				}
+			}
+
+	def __len__(self):
+		return len(self.records)
+
+	def __iter__(self):
+		for record_key, file_record in self.records.items():
+			yield decode_digest(record_key), file_record
+
+# FUNCTIONS
+def intern_value(
+		value,
+):
+	if isinstance(value, str):
+		return sys.intern(value)
+
+	return value
+
+def encode_digest(
+		digest:str,
+) -> bytes:
+	return bytes.fromhex(digest)
+
+def decode_digest(
+		digest:bytes,
+) -> str:
+	return digest.hex()
+
+def get_digest_layout(
+		digest_layout:tuple,
+) -> tuple:
+	"""
+	Get the shared instance of a digest layout, so that
+	records with the same algorithms hold a single tuple
+	"""
+	return digest_layouts.setdefault(digest_layout, digest_layout)
+
+def build_index(
+		entries,
+) -> InventoryIndex:
+	"""
+	Build an index from inventory entries, such
+	as those yielded by a backend
+	"""
+	inventory_index = InventoryIndex()
+
+	for entry_dict in entries:
+		inventory_index.add_entry(entry_dict)
+
+	logger.info(
+		f'Built inventory index with records_count="{len(inventory_index)}"'
+	)
+
+	return inventory_index
@@ -1,16 +1,26 @@
 import os
 import json
+import queue
+import argparse
 
+from inventory_sqlite import SqliteBackend
+from merge_engine import MergeEngine
+from metrics import instrument
 from utilities import (
 	setup_logger,
 	get_script_details,
-	recursive_update,
+	read_settings,
 )
 
 # GLOBAL VARIABLES
 SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
 PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
 PATH_FILE_OUTPUT = os.path.join(SCRIPT_HOME, 'var', 'lib', 'hash_inventory.json')
+PATH_FILE_JOURNAL = os.path.join(SCRIPT_HOME, 'var', 'lib', 'hash_inventory.jsonl')
+
+RESULT_PUT_TIMEOUT = 1
+SNAPSHOT_CHUNK_SIZE = 1024 * 1024
 
 # DEFINING LOGGING SETTINGS
 logger = setup_logger(
@@ -18,6 +28,18 @@ logger = setup_logger(
 	file_path=PATH_FILE_LOG,
 )
 
+inventory_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+inventory_merger = MergeEngine(
+	policies=inventory_settings.get("merge_policies"),
+)
+inventory_backend = None
+result_queue = None
+writer_stats = None
+
 # FUNCTIONS
 def read_inventory(
 		source_file:str,
@@ -28,44 +50,610 @@ def read_inventory(
 			
 	except FileNotFoundError:
 		logger.info(
-			f'Inventory file at file_path="source_file" '
+			f'Inventory file at file_path="{source_file}" '
 			f'does not exist, initializing inventory...'
 		)
 		inventory_data = dict()
 	
 	return inventory_data
 
-def store_inventory(
-		file_dict:dict,
-		lock
+def iter_snapshot_records(
+		source_file:str,
 ):
+	"""
+	Yield (file_hash, file_details) of a snapshot one record at a time
+	"""
+	try:
+		with open(source_file, 'r', encoding='utf8') as snapshot_stream:
+			yield from SnapshotReader(snapshot_stream).iter_records()
 
-	logger.debug(
-		f'Locking output_path="{PATH_FILE_OUTPUT}" in '
-		f'order to store computed result'
+	except FileNotFoundError:
+		return
+
+def apply_journal_entry(
+		inventory_dict:dict,
+		entry_dict:dict,
+) -> dict:
+	"""
+	Merge a single journal entry into an inventory in place,
+	only touching the records referenced by the entry
+	"""
+	return inventory_merger.merge(inventory_dict, entry_dict)
+
+def replay_journal(
+		inventory_dict:dict,
+		journal_file:str,
+) -> dict:
+	"""
+	Apply every entry of a journal file on top of an inventory
+	"""
+	try:
+		with open(journal_file, 'r', encoding='utf8') as journal_stream:
+			for line_number, line in enumerate(journal_stream, start=1):
+				if not line.strip():
+					continue
+
+				try:
+					entry_dict = json.loads(line)
+
+				except json.JSONDecodeError:
+					logger.warning(
+						f'Skipping unreadable journal entry at '
+						f'file_path="{journal_file}", line_number="{line_number}"'
+					)
+					continue
+
+				apply_journal_entry(
+					inventory_dict=inventory_dict,
+					entry_dict=entry_dict,
+				)
+
+	except FileNotFoundError:
+		pass
+
+	return inventory_dict
+
+def load_inventory(
+		snapshot_file:str=PATH_FILE_OUTPUT,
+		journal_file:str=PATH_FILE_JOURNAL,
+) -> dict:
+	"""
+	Get the current inventory, made of the last
+	snapshot with pending journal entries applied
+	"""
+	inventory_dict = read_inventory(
+		source_file=snapshot_file,
 	)
-	lock.acquire()
-	
+
+	return replay_journal(
+		inventory_dict=inventory_dict,
+		journal_file=journal_file,
+	)
+
+def write_snapshot(
+		inventory_dict:dict,
+		output_file:str,
+):
+	"""
+	Atomically replace a snapshot file with inventory content
+	"""
+	temporary_file = output_file + '.tmp'
+	os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+
+	with open(temporary_file, 'w', encoding='utf8') as inventory_file:
+		json.dump(
+			inventory_dict,
+			inventory_file,
+			indent=4,
+			sort_keys=True,
+		)
+
+	os.replace(temporary_file, output_file)
+
+def compact_inventory(
+		lock=None,
+		snapshot_file:str=PATH_FILE_OUTPUT,
+		journal_file:str=PATH_FILE_JOURNAL,
+) -> dict:
+	"""
+	Fold pending journal entries into the snapshot
+	and start over with an empty journal
+	"""
+	if lock is not None:
+		lock.acquire()
+
 	try:
-		inventory_dict = read_inventory(
-			source_file=PATH_FILE_OUTPUT
+		inventory_dict = load_inventory(
+			snapshot_file=snapshot_file,
+			journal_file=journal_file,
 		)
-		inventory_dict = recursive_update(
-			src_item=inventory_dict,
-			new_item=file_dict,
+
+		write_snapshot(
+			inventory_dict=inventory_dict,
+			output_file=snapshot_file,
 		)
 
-		with open(PATH_FILE_OUTPUT, 'w', encoding='utf8') as inventory_file:
-			json.dump(
-				inventory_dict,
-				inventory_file,
-				indent=4,
-				sort_keys=True,
-			)
+		if os.path.exists(journal_file):
+			os.remove(journal_file)
+
+		logger.info(
+			f'Compacted journal_path="{journal_file}" into '
+			f'snapshot_path="{snapshot_file}"'
+		)
 
 	finally:
-		logger.debug(
-			f'Releasing lock on output_path="{PATH_FILE_OUTPUT}" '
-			f'after storing computed results'
+		if lock is not None:
+			lock.release()
+
+	return inventory_dict
+
+# CLASSES
+class SnapshotReader:
+	"""
+	Decode records of a snapshot one at a time from chunks
+	of the file, instead of loading the whole document
+	"""
+
+	def __init__(
+			self,
+			snapshot_stream,
+			chunk_size:int=SNAPSHOT_CHUNK_SIZE,
+	):
+		self.snapshot_stream = snapshot_stream
+		self.chunk_size = chunk_size
+		self.json_decoder = json.JSONDecoder()
+		self.buffer = ''
+		self.offset = 0
+		self.end_of_file = False
+
+	def read_chunk(self):
+		chunk = self.snapshot_stream.read(self.chunk_size)
+		self.buffer = self.buffer[self.offset:] + chunk
+		self.offset = 0
+		self.end_of_file = not chunk
+
+	def peek(self) -> str:
+		"""
+		Get the next character after whitespace,
+		or an empty string at the end of the file
+		"""
+		while True:
+			while self.offset < len(self.buffer) and self.buffer[self.offset].isspace():
+				self.offset += 1
+
+			if self.offset < len(self.buffer) or self.end_of_file:
+				return self.buffer[self.offset:self.offset + 1]
+
+			self.read_chunk()
+
+	def expect(
+			self,
+			token:str,
+	):
+		if self.peek() != token:
+			raise ValueError(f'Unexpected snapshot content, expected "{token}"')
+
+		self.offset += 1
+
+	def decode(self):
+		"""
+		Decode the next value, reading chunks until it is complete
+		"""
+		self.peek()
+
+		while True:
+			try:
+				value, self.offset = self.json_decoder.raw_decode(self.buffer, self.offset)
+				return value
+
+			except json.JSONDecodeError:
+				if self.end_of_file:
+					raise
+
+				self.read_chunk()
+
+	def iter_members(self):
+		"""
+		Yield keys of an object, the caller decoding each value
+		"""
+		self.expect('{')
+		if self.peek() == '}':
+			self.offset += 1
+			return
+
+		while True:
+			member_key = self.decode()
+			self.expect(':')
+			yield member_key
+
+			if self.peek() != ',':
+				self.expect('}')
+				return
+
+			self.offset += 1
+
+	def iter_records(self):
+		"""
+		Yield (file_hash, file_details) of every record
+		"""
+		if not self.peek():
+			return
+
+		for top_key in self.iter_members():
+			if top_key != "hashes":
+				self.decode()
+				continue
+
+			for file_hash in self.iter_members():
+				yield file_hash, self.decode()
+
+class JournalBackend:
+	"""
+	Inventory storage relying on a JSON Lines journal
+	periodically compacted into the JSON snapshot
+	"""
+
+	def __init__(
+			self,
+			snapshot_file:str=PATH_FILE_OUTPUT,
+			journal_file:str=PATH_FILE_JOURNAL,
+	):
+		self.snapshot_file = snapshot_file
+		self.journal_file = journal_file
+		self.appended = 0
+		os.makedirs(os.path.dirname(os.path.abspath(journal_file)), exist_ok=True)
+		self.compaction_interval = inventory_settings.get(
+			"compaction_interval",
+			0,
+		)
+
+	def store(
+			self,
+			entries:list,
+			lock=None,
+	):
+		"""
+		Append a batch of inventory entries to the journal
+		"""
+		journal_lines = ''.join(
+			json.dumps(entry_dict, sort_keys=True) + '\n'
+			for entry_dict in entries
+		)
+
+		if lock is not None:
+			lock.acquire()
+
+		try:
+			with open(self.journal_file, 'a', encoding='utf8') as journal_file:
+				journal_file.write(journal_lines)
+
+		finally:
+			if lock is not None:
+				lock.release()
+
+		previous_appended = self.appended
+		self.appended += len(entries)
+
+		if (
+			self.compaction_interval
+			and self.appended // self.compaction_interval
+				> previous_appended // self.compaction_interval
+		):
+			compact_inventory(
+				lock=lock,
+				snapshot_file=self.snapshot_file,
+				journal_file=self.journal_file,
+			)
+
+	def iter_entries(self):
+		"""
+		Yield snapshot records then pending journal entries
+		"""
+		snapshot_dict = read_inventory(
+			source_file=self.snapshot_file,
+		)
+
+		for file_hash, file_details in snapshot_dict.get("hashes", dict()).items():
+			yield {
+				"hashes": {
+					file_hash: file_details
+				}
+			}
+
+		try:
+			with open(self.journal_file, 'r', encoding='utf8') as journal_stream:
+				for line in journal_stream:
+					if line.strip():
+						yield json.loads(line)
+
+		except FileNotFoundError:
+			pass
+
+	def iter_records(self):
+		"""
+		Yield every record once, streaming the snapshot and merging
+		into each record the journal entries of its content; only
+		records of the journal are held in memory
+		"""
+		journal_hashes = replay_journal(
+			inventory_dict=dict(),
+			journal_file=self.journal_file,
+		).get("hashes", dict())
+
+		for file_hash, file_details in iter_snapshot_records(self.snapshot_file):
+			record_dict = {
+				"hashes": {
+					file_hash: file_details
+				}
+			}
+
+			if file_hash in journal_hashes:
+				apply_journal_entry(
+					inventory_dict=record_dict,
+					entry_dict={
+						"hashes": {
+							file_hash: journal_hashes.pop(file_hash)
+						}
+					},
+				)
+
+			yield record_dict
+
+		for file_hash, file_details in journal_hashes.items():
+			yield {
+				"hashes": {
+					file_hash: file_details
+				}
+			}
+
+	def lookup_hashes(
+			self,
+			file_hashes,
+	):
+		"""
+		Yield entries of the hashes, scanning the
+		snapshot and journal since neither is indexed
+		"""
+		file_hashes = set(file_hashes)
+
+		for entry_dict in self.iter_entries():
+			matching_hashes = {
+				file_hash: file_details
+				for file_hash, file_details in entry_dict.get("hashes", dict()).items()
+				if file_hash in file_hashes
+			}
+
+			if matching_hashes:
+				yield {
+					"hashes": matching_hashes
+				}
+
+	def lookup_digest(
+			self,
+			digest:str,
+	) -> list:
+		"""
+		Get entries of the content holding a digest, either as its
+		key or as the digest of any algorithm, scanning the snapshot
+		and journal since neither is indexed
+		"""
+		record_keys = set()
+
+		for entry_dict in self.iter_entries():
+			for file_hash, file_details in entry_dict.get("hashes", dict()).items():
+				if file_hash == digest or digest in (file_details.get("hash") or dict()).values():
+					record_keys.add(file_hash)
+
+		if digest in record_keys:
+			record_keys = {digest}
+
+		if not record_keys:
+			return list()
+
+		return list(self.lookup_hashes(record_keys))
+
+	def remove_paths(
+			self,
+			removed_paths:dict,
+			lock=None,
+	):
+		"""
+		Detach paths from the records of their hashes, remaining
+		paths staying a list as the union policy keeps them; journal
+		entries only ever add paths, so the journal is folded
+		into a rewritten snapshot
+		"""
+		if lock is not None:
+			lock.acquire()
+
+		try:
+			inventory_dict = load_inventory(
+				snapshot_file=self.snapshot_file,
+				journal_file=self.journal_file,
+			)
+			hashes_dict = inventory_dict.get("hashes", dict())
+
+			for file_hash, file_paths in removed_paths.items():
+				file_details = hashes_dict.get(file_hash)
+				if file_details is None:
+					continue
+
+				record_paths = file_details["file"].get("path")
+				if not isinstance(record_paths, list):
+					record_paths = [record_paths]
+
+				remaining_paths = [
+					file_path
+					for file_path in record_paths
+					if file_path not in file_paths
+				]
+				if not remaining_paths:
+					del hashes_dict[file_hash]
+				else:
+					file_details["file"]["path"] = remaining_paths
+
+			write_snapshot(
+				inventory_dict=inventory_dict,
+				output_file=self.snapshot_file,
+			)
+
+			if os.path.exists(self.journal_file):
+				os.remove(self.journal_file)
+
+		finally:
+			if lock is not None:
+				lock.release()
+
+	def close(self):
+		pass
+
+INVENTORY_BACKENDS = {
+	"journal": JournalBackend,
+	"sqlite": SqliteBackend,
+}
+
+# FUNCTIONS
+def create_backend(
+		backend_name:str=None,
+		backend_options:dict=None,
+):
+	"""
+	Create an inventory backend, using settings
+	when no backend name is given
+	"""
+	if backend_name is None:
+		backend_name = inventory_settings.get(
+			"backend",
+			"journal",
+		)
+
+	return INVENTORY_BACKENDS[backend_name](
+		**(backend_options or dict())
+	)
+
+def get_backend(
+		backend_name:str=None,
+):
+	"""
+	Get the inventory backend of current process,
+	creating it from settings on first use
+	"""
+	global inventory_backend
+
+	if inventory_backend is None:
+		inventory_backend = create_backend(
+			backend_name=backend_name,
+		)
+
+	return inventory_backend
+
+def export_inventory(
+		output_file:str=PATH_FILE_OUTPUT,
+		backend=None,
+) -> dict:
+	"""
+	Write the content of a backend using the JSON snapshot layout
+	"""
+	if backend is None:
+		backend = get_backend()
+
+	inventory_dict = dict()
+	for entry_dict in backend.iter_entries():
+		apply_journal_entry(
+			inventory_dict=inventory_dict,
+			entry_dict=entry_dict,
+		)
+
+	write_snapshot(
+		inventory_dict=inventory_dict,
+		output_file=output_file,
+	)
+
+	logger.info(
+		f'Exported inventory_backend="{backend.__class__.__name__}" '
+		f'to output_path="{output_file}"'
+	)
+
+	return inventory_dict
+
+def init_worker(
+		worker_queue,
+		worker_stats,
+):
+	"""
+	Send results of current process to the inventory writer
+	"""
+	global result_queue
+	global writer_stats
+
+	result_queue = worker_queue
+	writer_stats = worker_stats
+
+@instrument("enqueue_inventory")
+def store_inventory(
+		file_dict:dict,
+		lock=None,
+		stat_key:tuple=None,
+		cached:bool=False,
+):
+	"""
+	Hand a computed result over to the inventory writer,
+	or store it directly when running without one; waiting
+	on a full queue fails once the writer has stopped
+	"""
+	if result_queue is None:
+		if not cached:
+			get_backend().store(
+				entries=[file_dict],
+				lock=lock,
+			)
+		return
+
+	result_item = (file_dict, stat_key, cached)
+
+	try:
+		result_queue.put_nowait(result_item)
+
+	except queue.Full:
+		writer_stats.increment("backpressure")
+
+		while True:
+			try:
+				result_queue.put(result_item, timeout=RESULT_PUT_TIMEOUT)
+				break
+
+			except queue.Full:
+				if writer_stats.is_stopped():
+					raise RuntimeError('Inventory writer stopped, result queue is no longer read')
+
+	writer_stats.increment("enqueued")
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Manage the hash inventory',
+	)
+	parser.add_argument(
+		'command',
+		choices=['compact', 'export'],
+	)
+	parser.add_argument(
+		'--backend',
+		choices=sorted(INVENTORY_BACKENDS),
+		default=None,
+	)
+	parser.add_argument(
+		'--output',
+		default=PATH_FILE_OUTPUT,
+	)
+	arguments = parser.parse_args()
+
+	if arguments.command == 'compact':
+		compact_inventory()
+
+	elif arguments.command == 'export':
+		export_inventory(
+			output_file=arguments.output,
+			backend=get_backend(arguments.backend),
 		)
-		lock.release()
\ No newline at end of file
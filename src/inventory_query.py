@@ -0,0 +1,394 @@
+import os
+import sys
+import json
+import bisect
+import argparse
+import collections
+
+from datetime import datetime
+
+from inventory_index import (
+	DATE_FIELDS,
+	build_index,
+	encode_digest,
+	decode_digest,
+)
+from inventory_processor import (
+	INVENTORY_BACKENDS,
+	get_backend,
+)
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+# GLOBAL VARIABLES
+TIMESTAMP_FIELD = DATE_FIELDS.index("date_timestamp")
+LAST_CHARACTER = chr(sys.maxunicode)
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class InventoryQuery:
+	"""
+	Query an inventory through secondary indexes, the inventory
+	and each index being built on first use only
+
+	Hash lookups go through the inventory once built and through
+	the backend otherwise, as do selections when the backend persists
+	its own indexes; otherwise digest, extension and device lookups
+	go through dicts, path prefixes and date ranges through bisection
+	of sorted lists
+	"""
+
+	def __init__(
+			self,
+			backend=None,
+	):
+		self.backend = backend
+		self.cached_indexes = dict()
+
+	def get_index(
+			self,
+			index_name:str,
+	):
+		index_value = self.cached_indexes.get(index_name)
+
+		if index_value is None:
+			index_value = getattr(self, 'build_' + index_name)()
+			self.cached_indexes[index_name] = index_value
+
+			logger.info(
+				f'Built query index_name="{index_name}"'
+			)
+
+		return index_value
+
+	@property
+	def inventory(self):
+		return self.get_index("inventory")
+
+	def build_inventory(self):
+		return build_index(
+			(self.backend or get_backend()).iter_entries()
+		)
+
+	def build_paths(self) -> tuple:
+		path_items = sorted(
+			(file_path, record_key)
+			for record_key, file_record in self.inventory.records.items()
+			for file_path in file_record.paths
+		)
+
+		return [file_path for file_path, _ in path_items], path_items
+
+	def build_digests(self) -> dict:
+		"""
+		Map digests of every algorithm to their record key,
+		the first record winning on a shared digest
+		"""
+		digests_index = dict()
+
+		for record_key, file_record in self.inventory.records.items():
+			for digest in file_record.digests.values():
+				digests_index.setdefault(digest, record_key)
+
+		return digests_index
+
+	def build_extensions(self) -> dict:
+		extensions_index = collections.defaultdict(list)
+
+		for record_key, file_record in self.inventory.records.items():
+			if file_record.extension is not None:
+				extensions_index[file_record.extension.lower()].append(record_key)
+
+		return extensions_index
+
+	def build_dates(self) -> tuple:
+		date_items = sorted(
+			(file_record.date[TIMESTAMP_FIELD], record_key)
+			for record_key, file_record in self.inventory.records.items()
+			if file_record.date is not None
+				and isinstance(file_record.date[TIMESTAMP_FIELD], (int, float))
+		)
+
+		return [timestamp for timestamp, _ in date_items], date_items
+
+	def build_devices(self) -> dict:
+		"""
+		Map lowercase make, and make with model, to record keys
+		"""
+		devices_index = collections.defaultdict(list)
+
+		for record_key, file_record in self.inventory.records.items():
+			if file_record.device is None:
+				continue
+
+			make, model, _ = (
+				value.strip().lower() if isinstance(value, str) else None
+				for value in file_record.device
+			)
+			devices_index[(make, None)].append(record_key)
+			devices_index[(make, model)].append(record_key)
+
+		return devices_index
+
+	def lookup_hash(
+			self,
+			file_hash:str,
+	) -> list:
+		"""
+		Get every path holding the content with this digest, looked
+		up in the inventory when already built, through the backend
+		otherwise without loading the inventory
+		"""
+		try:
+			record_key = encode_digest(file_hash)
+		except ValueError:
+			return list()
+
+		digest = decode_digest(record_key)
+
+		if "inventory" in self.cached_indexes:
+			if record_key not in self.inventory.records:
+				record_key = self.get_index("digests").get(record_key)
+
+			file_record = self.inventory.records.get(record_key)
+			if file_record is None:
+				return list()
+
+			return [
+				(decode_digest(record_key), file_path)
+				for file_path in file_record.paths
+			]
+
+		record_index = build_index(
+			(self.backend or get_backend()).lookup_digest(digest)
+		)
+
+		return [
+			(record_key, file_path)
+			for record_key, file_record in record_index
+			for file_path in file_record.paths
+		]
+
+	def get_record(
+			self,
+			file_hash:str,
+	):
+		"""
+		Get the record of a content, from the inventory when
+		already built, through the backend otherwise
+		"""
+		if "inventory" in self.cached_indexes:
+			return self.inventory.get(file_hash)
+
+		return build_index(
+			(self.backend or get_backend()).lookup_hashes([file_hash])
+		).get(file_hash)
+
+	def find_prefix(
+			self,
+			path_prefix:str,
+	) -> list:
+		"""
+		Get (record_key, file_path) of paths within a folder
+		"""
+		path_prefix = get_folder_prefix(path_prefix)
+		sorted_paths, path_items = self.get_index("paths")
+		start_index = bisect.bisect_left(sorted_paths, path_prefix)
+		end_index = bisect.bisect_left(sorted_paths, path_prefix + LAST_CHARACTER, start_index)
+
+		return [
+			(record_key, file_path)
+			for file_path, record_key in path_items[start_index:end_index]
+		]
+
+	def find_extension(
+			self,
+			file_extension:str,
+	) -> list:
+		return self.get_index("extensions").get(file_extension.lstrip('.').lower(), list())
+
+	def find_dates(
+			self,
+			date_from:float=None,
+			date_to:float=None,
+	) -> list:
+		"""
+		Get record keys dated within [date_from, date_to)
+		"""
+		sorted_timestamps, date_items = self.get_index("dates")
+		start_index = 0 if date_from is None else bisect.bisect_left(sorted_timestamps, date_from)
+		end_index = len(sorted_timestamps) if date_to is None else bisect.bisect_left(sorted_timestamps, date_to)
+
+		return [record_key for _, record_key in date_items[start_index:end_index]]
+
+	def find_device(
+			self,
+			make:str,
+			model:str=None,
+	) -> list:
+		return self.get_index("devices").get(
+			(make.strip().lower(), model.strip().lower() if model else None),
+			list(),
+		)
+
+	def select(
+			self,
+			path_prefix:str=None,
+			file_extension:str=None,
+			date_from:float=None,
+			date_to:float=None,
+			make:str=None,
+			model:str=None,
+	) -> list:
+		"""
+		Get (file_hash, file_path) of files matching every given
+		filter, intersecting the record keys of each index
+		"""
+		backend = self.backend or get_backend()
+		if hasattr(backend, 'select_paths'):
+			return backend.select_paths(
+				path_prefix=get_folder_prefix(path_prefix) if path_prefix is not None else None,
+				file_extension=file_extension,
+				date_from=date_from,
+				date_to=date_to,
+				make=make,
+				model=model,
+			)
+
+		candidate_sets = list()
+
+		if file_extension is not None:
+			candidate_sets.append(set(self.find_extension(file_extension)))
+		if date_from is not None or date_to is not None:
+			candidate_sets.append(set(self.find_dates(date_from, date_to)))
+		if make is not None:
+			candidate_sets.append(set(self.find_device(make, model)))
+
+		if path_prefix is not None:
+			path_items = self.find_prefix(path_prefix)
+		else:
+			if not candidate_sets:
+				candidate_sets.append(set(self.inventory.records))
+			path_items = [
+				(record_key, file_path)
+				for record_key in min(candidate_sets, key=len)
+				for file_path in self.inventory.records[record_key].paths
+			]
+
+		return sorted(
+			(decode_digest(record_key), file_path)
+			for record_key, file_path in path_items
+			if all(record_key in candidate_set for candidate_set in candidate_sets)
+		)
+
+# FUNCTIONS
+def get_folder_prefix(
+		path_prefix:str,
+) -> str:
+	"""
+	Get a path prefix ending with a separator, so that
+	a folder does not match siblings sharing its name start
+	"""
+	return path_prefix.rstrip(os.sep) + os.sep
+
+def parse_date(
+		date_value:str,
+) -> float:
+	"""
+	Get the timestamp of an ISO date, such as 2019 or 2019-06-01
+	"""
+	if date_value is None:
+		return None
+
+	if len(date_value) == 4 and date_value.isdigit():
+		date_value += '-01-01'
+
+	return datetime.fromisoformat(date_value).timestamp()
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Query the hash inventory',
+	)
+	parser.add_argument(
+		'--backend',
+		choices=sorted(INVENTORY_BACKENDS),
+		default=None,
+	)
+	parser.add_argument(
+		'--hash',
+		dest='file_hash',
+		default=None,
+		help='list every copy of a content, by any of its digests',
+	)
+	parser.add_argument(
+		'--prefix',
+		dest='path_prefix',
+		default=None,
+	)
+	parser.add_argument(
+		'--extension',
+		dest='file_extension',
+		default=None,
+	)
+	parser.add_argument(
+		'--since',
+		dest='date_from',
+		default=None,
+		help='ISO date, included',
+	)
+	parser.add_argument(
+		'--until',
+		dest='date_to',
+		default=None,
+		help='ISO date, excluded',
+	)
+	parser.add_argument(
+		'--make',
+		default=None,
+	)
+	parser.add_argument(
+		'--model',
+		default=None,
+	)
+	parser.add_argument(
+		'--details',
+		action='store_true',
+		help='print full records instead of hash and path',
+	)
+	arguments = parser.parse_args()
+
+	inventory_query = InventoryQuery(
+		backend=get_backend(arguments.backend),
+	)
+
+	if arguments.file_hash is not None:
+		query_results = inventory_query.lookup_hash(arguments.file_hash)
+	else:
+		query_results = inventory_query.select(
+			path_prefix=arguments.path_prefix,
+			file_extension=arguments.file_extension,
+			date_from=parse_date(arguments.date_from),
+			date_to=parse_date(arguments.date_to),
+			make=arguments.make,
+			model=arguments.model,
+		)
+
+	for file_hash, file_path in query_results:
+		if arguments.details:
+			sys.stdout.write(json.dumps({
+				file_hash: inventory_query.get_record(file_hash).to_details(file_path)
+			}, sort_keys=True) + '\n')
+		else:
+			sys.stdout.write(f'{file_hash}\t{file_path}\n')
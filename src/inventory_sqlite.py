@@ -0,0 +1,402 @@
+import os
+import sqlite3
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+# GLOBAL VARIABLES
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_DATABASE = os.path.join(SCRIPT_HOME, 'var', 'lib', 'hash_inventory.sqlite')
+
+DATABASE_TIMEOUT = 60
+
+DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+	path TEXT PRIMARY KEY,
+	hash TEXT NOT NULL,
+	name TEXT,
+	extension TEXT,
+	type TEXT,
+	bytes INTEGER
+);
+CREATE TABLE IF NOT EXISTS hashes (
+	hash TEXT NOT NULL,
+	algorithm TEXT NOT NULL,
+	digest TEXT NOT NULL,
+	PRIMARY KEY (hash, algorithm)
+);
+CREATE TABLE IF NOT EXISTS images (
+	hash TEXT PRIMARY KEY,
+	width INTEGER,
+	height INTEGER,
+	format TEXT,
+	mode TEXT,
+	make TEXT,
+	model TEXT,
+	artist TEXT
+);
+CREATE TABLE IF NOT EXISTS perceptual (
+	hash TEXT NOT NULL,
+	algorithm TEXT NOT NULL,
+	digest TEXT NOT NULL,
+	PRIMARY KEY (hash, algorithm)
+);
+CREATE TABLE IF NOT EXISTS dates (
+	hash TEXT PRIMARY KEY,
+	date_type TEXT,
+	date_field TEXT,
+	date_confidence TEXT,
+	date_timestamp REAL,
+	date_human TEXT
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+CREATE INDEX IF NOT EXISTS files_bytes ON files (bytes);
+CREATE INDEX IF NOT EXISTS files_extension ON files (extension);
+CREATE INDEX IF NOT EXISTS hashes_digest ON hashes (digest);
+CREATE INDEX IF NOT EXISTS images_device ON images (LOWER(TRIM(make)), LOWER(TRIM(model)));
+CREATE INDEX IF NOT EXISTS dates_timestamp ON dates (date_timestamp);
+"""
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class SqliteBackend:
+	"""
+	Inventory storage relying on an indexed SQLite database
+	"""
+
+	def __init__(
+			self,
+			database_file:str=PATH_FILE_DATABASE,
+	):
+		self.database_file = database_file
+		os.makedirs(os.path.dirname(os.path.abspath(database_file)), exist_ok=True)
+		self.connection = sqlite3.connect(
+			database_file,
+			timeout=DATABASE_TIMEOUT,
+		)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		self.connection.executescript(DATABASE_SCHEMA)
+
+		logger.info(
+			f'Opened inventory database at file_path="{database_file}"'
+		)
+
+	def store(
+			self,
+			entries:list,
+			lock=None,
+	):
+		"""
+		Insert a batch of inventory entries in a single transaction
+		"""
+		file_rows = list()
+		hash_rows = list()
+		image_rows = list()
+		perceptual_rows = list()
+		date_rows = list()
+
+		for entry_dict in entries:
+			for file_hash, file_details in entry_dict.get("hashes", dict()).items():
+				file_info = file_details.get("file", dict())
+				file_rows.append((
+					file_info.get("path"),
+					file_hash,
+					file_info.get("name"),
+					file_info.get("extension"),
+					file_info.get("type"),
+					file_info.get("bytes"),
+				))
+
+				for algorithm, digest in file_details.get("hash", dict()).items():
+					hash_rows.append((file_hash, algorithm, digest))
+
+				quality_info = file_details.get("quality")
+				if quality_info is not None and file_info.get("type") == "image":
+					resolution = quality_info.get("resolution") or dict()
+					device_info = file_details.get("device") or dict()
+					image_rows.append((
+						file_hash,
+						resolution.get("width"),
+						resolution.get("height"),
+						quality_info.get("format"),
+						quality_info.get("mode"),
+						device_info.get("Make"),
+						device_info.get("Model"),
+						device_info.get("Artist"),
+					))
+
+				for algorithm, digest in file_details.get("perceptual", dict()).items():
+					perceptual_rows.append((file_hash, algorithm, digest))
+
+				date_info = file_details.get("date")
+				if date_info is not None:
+					date_rows.append((
+						file_hash,
+						date_info.get("date_type"),
+						date_info.get("date_field"),
+						date_info.get("date_confidence"),
+						date_info.get("date_timestamp"),
+						date_info.get("date_human"),
+					))
+
+		with self.connection:
+			self.connection.executemany(
+				'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+				file_rows,
+			)
+			self.connection.executemany(
+				'INSERT OR IGNORE INTO hashes VALUES (?, ?, ?)',
+				hash_rows,
+			)
+			self.connection.executemany(
+				'INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+				image_rows,
+			)
+			self.connection.executemany(
+				'INSERT OR IGNORE INTO perceptual VALUES (?, ?, ?)',
+				perceptual_rows,
+			)
+			self.connection.executemany(
+				'INSERT OR IGNORE INTO dates VALUES (?, ?, ?, ?, ?, ?)',
+				date_rows,
+			)
+
+		logger.debug(
+			f'Stored batch_size="{len(file_rows)}" entries '
+			f'in database_path="{self.database_file}"'
+		)
+
+	def build_entry(
+			self,
+			file_row:tuple,
+	) -> dict:
+		"""
+		Rebuild an inventory entry from a row of the files table
+		"""
+		path, file_hash, name, extension, file_type, file_bytes = file_row
+
+		file_details = {
+			"file": {
+				"bytes": file_bytes,
+				"type": file_type,
+				"path": path,
+				"name": name,
+				"extension": extension,
+			},
+			"hash": dict(
+				self.connection.execute(
+					'SELECT algorithm, digest FROM hashes WHERE hash = ?',
+					(file_hash,),
+				).fetchall()
+			),
+		}
+
+		image_row = self.connection.execute(
+			'SELECT width, height, format, mode, make, model, artist '
+			'FROM images WHERE hash = ?',
+			(file_hash,),
+		).fetchone()
+		if image_row is not None:
+			width, height, image_format, mode, make, model, artist = image_row
+			file_details["quality"] = {
+				"resolution": {
+					"width": width,
+					"height": height,
+				},
+				"format": image_format,
+				"mode": mode,
+			}
+			if any((make, model, artist)):
+				file_details["device"] = {
+					"Make": make,
+					"Model": model,
+					"Artist": artist,
+				}
+
+		perceptual_rows = self.connection.execute(
+			'SELECT algorithm, digest FROM perceptual WHERE hash = ?',
+			(file_hash,),
+		).fetchall()
+		if perceptual_rows:
+			file_details["perceptual"] = dict(perceptual_rows)
+
+		date_row = self.connection.execute(
+			'SELECT date_type, date_field, date_confidence, date_timestamp, date_human '
+			'FROM dates WHERE hash = ?',
+			(file_hash,),
+		).fetchone()
+		if date_row is not None:
+			file_details["date"] = dict(zip(
+				("date_type", "date_field", "date_confidence", "date_timestamp", "date_human"),
+				date_row,
+			))
+
+		return {
+			"hashes": {
+				file_hash: file_details
+			}
+		}
+
+	def iter_entries(self):
+		"""
+		Yield every stored file as an inventory entry
+		"""
+		file_cursor = self.connection.execute(
+			'SELECT path, hash, name, extension, type, bytes '
+			'FROM files ORDER BY hash, path'
+		)
+
+		for file_row in file_cursor:
+			yield self.build_entry(file_row)
+
+	def iter_records(self):
+		"""
+		Yield every stored file once, paths being unique in the files table
+		"""
+		return self.iter_entries()
+
+	def lookup_hash(
+			self,
+			file_hash:str,
+	) -> list:
+		"""
+		Get entries of every file matching a hash
+		"""
+		file_rows = self.connection.execute(
+			'SELECT path, hash, name, extension, type, bytes '
+			'FROM files WHERE hash = ?',
+			(file_hash,),
+		).fetchall()
+
+		return [self.build_entry(file_row) for file_row in file_rows]
+
+	def lookup_hashes(
+			self,
+			file_hashes,
+	):
+		"""
+		Yield entries of every file matching one of the hashes
+		"""
+		for file_hash in file_hashes:
+			yield from self.lookup_hash(file_hash)
+
+	def lookup_digest(
+			self,
+			digest:str,
+	) -> list:
+		"""
+		Get entries of the content holding a digest, either as
+		its key or as the digest of any algorithm
+		"""
+		file_entries = self.lookup_hash(digest)
+
+		if not file_entries:
+			hash_row = self.connection.execute(
+				'SELECT hash FROM hashes WHERE digest = ? LIMIT 1',
+				(digest,),
+			).fetchone()
+
+			if hash_row is not None:
+				file_entries = self.lookup_hash(hash_row[0])
+
+		return file_entries
+
+	def select_paths(
+			self,
+			path_prefix:str=None,
+			file_extension:str=None,
+			date_from:float=None,
+			date_to:float=None,
+			make:str=None,
+			model:str=None,
+	) -> list:
+		"""
+		Get sorted (file_hash, file_path) of files matching every
+		given filter, each filter relying on an index of the database
+		"""
+		joins = list()
+		conditions = list()
+		parameters = list()
+
+		if path_prefix:
+			conditions.append('files.path >= ? AND files.path < ?')
+			parameters.extend((
+				path_prefix,
+				path_prefix[:-1] + chr(ord(path_prefix[-1]) + 1),
+			))
+
+		if file_extension is not None:
+			conditions.append('files.extension = ?')
+			parameters.append(file_extension.lstrip('.').lower())
+
+		if date_from is not None or date_to is not None:
+			joins.append('JOIN dates ON dates.hash = files.hash')
+			if date_from is not None:
+				conditions.append('dates.date_timestamp >= ?')
+				parameters.append(date_from)
+			if date_to is not None:
+				conditions.append('dates.date_timestamp < ?')
+				parameters.append(date_to)
+
+		if make is not None:
+			joins.append('JOIN images ON images.hash = files.hash')
+			conditions.append('LOWER(TRIM(images.make)) = ?')
+			parameters.append(make.strip().lower())
+			if model:
+				conditions.append('LOWER(TRIM(images.model)) = ?')
+				parameters.append(model.strip().lower())
+
+		return self.connection.execute(
+			'SELECT files.hash, files.path FROM files '
+			+ ' '.join(joins)
+			+ (' WHERE ' + ' AND '.join(conditions) if conditions else '')
+			+ ' ORDER BY files.hash, files.path',
+			parameters,
+		).fetchall()
+
+	def lookup_path(
+			self,
+			file_path:str,
+	):
+		"""
+		Get the entry of a file from its path, if known
+		"""
+		file_row = self.connection.execute(
+			'SELECT path, hash, name, extension, type, bytes '
+			'FROM files WHERE path = ?',
+			(file_path,),
+		).fetchone()
+
+		if file_row is None:
+			return None
+
+		return self.build_entry(file_row)
+
+	def remove_paths(
+			self,
+			removed_paths:dict,
+	):
+		"""
+		Detach paths from the records of their hashes
+		"""
+		with self.connection:
+			self.connection.executemany(
+				'DELETE FROM files WHERE hash = ? AND path = ?',
+				[
+					(file_hash, file_path)
+					for file_hash, file_paths in removed_paths.items()
+					for file_path in file_paths
+				],
+			)
+
+	def close(self):
+		self.connection.close()
@@ -0,0 +1,465 @@
+import os
+import time
+import queue
+import multiprocessing
+
+from change_cache import (
+	PATH_FILE_CACHE,
+	ChangeCacheWriter,
+)
+from inventory_processor import (
+	create_backend,
+	inventory_settings,
+)
+from metrics import (
+	CrawlMetrics,
+	init_metrics,
+	instrument,
+)
+from utilities import (
+	setup_logger,
+	get_script_details,
+	init_worker_logging,
+)
+
+# GLOBAL VARIABLES
+WRITER_BATCH_SIZE = 500
+WRITER_FLUSH_INTERVAL = 5
+WRITER_QUEUE_SIZE = 10000
+WRITER_FLUSH_TIMEOUT = 60
+WRITER_PUT_TIMEOUT = 1
+FLUSH_REQUEST = "flush"
+PARTIAL_STOP_REQUEST = "partial_stop"
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class WriterStats:
+	"""
+	Counters shared between workers and the inventory writer
+	"""
+	COUNTERS = (
+		"enqueued",
+		"dequeued",
+		"written",
+		"batches",
+		"backpressure",
+		"cache_hits",
+		"cache_misses",
+		"flush_requests",
+		"failed",
+	)
+
+	def __init__(self):
+		self.counters = {
+			name: multiprocessing.Value('Q', 0)
+			for name in self.COUNTERS
+		}
+		self.stopped = multiprocessing.Event()
+
+	def increment(
+			self,
+			name:str,
+			amount:int=1,
+	):
+		counter = self.counters[name]
+		with counter.get_lock():
+			counter.value += amount
+
+	def get(
+			self,
+			name:str,
+	) -> int:
+		return self.counters[name].value
+
+	def is_stopped(self) -> bool:
+		"""
+		Tell whether the writer stopped reading the result queue
+		"""
+		return self.stopped.is_set()
+
+	def queue_depth(self) -> int:
+		return self.get("enqueued") - self.get("dequeued")
+
+	def as_dict(self) -> dict:
+		stats_dict = {
+			name: self.get(name)
+			for name in self.COUNTERS
+		}
+		stats_dict["queue_depth"] = self.queue_depth()
+
+		return stats_dict
+
+class InventoryWriter(multiprocessing.Process):
+	"""
+	Single process owning the inventory backend, receiving
+	results from workers and flushing them in batches; when
+	acknowledging, hashes and paths of stored files are sent back
+	through an acknowledgement queue once their batch is stored
+	"""
+
+	def __init__(
+			self,
+			result_queue,
+			writer_stats:WriterStats,
+			backend_name:str=None,
+			backend_options:dict=None,
+			cache_file:str=PATH_FILE_CACHE,
+			settings_signature:str=None,
+			crawl_metrics:CrawlMetrics=None,
+			acknowledge:bool=False,
+			log_queue=None,
+	):
+		super().__init__(name=SCRIPT_NAME)
+		self.ack_queue = multiprocessing.Queue() if acknowledge else None
+		self.log_queue = log_queue
+		self.crawl_metrics = crawl_metrics
+		self.result_queue = result_queue
+		self.writer_stats = writer_stats
+		self.backend_name = backend_name
+		self.backend_options = backend_options
+		self.cache_file = cache_file
+		self.settings_signature = settings_signature
+		self.batch_size = inventory_settings.get(
+			"writer_batch_size",
+			WRITER_BATCH_SIZE,
+		)
+		self.flush_interval = inventory_settings.get(
+			"writer_flush_interval",
+			WRITER_FLUSH_INTERVAL,
+		)
+
+	def store_pending(
+			self,
+			backend,
+			pending_dict:dict,
+	) -> list:
+		"""
+		Store computed entries in a single backend batch, falling
+		back to one entry at a time when the batch fails so that
+		a bad record is the only one lost, and return the keys
+		of stored entries
+		"""
+		pending_keys = [
+			entry_key
+			for entry_key, (entry_dict, stat_key, cached) in pending_dict.items()
+			if not cached
+		]
+		if not pending_keys:
+			return pending_keys
+
+		try:
+			store_batch(
+				backend=backend,
+				entries=[pending_dict[entry_key][0] for entry_key in pending_keys],
+			)
+			return pending_keys
+
+		except Exception:
+			logger.exception(
+				f'Could not store batch_size="{len(pending_keys)}", '
+				f'storing its entries one at a time'
+			)
+
+		stored_keys = list()
+		for entry_key in pending_keys:
+			try:
+				store_batch(
+					backend=backend,
+					entries=[pending_dict[entry_key][0]],
+				)
+
+			except Exception:
+				logger.exception(
+					f'Could not store file_path="{entry_key[1]}" '
+					f'with file_hash="{entry_key[0]}"'
+				)
+				self.writer_stats.increment("failed")
+
+			else:
+				stored_keys.append(entry_key)
+
+		return stored_keys
+
+	def flush(
+			self,
+			backend,
+			pending_dict:dict,
+	):
+		"""
+		Store every pending entry, recording in the change cache
+		and acknowledging only entries actually stored
+		"""
+		if not pending_dict:
+			return
+
+		try:
+			stored_keys = self.store_pending(
+				backend=backend,
+				pending_dict=pending_dict,
+			)
+			stored_set = set(stored_keys)
+
+			for entry_key, (entry_dict, stat_key, cached) in pending_dict.items():
+				if stat_key is not None and (cached or entry_key in stored_set):
+					self.cache_writer.append(
+						file_path=entry_key[1],
+						stat_key=stat_key,
+						entry_dict=entry_dict,
+					)
+
+			if stored_keys:
+				self.writer_stats.increment("written", len(stored_keys))
+				self.writer_stats.increment("batches")
+
+				if self.ack_queue is not None:
+					self.ack_queue.put(stored_keys)
+
+			logger.debug(
+				f'Flushed batch_size="{len(pending_dict)}", '
+				f'writer_stats="{self.writer_stats.as_dict()}"'
+			)
+
+		finally:
+			pending_dict.clear()
+
+	def run(self):
+		"""
+		Write results until asked to stop, telling workers when
+		the result queue is no longer read, even after a failure
+		"""
+		try:
+			self.write_results()
+
+		finally:
+			self.writer_stats.stopped.set()
+
+	def write_results(self):
+		init_worker_logging(self.log_queue)
+		init_metrics(self.crawl_metrics)
+		backend = create_backend(
+			backend_name=self.backend_name,
+			backend_options=self.backend_options,
+		)
+		self.cache_writer = ChangeCacheWriter(
+			cache_file=self.cache_file,
+			signature=self.settings_signature,
+		)
+		pending_dict = dict()
+		flush_deadline = time.monotonic() + self.flush_interval
+		running = True
+		partial = False
+
+		logger.info(
+			f'Inventory writer started with batch_size="{self.batch_size}" '
+			f'and flush_interval="{self.flush_interval}"'
+		)
+
+		try:
+			while running:
+				flush_requested = False
+
+				try:
+					result_item = self.result_queue.get(
+						timeout=max(flush_deadline - time.monotonic(), 0),
+					)
+
+				except queue.Empty:
+					result_item = None
+
+				else:
+					if result_item is None or result_item == PARTIAL_STOP_REQUEST:
+						running = False
+						partial = result_item == PARTIAL_STOP_REQUEST
+
+					elif result_item == FLUSH_REQUEST:
+						flush_requested = True
+
+					else:
+						self.writer_stats.increment("dequeued")
+						entry_dict, stat_key, cached = result_item
+
+						if cached:
+							self.writer_stats.increment("cache_hits")
+						elif stat_key is not None:
+							self.writer_stats.increment("cache_misses")
+
+						for file_hash, file_details in entry_dict["hashes"].items():
+							entry_key = (
+								file_hash,
+								file_details["file"]["path"],
+							)
+							pending_dict[entry_key] = result_item
+
+				if (
+					not running
+					or flush_requested
+					or len(pending_dict) >= self.batch_size
+					or time.monotonic() >= flush_deadline
+				):
+					self.flush(
+						backend=backend,
+						pending_dict=pending_dict,
+					)
+					flush_deadline = time.monotonic() + self.flush_interval
+
+					if flush_requested:
+						self.writer_stats.increment("flush_requests")
+
+		finally:
+			self.flush(
+				backend=backend,
+				pending_dict=pending_dict,
+			)
+			backend.close()
+
+			if running:
+				self.cache_writer.abort()
+			else:
+				self.cache_writer.commit(
+					merge_previous=partial,
+				)
+
+			logger.info(
+				f'Inventory writer stopped with '
+				f'writer_stats="{self.writer_stats.as_dict()}"'
+			)
+
+# FUNCTIONS
+@instrument("store_batch")
+def store_batch(
+		backend,
+		entries:list,
+):
+	"""
+	Store a batch of entries in the backend
+	"""
+	backend.store(
+		entries=entries,
+	)
+
+def start_writer(
+		backend_name:str=None,
+		backend_options:dict=None,
+		cache_file:str=PATH_FILE_CACHE,
+		settings_signature:str=None,
+		crawl_metrics:CrawlMetrics=None,
+		acknowledge:bool=False,
+		log_queue=None,
+):
+	"""
+	Create the result queue, shared counters and running writer
+	"""
+	result_queue = multiprocessing.Queue(
+		maxsize=inventory_settings.get(
+			"writer_queue_size",
+			WRITER_QUEUE_SIZE,
+		),
+	)
+	writer_stats = WriterStats()
+
+	writer = InventoryWriter(
+		result_queue=result_queue,
+		writer_stats=writer_stats,
+		backend_name=backend_name,
+		backend_options=backend_options,
+		cache_file=cache_file,
+		settings_signature=settings_signature,
+		crawl_metrics=crawl_metrics,
+		acknowledge=acknowledge,
+		log_queue=log_queue,
+	)
+	writer.start()
+
+	return writer, result_queue, writer_stats
+
+def send_request(
+		writer:InventoryWriter,
+		result_queue,
+		request,
+) -> bool:
+	"""
+	Put a request on the result queue, giving up
+	once the writer is no longer running
+	"""
+	while writer.is_alive():
+		try:
+			result_queue.put(request, timeout=WRITER_PUT_TIMEOUT)
+			return True
+
+		except queue.Full:
+			continue
+
+	return False
+
+def request_flush(
+		writer:InventoryWriter,
+		result_queue,
+		writer_stats:WriterStats,
+		timeout:float=WRITER_FLUSH_TIMEOUT,
+) -> bool:
+	"""
+	Ask the writer to flush every result received so far
+	and wait for its confirmation
+	"""
+	flush_requests = writer_stats.get("flush_requests")
+	if not send_request(writer, result_queue, FLUSH_REQUEST):
+		return False
+
+	deadline = time.monotonic() + timeout
+
+	while writer_stats.get("flush_requests") <= flush_requests:
+		if time.monotonic() >= deadline or not writer.is_alive():
+			return False
+
+		time.sleep(0.05)
+
+	return True
+
+def get_acknowledged(
+		writer:InventoryWriter,
+) -> list:
+	"""
+	Get (file_hash, file_path) pairs of files the
+	writer acknowledged storing so far
+	"""
+	stored_keys = list()
+
+	while True:
+		try:
+			stored_keys.extend(writer.ack_queue.get_nowait())
+
+		except queue.Empty:
+			return stored_keys
+
+def stop_writer(
+		writer:InventoryWriter,
+		result_queue,
+		partial:bool=False,
+		acknowledge_function=None,
+):
+	"""
+	Ask the writer to flush pending results and wait for it,
+	consuming acknowledgements meanwhile so that the writer
+	never blocks on a full acknowledgement queue; after a
+	partial run, the writer merges the previous change cache
+	instead of replacing it
+	"""
+	send_request(writer, result_queue, PARTIAL_STOP_REQUEST if partial else None)
+
+	if acknowledge_function is None:
+		writer.join()
+		return
+
+	while writer.is_alive():
+		acknowledge_function()
+		writer.join(timeout=0.1)
+
+	acknowledge_function()
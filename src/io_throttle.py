@@ -0,0 +1,287 @@
+import os
+import sys
+import time
+import ctypes
+import contextlib
+import multiprocessing
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+LATENCY_TARGET = 0.05
+ADJUST_INTERVAL = 2.0
+LATENCY_SMOOTHING = 0.2
+NICE_INCREMENT = 10
+IOPRIO_CLASSES = {
+	"realtime": 1,
+	"best-effort": 2,
+	"idle": 3,
+}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+SYSCALL_IOPRIO_SET = {
+	"x86_64": 251,
+	"aarch64": 30,
+	"i686": 289,
+}
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+throttle_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+io_throttle = None
+
+# CLASSES
+class IoThrottle:
+	"""
+	Read bandwidth and IOPS token buckets, plus an adaptive limit
+	on files read concurrently, kept in shared memory so that
+	every worker process draws from the same budget
+	"""
+
+	def __init__(
+			self,
+			read_rate:int=None,
+			iops:int=None,
+			concurrency:int=None,
+			latency_target:float=LATENCY_TARGET,
+			adjust_interval:float=ADJUST_INTERVAL,
+	):
+		self.read_rate = read_rate or 0
+		self.iops = iops or 0
+		self.max_concurrency = concurrency
+		self.latency_target = latency_target
+		self.adjust_interval = adjust_interval
+
+		self.lock = multiprocessing.Lock()
+		self.slot_condition = multiprocessing.Condition()
+		self.byte_tokens = multiprocessing.Value('d', float(self.read_rate), lock=False)
+		self.io_tokens = multiprocessing.Value('d', float(self.iops), lock=False)
+		self.refill_time = multiprocessing.Value('d', time.monotonic(), lock=False)
+		self.latency = multiprocessing.Value('d', 0.0, lock=False)
+		self.adjust_time = multiprocessing.Value('d', time.monotonic(), lock=False)
+		self.limit = multiprocessing.Value('i', concurrency or 0, lock=False)
+		self.active = multiprocessing.Value('i', 0, lock=False)
+
+	def acquire(
+			self,
+			byte_count:int,
+	):
+		"""
+		Take one read operation and byte_count bytes from the
+		buckets, sleeping off any debt outside of the lock
+		"""
+		if not self.read_rate and not self.iops:
+			return
+
+		with self.lock:
+			current_time = time.monotonic()
+			elapsed_seconds = current_time - self.refill_time.value
+			self.refill_time.value = current_time
+			wait_seconds = float(0)
+
+			if self.read_rate:
+				self.byte_tokens.value = min(
+					self.byte_tokens.value + elapsed_seconds * self.read_rate,
+					float(self.read_rate),
+				) - byte_count
+				wait_seconds = max(wait_seconds, -self.byte_tokens.value / self.read_rate)
+
+			if self.iops:
+				self.io_tokens.value = min(
+					self.io_tokens.value + elapsed_seconds * self.iops,
+					float(self.iops),
+				) - 1
+				wait_seconds = max(wait_seconds, -self.io_tokens.value / self.iops)
+
+		if wait_seconds > 0:
+			time.sleep(wait_seconds)
+
+	def observe(
+			self,
+			elapsed_seconds:float,
+	):
+		"""
+		Record a read latency, halving concurrency when the smoothed
+		latency exceeds its target and growing it back one slot at a time
+		"""
+		if not self.max_concurrency:
+			return
+
+		with self.lock:
+			self.latency.value += LATENCY_SMOOTHING * (elapsed_seconds - self.latency.value)
+			current_time = time.monotonic()
+
+			if current_time - self.adjust_time.value < self.adjust_interval:
+				return
+
+			self.adjust_time.value = current_time
+			previous_limit = self.limit.value
+
+			if self.latency.value > self.latency_target:
+				self.limit.value = max(previous_limit // 2, 1)
+			elif previous_limit < self.max_concurrency:
+				self.limit.value = previous_limit + 1
+
+			new_limit = self.limit.value
+			latency = self.latency.value
+
+		if new_limit != previous_limit:
+			logger.info(
+				f'Adjusted read concurrency from previous_limit="{previous_limit}" '
+				f'to new_limit="{new_limit}" with read_latency="{latency:.4f}"'
+			)
+
+		if new_limit > previous_limit:
+			with self.slot_condition:
+				self.slot_condition.notify_all()
+
+	@contextlib.contextmanager
+	def file_slot(self):
+		"""
+		Hold one of the concurrent file read slots
+		"""
+		if not self.max_concurrency:
+			yield
+			return
+
+		with self.slot_condition:
+			while self.active.value >= self.limit.value:
+				self.slot_condition.wait(self.adjust_interval)
+			self.active.value += 1
+
+		try:
+			yield
+
+		finally:
+			with self.slot_condition:
+				self.active.value -= 1
+				self.slot_condition.notify()
+
+	def get_stats(self) -> dict:
+		return {
+			"read_rate": self.read_rate,
+			"iops": self.iops,
+			"concurrency_limit": self.limit.value,
+			"read_latency": self.latency.value,
+		}
+
+# FUNCTIONS
+def init_throttle(
+		throttle_object:IoThrottle,
+):
+	"""
+	Apply shared throttling to reads of current process
+	"""
+	global io_throttle
+
+	io_throttle = throttle_object
+
+def create_throttle(
+		read_rate:int=None,
+		iops:int=None,
+		concurrency:int=None,
+		adaptive:bool=None,
+) -> IoThrottle:
+	"""
+	Get a shared throttle, or None when reads are not limited
+	"""
+	if adaptive is None:
+		adaptive = throttle_settings.get("adaptive", False)
+
+	if not read_rate and not iops and not adaptive:
+		return None
+
+	throttle_object = IoThrottle(
+		read_rate=read_rate,
+		iops=iops,
+		concurrency=max(concurrency or 1, 1) if adaptive else None,
+		latency_target=throttle_settings.get("latency_target", LATENCY_TARGET),
+		adjust_interval=throttle_settings.get("adjust_interval", ADJUST_INTERVAL),
+	)
+	logger.info(
+		f'Throttling reads with read_rate="{read_rate}" B/s, '
+		f'iops="{iops}" and adaptive="{adaptive}"'
+	)
+
+	return throttle_object
+
+def throttle_read(
+		byte_count:int,
+):
+	if io_throttle is not None:
+		io_throttle.acquire(byte_count)
+
+def observe_read(
+		elapsed_seconds:float,
+):
+	if io_throttle is not None:
+		io_throttle.observe(elapsed_seconds)
+
+def read_slot():
+	"""
+	Get a context holding a concurrent read slot, if throttled
+	"""
+	if io_throttle is None:
+		return contextlib.nullcontext()
+
+	return io_throttle.file_slot()
+
+def set_ioprio(
+		ioprio_class:str,
+		ioprio_level:int=0,
+) -> bool:
+	"""
+	Set the I/O scheduling class of current process,
+	only available on Linux
+	"""
+	if not sys.platform.startswith('linux'):
+		return False
+
+	syscall_number = SYSCALL_IOPRIO_SET.get(os.uname().machine)
+	if syscall_number is None:
+		return False
+
+	libc = ctypes.CDLL(None, use_errno=True)
+	ioprio_value = IOPRIO_CLASSES[ioprio_class] << IOPRIO_CLASS_SHIFT | ioprio_level
+
+	if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, ioprio_value) != 0:
+		logger.warning(
+			f'Could not set ioprio_class="{ioprio_class}", '
+			f'error="{os.strerror(ctypes.get_errno())}"'
+		)
+		return False
+
+	return True
+
+def lower_priority():
+	"""
+	Lower CPU and I/O priority of current process, so that
+	interactive workloads of the host keep precedence
+	"""
+	nice_increment = throttle_settings.get("nice_increment", NICE_INCREMENT)
+	ioprio_class = throttle_settings.get("ioprio_class", "idle")
+
+	if hasattr(os, 'nice'):
+		os.nice(nice_increment)
+
+	ioprio_set = set_ioprio(ioprio_class)
+	logger.info(
+		f'Lowered priority with nice_increment="{nice_increment}", '
+		f'ioprio_class="{ioprio_class if ioprio_set else "unchanged"}"'
+	)
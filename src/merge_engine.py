@@ -0,0 +1,172 @@
+import os
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+)
+
+# GLOBAL VARIABLES
+WILDCARD = '*'
+CONFIDENCE_RANKS = {
+	"Low": 1,
+	"Medium": 2,
+	"High": 3,
+}
+DEFAULT_POLICIES = {
+	"hashes.*.file.path": "union",
+	"hashes.*.date": "confidence",
+}
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+# CLASSES
+class MergeEngine:
+	"""
+	Merge nested dicts in place, applying a policy to fields
+	listed in the policy tree: dicts are merged key by key,
+	other values keep their first value, so that a field
+	never changes type from one record to the next
+	"""
+
+	def __init__(
+			self,
+			policies:dict=None,
+	):
+		self.policy_tree = compile_policies(
+			DEFAULT_POLICIES if policies is None else policies
+		)
+
+	def merge(
+			self,
+			src_dict:dict,
+			new_dict:dict,
+			policy_node:dict=None,
+	) -> dict:
+		"""
+		Merge new_dict into src_dict, which is updated and returned
+		"""
+		if policy_node is None:
+			policy_node = self.policy_tree
+
+		for key, new_value in new_dict.items():
+			key_policy = policy_node.get(key)
+			if key_policy is None:
+				key_policy = policy_node.get(WILDCARD)
+
+			if callable(key_policy):
+				src_dict[key] = key_policy(src_dict.get(key), new_value)
+				continue
+
+			src_value = src_dict.get(key)
+
+			if isinstance(new_value, dict):
+				if src_value is None and not key_policy:
+					src_dict[key] = new_value
+				elif src_value is None:
+					src_dict[key] = self.merge(dict(), new_value, key_policy)
+				elif isinstance(src_value, dict):
+					self.merge(src_value, new_value, key_policy or dict())
+
+			elif src_value is None:
+				src_dict[key] = new_value
+
+		return src_dict
+
+# FUNCTIONS
+def merge_union(
+		src_value,
+		new_value,
+) -> list:
+	"""
+	Keep every distinct item of both values in a list,
+	whether they were stored as scalars or lists
+	"""
+	if not isinstance(src_value, list):
+		src_value = [] if src_value is None else [src_value]
+
+	for item in new_value if isinstance(new_value, list) else (new_value,):
+		if item not in src_value:
+			src_value.append(item)
+
+	return src_value
+
+def merge_first(
+		src_value,
+		new_value,
+):
+	return new_value if src_value is None else src_value
+
+def merge_last(
+		src_value,
+		new_value,
+):
+	return src_value if new_value is None else new_value
+
+def merge_max(
+		src_value,
+		new_value,
+):
+	if src_value is None:
+		return new_value
+
+	if new_value is None:
+		return src_value
+
+	return max(src_value, new_value)
+
+def get_confidence_rank(
+		value,
+) -> int:
+	if isinstance(value, dict):
+		value = value.get("date_confidence")
+
+	return CONFIDENCE_RANKS.get(value, 0)
+
+def merge_confidence(
+		src_value,
+		new_value,
+):
+	"""
+	Keep the value with the highest confidence,
+	the first one winning on equal confidence
+	"""
+	if get_confidence_rank(new_value) > get_confidence_rank(src_value):
+		return new_value
+
+	return merge_first(src_value, new_value)
+
+MERGE_POLICIES = {
+	"union": merge_union,
+	"first": merge_first,
+	"last": merge_last,
+	"max": merge_max,
+	"confidence": merge_confidence,
+}
+
+def compile_policies(
+		policies:dict,
+) -> dict:
+	"""
+	Turn dotted field paths into a tree of nested dicts,
+	leaves being merge functions, so that merging looks up
+	one key per level
+	"""
+	policy_tree = dict()
+
+	for field_path, policy_name in policies.items():
+		policy_node = policy_tree
+		field_names = field_path.split('.')
+
+		for field_name in field_names[:-1]:
+			policy_node = policy_node.setdefault(field_name, dict())
+
+		policy_node[field_names[-1]] = MERGE_POLICIES[policy_name]
+
+	return policy_tree
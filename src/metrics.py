@@ -0,0 +1,333 @@
+import os
+import time
+import bisect
+import functools
+import threading
+import http.server
+import multiprocessing
+
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+METRICS_PREFIX = 'disk_crawler'
+PROGRESS_INTERVAL = 10
+LATENCY_BUCKETS = (
+	0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0,
+)
+STAGES = (
+	"process_folder",
+	"get_file_settings",
+	"get_image_settings",
+	"get_video_settings",
+	"enqueue_inventory",
+	"store_batch",
+)
+COUNTERS = (
+	"files_discovered",
+	"bytes_discovered",
+	"files_done",
+	"bytes_done",
+)
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+metrics_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+crawl_metrics = None
+
+# CLASSES
+class CrawlMetrics:
+	"""
+	Stage latency histograms and progress counters kept in
+	shared memory, so that every worker process feeds them
+	"""
+
+	def __init__(self):
+		self.lock = multiprocessing.Lock()
+		self.buckets = multiprocessing.Array(
+			'Q',
+			len(STAGES) * (len(LATENCY_BUCKETS) + 1),
+			lock=False,
+		)
+		self.sums = multiprocessing.Array('d', len(STAGES), lock=False)
+		self.errors = multiprocessing.Array('Q', len(STAGES), lock=False)
+		self.counters = multiprocessing.Array('Q', len(COUNTERS), lock=False)
+		self.walk_done = multiprocessing.Value('b', 0, lock=False)
+		self.start_time = time.time()
+
+	def observe(
+			self,
+			stage:str,
+			elapsed_seconds:float,
+			failed:bool=False,
+	):
+		stage_index = STAGES.index(stage)
+		bucket_index = bisect.bisect_left(LATENCY_BUCKETS, elapsed_seconds)
+
+		with self.lock:
+			self.buckets[stage_index * (len(LATENCY_BUCKETS) + 1) + bucket_index] += 1
+			self.sums[stage_index] += elapsed_seconds
+			if failed:
+				self.errors[stage_index] += 1
+
+	def set_walk_done(self):
+		self.walk_done.value = 1
+
+	def add(
+			self,
+			counter:str,
+			amount:int=1,
+	):
+		with self.lock:
+			self.counters[COUNTERS.index(counter)] += amount
+
+	def snapshot(self) -> dict:
+		"""
+		Get a consistent copy of every metric
+		"""
+		bucket_count = len(LATENCY_BUCKETS) + 1
+
+		with self.lock:
+			stages_dict = {
+				stage: {
+					"buckets": list(
+						self.buckets[stage_index * bucket_count:(stage_index + 1) * bucket_count]
+					),
+					"seconds": self.sums[stage_index],
+					"errors": self.errors[stage_index],
+				}
+				for stage_index, stage in enumerate(STAGES)
+			}
+			counters_dict = dict(zip(COUNTERS, self.counters[:]))
+
+		for stage_dict in stages_dict.values():
+			stage_dict["count"] = sum(stage_dict["buckets"])
+
+		return {
+			"stages": stages_dict,
+			"counters": counters_dict,
+			"walk_done": bool(self.walk_done.value),
+			"elapsed_seconds": time.time() - self.start_time,
+		}
+
+	def get_progress(self) -> dict:
+		"""
+		Get files and bytes done, rate and estimated time left
+		"""
+		metrics_dict = self.snapshot()
+		counters_dict = metrics_dict["counters"]
+		elapsed_seconds = metrics_dict["elapsed_seconds"]
+		bytes_rate = counters_dict["bytes_done"] / elapsed_seconds if elapsed_seconds > 0 else float(0)
+		bytes_left = counters_dict["bytes_discovered"] - counters_dict["bytes_done"]
+
+		return {
+			"files_done": counters_dict["files_done"],
+			"files_discovered": counters_dict["files_discovered"],
+			"bytes_done": counters_dict["bytes_done"],
+			"bytes_discovered": counters_dict["bytes_discovered"],
+			"mb_per_second": bytes_rate / (1024 * 1024),
+			"files_per_second": counters_dict["files_done"] / elapsed_seconds if elapsed_seconds > 0 else float(0),
+			"eta_seconds": bytes_left / bytes_rate if bytes_rate > 0 else None,
+			"walk_done": metrics_dict["walk_done"],
+		}
+
+	def render_prometheus(self) -> str:
+		"""
+		Render metrics using the Prometheus text exposition format
+		"""
+		metrics_dict = self.snapshot()
+		metric_name = f'{METRICS_PREFIX}_stage_seconds'
+		lines = [
+			f'# HELP {metric_name} Latency of crawler stages',
+			f'# TYPE {metric_name} histogram',
+		]
+
+		for stage, stage_dict in metrics_dict["stages"].items():
+			cumulative_count = 0
+			for bucket_bound, bucket_count in zip(
+				LATENCY_BUCKETS + ('+Inf',),
+				stage_dict["buckets"],
+			):
+				cumulative_count += bucket_count
+				lines.append(
+					f'{metric_name}_bucket{{stage="{stage}",le="{bucket_bound}"}} {cumulative_count}'
+				)
+			lines.append(f'{metric_name}_sum{{stage="{stage}"}} {stage_dict["seconds"]}')
+			lines.append(f'{metric_name}_count{{stage="{stage}"}} {stage_dict["count"]}')
+
+		errors_name = f'{METRICS_PREFIX}_stage_errors_total'
+		lines.append(f'# TYPE {errors_name} counter')
+		for stage, stage_dict in metrics_dict["stages"].items():
+			lines.append(f'{errors_name}{{stage="{stage}"}} {stage_dict["errors"]}')
+
+		for counter, value in metrics_dict["counters"].items():
+			counter_name = f'{METRICS_PREFIX}_{counter}_total'
+			lines.append(f'# TYPE {counter_name} counter')
+			lines.append(f'{counter_name} {value}')
+
+		return '\n'.join(lines) + '\n'
+
+class ProgressReporter(threading.Thread):
+	"""
+	Periodically log crawl progress until stopped
+	"""
+
+	def __init__(
+			self,
+			metrics_object:CrawlMetrics,
+			interval:float,
+	):
+		super().__init__(name=f'{SCRIPT_NAME}-progress', daemon=True)
+		self.metrics_object = metrics_object
+		self.interval = interval
+		self.stop_event = threading.Event()
+
+	def report(self):
+		progress_dict = self.metrics_object.get_progress()
+		eta_seconds = progress_dict["eta_seconds"]
+
+		logger.info(
+			f'Progress files_done="{progress_dict["files_done"]}/'
+			f'{progress_dict["files_discovered"]}", '
+			f'bytes_done="{progress_dict["bytes_done"]}/'
+			f'{progress_dict["bytes_discovered"]}", '
+			f'rate="{progress_dict["mb_per_second"]:.2f}" MB/s, '
+			f'eta="{"unknown" if eta_seconds is None else f"{eta_seconds:.0f}s"}"'
+			f'{"" if progress_dict["walk_done"] else " (walk in progress)"}'
+		)
+
+	def run(self):
+		while not self.stop_event.wait(self.interval):
+			self.report()
+
+	def stop(self):
+		self.stop_event.set()
+		self.join()
+		self.report()
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+
+	def do_GET(self):
+		if self.path != '/metrics' or crawl_metrics is None:
+			self.send_error(404)
+			return
+
+		response_body = crawl_metrics.render_prometheus().encode('utf8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/plain; version=0.0.4')
+		self.send_header('Content-Length', str(len(response_body)))
+		self.end_headers()
+		self.wfile.write(response_body)
+
+	def log_message(self, format, *args):
+		logger.debug(format % args)
+
+# FUNCTIONS
+def init_metrics(
+		metrics_object:CrawlMetrics,
+):
+	"""
+	Record metrics of current process into shared metrics
+	"""
+	global crawl_metrics
+
+	crawl_metrics = metrics_object
+
+def add_metric(
+		counter:str,
+		amount:int=1,
+):
+	if crawl_metrics is not None:
+		crawl_metrics.add(counter, amount)
+
+def instrument(
+		stage:str,
+):
+	"""
+	Decorate a function so that its latency
+	and failures are recorded for a stage
+	"""
+	def decorator(function):
+
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			if crawl_metrics is None:
+				return function(*args, **kwargs)
+
+			start_time = time.perf_counter()
+			failed = True
+
+			try:
+				result = function(*args, **kwargs)
+				failed = False
+				return result
+
+			finally:
+				crawl_metrics.observe(
+					stage=stage,
+					elapsed_seconds=time.perf_counter() - start_time,
+					failed=failed,
+				)
+
+		return wrapper
+
+	return decorator
+
+def start_monitoring(
+		metrics_object:CrawlMetrics,
+):
+	"""
+	Start the progress reporter and, when a port
+	is configured, the local metrics endpoint
+	"""
+	progress_reporter = ProgressReporter(
+		metrics_object=metrics_object,
+		interval=metrics_settings.get("progress_interval", PROGRESS_INTERVAL),
+	)
+	progress_reporter.start()
+
+	metrics_server = None
+	metrics_port = metrics_settings.get("metrics_port")
+
+	if metrics_port:
+		metrics_host = metrics_settings.get("metrics_host", "127.0.0.1")
+		metrics_server = http.server.ThreadingHTTPServer(
+			(metrics_host, metrics_port),
+			MetricsRequestHandler,
+		)
+		threading.Thread(
+			target=metrics_server.serve_forever,
+			name=f'{SCRIPT_NAME}-http',
+			daemon=True,
+		).start()
+
+		logger.info(
+			f'Serving metrics at url="http://{metrics_host}:{metrics_port}/metrics"'
+		)
+
+	return progress_reporter, metrics_server
+
+def stop_monitoring(
+		progress_reporter:ProgressReporter,
+		metrics_server,
+):
+	progress_reporter.stop()
+
+	if metrics_server is not None:
+		metrics_server.shutdown()
+		metrics_server.server_close()
@@ -0,0 +1,294 @@
+import os
+import json
+import hashlib
+
+from hash_algorithms import resolve_hash_name
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+SIGNATURE_FIELDS = (
+	"hash_names",
+	"tiered",
+	"metadata",
+	"perceptual_names",
+	"extension_types",
+	"exif_dates",
+	"image_file_dates",
+	"video_container_dates",
+	"video_file_dates",
+)
+SETTINGS_NAMES = (
+	"file_processor",
+	"folder_processor",
+	"image_processor",
+	"video_processor",
+)
+HASH_STATES = ("enabled", "disabled")
+DATE_CONFIDENCES = ("High", "Medium", "Low")
+HASH_BLOCK_SIZE = 1024 * 1024
+IMAGE_HEADER_SIZE = 256 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+WALKER_COUNT = 4
+WALKER_QUEUE_SIZE = 1024
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FOLDER_SETTINGS = os.path.join(SCRIPT_HOME, 'etc')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+raw_settings = None
+processing_settings = None
+
+# CLASSES
+class ProcessingSettings:
+	"""
+	Settings of file processing compiled into lookup structures,
+	built once by the parent process and handed to workers through
+	the pool initializer, so that workers never parse YAML
+	"""
+
+	__slots__ = (
+		"hash_names",
+		"tiered",
+		"verify_hash",
+		"block_size",
+		"mmap_threshold",
+		"drop_cache",
+		"image_header_size",
+		"metadata",
+		"extension_types",
+		"exif_dates",
+		"image_file_dates",
+		"perceptual_names",
+		"video_container_dates",
+		"video_file_dates",
+		"incremental",
+		"walker_count",
+		"walker_queue_size",
+	)
+
+	def __init__(
+			self,
+			settings_dict:dict,
+			hash_names:list=None,
+			metadata:bool=None,
+			perceptual_names:list=None,
+			drop_cache:bool=None,
+			tiered:bool=None,
+	):
+		file_settings = settings_dict["file_processor"]
+		folder_settings = settings_dict["folder_processor"]
+		image_settings = settings_dict["image_processor"]
+		video_settings = settings_dict["video_processor"]
+
+		tiered_settings = file_settings.get("tiered_hashing") or dict()
+		self.tiered = tiered_settings.get("enabled", False) if tiered is None else tiered
+		self.verify_hash = resolve_hash_name(tiered_settings.get("verify_hash", "sha256"))
+
+		if self.tiered:
+			index_name = tiered_settings.get("index_hash", "xxh3_64")
+			hash_names = [index_name]
+
+			if resolve_hash_name(index_name) != index_name:
+				logger.warning(
+					f'Tiered hashing computes fallback of index_hash="{index_name}", '
+					f'which brings no speedup over hashing every file with '
+					f'verify_hash="{self.verify_hash}"; install the optional '
+					f'xxhash or blake3 modules to benefit from it'
+				)
+		elif not hash_names:
+			hash_names = get_enabled_names(file_settings["hash_algorithms"])
+		self.hash_names = tuple(dict.fromkeys(
+			resolve_hash_name(hash_name)
+			for hash_name in hash_names
+		))
+
+		self.block_size = file_settings.get("hash_block_size", HASH_BLOCK_SIZE)
+		self.mmap_threshold = file_settings.get("mmap_threshold", MMAP_THRESHOLD)
+		self.drop_cache = file_settings.get("drop_page_cache", False) if drop_cache is None else drop_cache
+		self.image_header_size = file_settings.get("image_header_size", IMAGE_HEADER_SIZE)
+		self.metadata = True if metadata is None else metadata
+
+		self.extension_types = {
+			file_ext.lower(): file_ext_type
+			for file_ext_type, file_ext_list in folder_settings["file_extensions"].items()
+			for file_ext in file_ext_list
+		}
+		self.incremental = folder_settings.get("incremental", False)
+		self.walker_count = folder_settings.get("walker_count", WALKER_COUNT)
+		self.walker_queue_size = folder_settings.get("walker_queue_size", WALKER_QUEUE_SIZE)
+
+		self.exif_dates = get_date_priorities(image_settings["date_confidence"]["exif"])
+		self.image_file_dates = dict(get_date_priorities(image_settings["date_confidence"]["file"]))
+		if perceptual_names is None:
+			perceptual_names = get_enabled_names(image_settings.get("perceptual_hashes") or dict())
+		self.perceptual_names = tuple(perceptual_names)
+
+		self.video_container_dates = dict(video_settings["date_confidence"]["container"])
+		self.video_file_dates = dict(get_date_priorities(video_settings["date_confidence"]["file"]))
+
+	def get_signature(self) -> str:
+		"""
+		Get a digest of the settings shaping inventory entries,
+		so that results produced under other settings are not reused
+		"""
+		return hashlib.sha1(
+			json.dumps(
+				[getattr(self, field_name) for field_name in SIGNATURE_FIELDS],
+				sort_keys=True,
+			).encode('utf8')
+		).hexdigest()
+
+# FUNCTIONS
+def get_enabled_names(
+		states_dict:dict,
+) -> list:
+	return [
+		name
+		for name, state in states_dict.items()
+		if state == "enabled"
+	]
+
+def get_date_priorities(
+		date_settings:list,
+) -> tuple:
+	"""
+	Flatten a list of single key dicts into ordered
+	(field, confidence) pairs
+	"""
+	return tuple(
+		(date_field, date_confidence)
+		for field_settings in date_settings
+		for date_field, date_confidence in field_settings.items()
+	)
+
+def validate_settings(
+		settings_dict:dict,
+) -> list:
+	"""
+	Get the list of problems found in raw settings
+	"""
+	problems = list()
+
+	file_settings = settings_dict["file_processor"]
+	folder_settings = settings_dict["folder_processor"]
+	image_settings = settings_dict["image_processor"]
+	video_settings = settings_dict["video_processor"]
+
+	for settings_name, states_dict in (
+		("file_processor.hash_algorithms", file_settings.get("hash_algorithms")),
+		("image_processor.perceptual_hashes", image_settings.get("perceptual_hashes") or dict()),
+	):
+		if not isinstance(states_dict, dict):
+			problems.append(f'{settings_name} must be a mapping')
+			continue
+
+		for name, state in states_dict.items():
+			if state not in HASH_STATES:
+				problems.append(f'{settings_name}.{name} must be one of {HASH_STATES}, not "{state}"')
+
+	for settings_name, section_settings, setting_name, default_value in (
+		("file_processor", file_settings, "hash_block_size", HASH_BLOCK_SIZE),
+		("file_processor", file_settings, "mmap_threshold", MMAP_THRESHOLD),
+		("file_processor", file_settings, "image_header_size", IMAGE_HEADER_SIZE),
+		("folder_processor", folder_settings, "walker_count", WALKER_COUNT),
+		("folder_processor", folder_settings, "walker_queue_size", WALKER_QUEUE_SIZE),
+	):
+		setting_value = section_settings.get(setting_name, default_value)
+		if not isinstance(setting_value, int) or isinstance(setting_value, bool) or setting_value <= 0:
+			problems.append(f'{settings_name}.{setting_name} must be a positive integer')
+
+	seen_extensions = dict()
+	for file_ext_type, file_ext_list in (folder_settings.get("file_extensions") or dict()).items():
+		for file_ext in file_ext_list or list():
+			if file_ext.lower() in seen_extensions:
+				problems.append(
+					f'folder_processor.file_extensions lists "{file_ext}" for both '
+					f'"{seen_extensions[file_ext.lower()]}" and "{file_ext_type}"'
+				)
+			seen_extensions[file_ext.lower()] = file_ext_type
+
+	for settings_name, date_settings in (
+		("image_processor.date_confidence.exif", image_settings["date_confidence"].get("exif")),
+		("image_processor.date_confidence.file", image_settings["date_confidence"].get("file")),
+		("video_processor.date_confidence.file", video_settings["date_confidence"].get("file")),
+		("video_processor.date_confidence.container", [video_settings["date_confidence"].get("container")]),
+	):
+		for field_settings in date_settings or list():
+			for date_field, date_confidence in (field_settings or dict()).items():
+				if date_confidence not in DATE_CONFIDENCES:
+					problems.append(
+						f'{settings_name}.{date_field} must be one of '
+						f'{DATE_CONFIDENCES}, not "{date_confidence}"'
+					)
+
+	return problems
+
+def read_processing_settings() -> dict:
+	"""
+	Get raw settings of every processing module,
+	reading and validating YAML files on first use
+	"""
+	global raw_settings
+
+	if raw_settings is None:
+		settings_dict = {
+			settings_name: read_settings(
+				settings_file=os.path.join(PATH_FOLDER_SETTINGS, settings_name + '.yaml'),
+				logger_object=logger,
+			)
+			for settings_name in SETTINGS_NAMES
+		}
+
+		problems = validate_settings(settings_dict)
+		if problems:
+			for problem in problems:
+				logger.error(
+					f'Invalid processing settings, problem="{problem}"'
+				)
+			raise ValueError(f'Invalid processing settings: {"; ".join(problems)}')
+
+		raw_settings = settings_dict
+
+	return raw_settings
+
+def compile_settings(
+		**processing_options,
+) -> ProcessingSettings:
+	"""
+	Compile settings read from YAML files with
+	command line overrides such as hash_names
+	"""
+	return ProcessingSettings(
+		read_processing_settings(),
+		**processing_options,
+	)
+
+def install_settings(
+		settings_object:ProcessingSettings,
+):
+	"""
+	Use compiled settings in current process
+	"""
+	global processing_settings
+
+	processing_settings = settings_object
+
+def get_settings() -> ProcessingSettings:
+	"""
+	Get the compiled settings of current process,
+	compiling default settings on first use
+	"""
+	if processing_settings is None:
+		install_settings(compile_settings())
+
+	return processing_settings
@@ -0,0 +1,223 @@
+import os
+import json
+import argparse
+import collections
+
+from inventory_processor import (
+	INVENTORY_BACKENDS,
+	get_backend,
+)
+from utilities import (
+	setup_logger,
+	get_script_details,
+	read_settings,
+)
+
+# GLOBAL VARIABLES
+MAX_DISTANCE = 6
+
+SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
+PATH_FILE_LOG = os.path.join(SCRIPT_HOME, 'var', 'log', SCRIPT_NAME + '.log')
+PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
+PATH_FILE_OUTPUT = os.path.join(SCRIPT_HOME, 'var', 'lib', 'similar_images.json')
+
+# DEFINING LOGGING SETTINGS
+logger = setup_logger(
+	name=SCRIPT_NAME,
+	file_path=PATH_FILE_LOG,
+)
+
+similarity_settings = read_settings(
+	settings_file=PATH_FILE_SETTINGS,
+	logger_object=logger,
+)
+
+# CLASSES
+class BKTree:
+	"""
+	Burkhard-Keller tree over integer hashes using the Hamming
+	distance, so that a radius search only visits children whose
+	edge distance lies within the radius of the query distance
+	"""
+
+	def __init__(self):
+		self.root = None
+		self.size = 0
+
+	def add(
+			self,
+			value:int,
+	):
+		node = [value, dict()]
+		self.size += 1
+
+		if self.root is None:
+			self.root = node
+			return
+
+		current_node = self.root
+		while True:
+			distance = (current_node[0] ^ value).bit_count()
+			child_node = current_node[1].get(distance)
+
+			if child_node is None:
+				current_node[1][distance] = node
+				return
+
+			current_node = child_node
+
+	def search(
+			self,
+			value:int,
+			max_distance:int,
+	) -> list:
+		"""
+		Get (distance, value) of every stored value
+		within max_distance of value
+		"""
+		found_values = list()
+		if self.root is None:
+			return found_values
+
+		pending_nodes = [self.root]
+		while pending_nodes:
+			node_value, children = pending_nodes.pop()
+			distance = (node_value ^ value).bit_count()
+
+			if distance <= max_distance:
+				found_values.append((distance, node_value))
+
+			for edge_distance, child_node in children.items():
+				if distance - max_distance <= edge_distance <= distance + max_distance:
+					pending_nodes.append(child_node)
+
+		return found_values
+
+	def __len__(self):
+		return self.size
+
+# FUNCTIONS
+def read_perceptual_hashes(
+		backend,
+		hash_name:str,
+) -> dict:
+	"""
+	Group files of the inventory by perceptual hash value
+	"""
+	perceptual_groups = collections.defaultdict(dict)
+
+	for entry_dict in backend.iter_entries():
+		for file_hash, file_details in entry_dict.get("hashes", dict()).items():
+			perceptual_digest = file_details.get("perceptual", dict()).get(hash_name)
+
+			if perceptual_digest is not None:
+				perceptual_groups[int(perceptual_digest, 16)][file_hash] = (
+					file_details.get("file", dict()).get("path")
+				)
+
+	return perceptual_groups
+
+def find_root(
+		parents:dict,
+		value:int,
+) -> int:
+	while parents[value] != value:
+		parents[value] = parents[parents[value]]
+		value = parents[value]
+
+	return value
+
+def find_similar(
+		perceptual_groups:dict,
+		max_distance:int,
+) -> list:
+	"""
+	Cluster perceptual hashes lying within max_distance of each
+	other, querying a BK-tree of the values already inserted
+	"""
+	bk_tree = BKTree()
+	parents = dict()
+
+	for perceptual_value in perceptual_groups:
+		parents[perceptual_value] = perceptual_value
+
+		for _, found_value in bk_tree.search(perceptual_value, max_distance):
+			parents[find_root(parents, found_value)] = find_root(parents, perceptual_value)
+
+		bk_tree.add(perceptual_value)
+
+	cluster_values = collections.defaultdict(list)
+	for perceptual_value in perceptual_groups:
+		cluster_values[find_root(parents, perceptual_value)].append(perceptual_value)
+
+	similar_clusters = list()
+	for perceptual_values in cluster_values.values():
+		cluster_files = [
+			{
+				"hash": file_hash,
+				"path": file_path,
+				"perceptual": format(perceptual_value, '016x'),
+			}
+			for perceptual_value in perceptual_values
+			for file_hash, file_path in perceptual_groups[perceptual_value].items()
+		]
+
+		if len(cluster_files) > 1:
+			similar_clusters.append({
+				"count": len(cluster_files),
+				"files": cluster_files,
+			})
+
+	logger.info(
+		f'Clustered perceptual_values="{len(perceptual_groups)}" '
+		f'within max_distance="{max_distance}", '
+		f'finding similar_clusters="{len(similar_clusters)}"'
+	)
+
+	return similar_clusters
+
+# MAIN CODE
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+		description='Find clusters of similar images in the inventory',
+	)
+	parser.add_argument(
+		'--backend',
+		choices=sorted(INVENTORY_BACKENDS),
+		default=None,
+	)
+	parser.add_argument(
+		'--hash',
+		dest='hash_name',
+		default=similarity_settings.get("hash_name", "dhash"),
+	)
+	parser.add_argument(
+		'--distance',
+		dest='max_distance',
+		type=int,
+		default=similarity_settings.get("max_distance", MAX_DISTANCE),
+	)
+	parser.add_argument(
+		'--output',
+		default=PATH_FILE_OUTPUT,
+	)
+	arguments = parser.parse_args()
+
+	similar_clusters = find_similar(
+		perceptual_groups=read_perceptual_hashes(
+			backend=get_backend(arguments.backend),
+			hash_name=arguments.hash_name,
+		),
+		max_distance=arguments.max_distance,
+	)
+
+	with open(arguments.output, 'w', encoding='utf8') as output_file:
+		json.dump(
+			{
+				"hash_name": arguments.hash_name,
+				"clusters": similar_clusters,
+			},
+			output_file,
+			indent=4,
+		)
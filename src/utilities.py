@@ -1,21 +1,105 @@
 import os
 import copy
+import json
 import yaml
 import typing
 import pathlib
 import logging
+import itertools
 import platform
 import collections
+import multiprocessing
+import logging.handlers
 
 from datetime import datetime
 
 # GLOBAL VARIABLES
 DATE_FORMAT = "%Y-%m-%d - %H:%M:%S"
 
-LOG_LEVEL = logging.DEBUG
+LOG_ROOT = 'disk_crawler'
+LOG_LEVEL = logging.INFO
 LOG_FORMATTER = logging.Formatter(
     '%(asctime)-15s - %(filename)s - %(levelname)s - %(message)s'
 )
+LOG_PER_FILE = {"per_file": True}
+
+log_files = dict()
+
+# CLASSES
+class JsonFormatter(logging.Formatter):
+    """
+    Format log records as single line JSON documents
+    """
+
+    def format(self, record):
+        log_dict = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info:
+            log_dict["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(log_dict)
+
+class LogFileRouter(logging.Handler):
+    """
+    Write each record to the log file registered
+    for the module logger which emitted it
+    """
+
+    def __init__(self, formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.file_handlers = dict()
+
+    def get_file_handler(self, logger_name):
+        file_handler = self.file_handlers.get(logger_name)
+
+        if file_handler is None:
+            file_path = log_files.get(logger_name)
+            if file_path is None:
+                return None
+
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            file_handler = logging.FileHandler(file_path, encoding='utf8')
+            file_handler.setFormatter(self.formatter)
+            self.file_handlers[logger_name] = file_handler
+
+        return file_handler
+
+    def emit(self, record):
+        file_handler = self.get_file_handler(record.name)
+
+        if file_handler is not None:
+            file_handler.handle(record)
+
+    def close(self):
+        for file_handler in self.file_handlers.values():
+            file_handler.close()
+
+        super().close()
+
+class SamplingFilter(logging.Filter):
+    """
+    Only keep one out of sample_rate records
+    flagged as per-file messages
+    """
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = max(int(sample_rate), 1)
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if not getattr(record, "per_file", False):
+            return True
+
+        return next(self.counter) % self.sample_rate == 0
 
 # FUNCTIONS
 def get_formatted_date(
@@ -41,12 +125,13 @@ def get_formatted_date(
 
 def get_creation_date(
     file_path: str,
-    file_settings: dict,
+    date_confidences: dict,
     logger_object,
 ):
     """
     Attempt to get the creation date according
-    to current Operating System
+    to current Operating System, date_confidences
+    mapping date fields to their confidence
     """
     date_field = None
     date_confidence = None
@@ -67,7 +152,7 @@ def get_creation_date(
             file_path
         )
 
-        if st_birthtime in file_stats:
+        if hasattr(file_stats, 'st_birthtime'):
 
             creation_date = file_stats.st_birthtime
             operating_system = 'Mac OS'
@@ -75,7 +160,7 @@ def get_creation_date(
 
         else:
 
-            creation_date = file_stats.st_birthtime
+            creation_date = file_stats.st_mtime
             operating_system = 'Linux'
             date_field = 'mtime'
 
@@ -83,18 +168,18 @@ def get_creation_date(
         creation_date,
     )
 
-    for field_settings in file_settings:
-
-        date_confidence = field_settings.get(
-            date_field,
-            date_confidence,
-        )
+    date_confidence = date_confidences.get(
+        date_field,
+    )
 
     logger_object.info(
-        f'Detected operating_system="{operating_system}", '
-        f'using date_field="{date_field}", '
-        f'with date_confidence="{date_confidence}", '
-        f'collecting date_value="{creation_date_formatted}"'
+        'Detected operating_system="%s", using date_field="%s", '
+        'with date_confidence="%s", collecting date_value="%s"',
+        operating_system,
+        date_field,
+        date_confidence,
+        creation_date_formatted,
+        extra=LOG_PER_FILE,
     )
 
     return (
@@ -117,22 +202,115 @@ def get_script_details(
 
     return script_home, script_name
 
+def read_log_settings() -> dict:
+    """
+    Get logging settings, falling back to defaults
+    """
+    script_home, script_name = get_script_details(script_path=__file__)
+    settings_file = os.path.join(script_home, 'etc', 'logging.yaml')
+
+    try:
+        with open(settings_file, 'r') as file_stream:
+            return yaml.safe_load(file_stream) or dict()
+
+    except (OSError, yaml.YAMLError):
+        return dict()
+
+def get_log_root():
+    """
+    Get the logger shared by every module, configuring
+    its level, format and file routing on first use
+    """
+    root_logger = logging.getLogger(LOG_ROOT)
+
+    if not root_logger.handlers:
+        log_settings = read_log_settings()
+
+        if log_settings.get("format") == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = LOG_FORMATTER
+
+        root_logger.setLevel(
+            log_settings.get("level", logging.getLevelName(LOG_LEVEL))
+        )
+        root_logger.addHandler(LogFileRouter(formatter))
+        root_logger.propagate = False
+        root_logger.sample_rate = log_settings.get("per_file_sample_rate", 1)
+
+    return root_logger
+
+def set_log_level(
+        level,
+):
+    """
+    Change the level of every module logger
+    """
+    get_log_root().setLevel(level)
+
 def setup_logger(
         name:str,
         file_path:str,
-        level=LOG_LEVEL,
+        level=None,
 ):
     """To setup as many loggers as you want"""
 
-    handler = logging.FileHandler(file_path)
-    handler.setFormatter(LOG_FORMATTER)
+    root_logger = get_log_root()
+
+    logger = logging.getLogger(f'{LOG_ROOT}.{name}')
+    log_files[logger.name] = file_path
 
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(handler)
+    if level is not None:
+        logger.setLevel(level)
+
+    if not logger.filters:
+        logger.addFilter(
+            SamplingFilter(root_logger.sample_rate)
+        )
 
     return logger
 
+def start_log_listener():
+    """
+    Start writing log files on behalf of worker processes,
+    returning the queue they should send records to
+    """
+    root_logger = get_log_root()
+    log_queue = multiprocessing.Queue()
+
+    log_listener = logging.handlers.QueueListener(
+        log_queue,
+        *root_logger.handlers,
+        respect_handler_level=True,
+    )
+    log_listener.start()
+
+    return log_queue, log_listener
+
+def stop_log_listener(
+        log_listener,
+):
+    log_listener.stop()
+
+def init_worker_logging(
+        log_queue,
+):
+    """
+    Send records of a worker process to the log listener
+    instead of writing log files directly
+    """
+    if log_queue is None or multiprocessing.parent_process() is None:
+        return
+
+    root_logger = get_log_root()
+
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+
+    root_logger.addHandler(
+        logging.handlers.QueueHandler(log_queue)
+    )
+
 def read_settings(
         settings_file: str,
         logger_object,
@@ -257,18 +435,18 @@ def run_child(
         args,
         logger_object,
 ):
-    logger_object.debug(
-        f'Atttempting to run function_name="{function}" '
-        f'with arguments="{args}"'
-    )
+    """
+    Submit a function call to an executor,
+    returning its future
+    """
     try:
-        pool.apply_async(
-            target=function,
-            args=args,
+        return pool.submit(
+            function,
+            *args,
         )
 
-    except:
-        logger_object.error(
-            f'Error: unable to start thread '
-            f'for function_name="{function}"'
-        )
\ No newline at end of file
+    except Exception:
+        logger_object.exception(
+            f'Error: unable to submit task '
+            f'for function_name="{function.__name__}"'
+        )
@@ -1,19 +1,56 @@
+import io
 import os
-from PIL import Image
-from PIL.ExifTags import TAGS
+import struct
 from datetime import datetime
 
-from file_processor import get_creation_date
-from utilities import setup_logger, read_settings, get_script_details
+from metrics import instrument
+from processing_settings import get_settings
+from utilities import (
+    LOG_PER_FILE,
+    setup_logger,
+    get_creation_date,
+    get_script_details,
+)
 
 # GLOBAL VARIABLES
 DATE_FORMAT = "%Y-%m-%d - %H:%M:%S"
-EXIF_EXTRA_FIELDS = ["Make", "Model", "Artist"]
+MP4_EPOCH_OFFSET = 2082844800
+MATROSKA_EPOCH_OFFSET = 978307200
+MP4_SIGNATURES = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot')
+MP4_CONTAINER_BOXES = (b'trak', b'mdia', b'minf', b'stbl')
+MP4_HANDLERS = {
+    b'vide': "video",
+    b'soun': "audio",
+}
+MATROSKA_SIGNATURE = b'\x1a\x45\xdf\xa3'
+MATROSKA_TRACK_TYPES = {
+    1: "video",
+    2: "audio",
+}
+MAX_INDEX_SIZE = 64 * 1024 * 1024
+
+EBML_HEADER = 0x1A45DFA3
+EBML_DOC_TYPE = 0x4282
+EBML_SEGMENT = 0x18538067
+EBML_SEEK_HEAD = 0x114D9B74
+EBML_SEEK = 0x4DBB
+EBML_SEEK_ID = 0x53AB
+EBML_SEEK_POSITION = 0x53AC
+EBML_INFO = 0x1549A966
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_DATE_UTC = 0x4461
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_TRACK_TYPE = 0x83
+EBML_CODEC_ID = 0x86
+EBML_VIDEO = 0xE0
+EBML_PIXEL_WIDTH = 0xB0
+EBML_PIXEL_HEIGHT = 0xBA
+EBML_CLUSTER = 0x1F43B675
 
 SCRIPT_HOME, SCRIPT_NAME = get_script_details(script_path=__file__)
 PATH_FILE_LOG = os.path.join(SCRIPT_HOME,'var','log',SCRIPT_NAME + '.log')
-PATH_FILE_SETTINGS = os.path.join(SCRIPT_HOME, 'etc', SCRIPT_NAME + '.yaml')
-PATH_FILE_OUTPUT = os.path.join(SCRIPT_HOME, 'var', 'lib', SCRIPT_NAME + '.json')
 
 # DEFINING LOGGING SETTINGS
 logger = setup_logger(
@@ -21,139 +58,426 @@ logger = setup_logger(
 	file_path=PATH_FILE_LOG,
 )
 
-image_settings = read_settings(
-	settings_file=PATH_FILE_SETTINGS,
-	logger_object=logger,
-)
+# FUNCTIONS
+def iter_mp4_boxes(
+    box_data: bytes,
+):
+    """
+    Iterate over (type, payload) of boxes held in memory
+    """
+    offset = 0
 
+    while offset + 8 <= len(box_data):
+        box_size, box_type = struct.unpack_from('>I4s', box_data, offset)
+        header_size = 8
 
-# FUNCTIONS
-def get_labeled_exif(
-    file_path: str,
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', box_data, offset + 8)[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = len(box_data) - offset
+
+        if box_size < header_size:
+            return
+
+        yield box_type, box_data[offset + header_size:offset + box_size]
+        offset += box_size
+
+def find_mp4_moov(
+    file_descriptor,
+    file_size: int,
+) -> bytes:
+    """
+    Walk top-level boxes, seeking over media data,
+    and read the movie box holding the index
+    """
+    offset = 0
+
+    while offset + 8 <= file_size:
+        file_descriptor.seek(offset)
+        box_header = file_descriptor.read(16)
+        if len(box_header) < 8:
+            return None
+
+        box_size, box_type = struct.unpack_from('>I4s', box_header)
+        header_size = 8
+
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', box_header, 8)[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = file_size - offset
+
+        if box_size < header_size:
+            return None
+
+        if box_type == b'moov':
+            if box_size > MAX_INDEX_SIZE:
+                return None
+
+            file_descriptor.seek(offset + header_size)
+            return file_descriptor.read(box_size - header_size)
+
+        offset += box_size
+
+    return None
+
+def parse_mp4_track(
+    trak_data: bytes,
+    video_dict: dict,
 ):
     """
-    Collect EXIF data from an image file
-    with matching labels
+    Get handler, codec and display size of a track
+    """
+    track_boxes = dict()
+    pending_boxes = [trak_data]
+
+    while pending_boxes:
+        for box_type, box_payload in iter_mp4_boxes(pending_boxes.pop()):
+            if box_type in MP4_CONTAINER_BOXES:
+                pending_boxes.append(box_payload)
+            else:
+                track_boxes.setdefault(box_type, box_payload)
+
+    handler_box = track_boxes.get(b'hdlr', b'')
+    track_type = MP4_HANDLERS.get(handler_box[8:12])
+    if track_type is None:
+        return
+
+    sample_box = track_boxes.get(b'stsd', b'')
+    if len(sample_box) >= 16:
+        codec = sample_box[12:16].decode('latin-1').strip()
+        video_dict["codec"].setdefault(track_type, codec)
+
+    header_box = track_boxes.get(b'tkhd', b'')
+    if track_type == "video" and len(header_box) >= 84:
+        width, height = struct.unpack_from('>II', header_box, len(header_box) - 8)
+        video_dict.setdefault("resolution", {
+            "width": width >> 16,
+            "height": height >> 16,
+        })
+
+def parse_mp4(
+    file_descriptor,
+    file_size: int,
+) -> dict:
+    """
+    Get creation time, duration, resolution and codecs
+    from the movie box of an MP4 or QuickTime file
     """
+    video_dict = {
+        "format": "mp4",
+        "codec": dict(),
+    }
 
-    exif_data_labeled = {}
-    file_name, file_ext = os.path.splitext(file_path)
+    moov_data = find_mp4_moov(
+        file_descriptor=file_descriptor,
+        file_size=file_size,
+    )
+    if moov_data is None:
+        return video_dict
 
-    if file_ext.lower() == ".png":
-        return exif_data_labeled
+    for box_type, box_payload in iter_mp4_boxes(moov_data):
 
-    else:
-        image = Image.open(file_path)
-        exif_data_raw = image.getexif()
+        if box_type == b'mvhd':
+            if box_payload[0] == 1:
+                creation_time, _, timescale, duration = struct.unpack_from('>QQIQ', box_payload, 4)
+            else:
+                creation_time, _, timescale, duration = struct.unpack_from('>IIII', box_payload, 4)
 
-        if exif_data_raw is not None:
-            for (key, val) in exif_data_raw.items():
-                exif_data_labeled[TAGS.get(key)] = val
+            if creation_time:
+                video_dict["creation_time"] = creation_time - MP4_EPOCH_OFFSET
+            if timescale:
+                video_dict["duration"] = duration / timescale
 
-        return exif_data_labeled
+        elif box_type == b'trak':
+            parse_mp4_track(
+                trak_data=box_payload,
+                video_dict=video_dict,
+            )
 
+    return video_dict
 
-def get_exif_date(
-    exif_settings: dict,
-    exif_data: dict,
+def read_ebml_vint(
+    file_descriptor,
+    keep_marker: bool = False,
 ):
     """
-    Get a date from EXIF data input
+    Read a variable length EBML integer, returning it with its
+    length, keeping the length marker for element identifiers
     """
-    date_field = None
-    date_confidence = None
-    exif_date_timestamp = 0
+    first_byte = file_descriptor.read(1)
+    if not first_byte:
+        return None, 0
 
-    for field_settings in exif_settings:
+    first_value = first_byte[0]
+    vint_length = 1
+    while vint_length <= 8 and not first_value & (0x80 >> (vint_length - 1)):
+        vint_length += 1
 
-        for current_field, current_confidence in field_settings.items():
+    if vint_length > 8:
+        return None, 0
 
-            if current_field in exif_data:
+    vint_value = first_value if keep_marker else first_value & (0xFF >> vint_length)
+    for next_byte in file_descriptor.read(vint_length - 1):
+        vint_value = vint_value << 8 | next_byte
 
-                date_field = current_field
-                date_confidence = current_confidence
-                exif_date = exif_data.get(
-                    current_field
-                )
+    return vint_value, vint_length
 
-                exif_date_timestamp = datetime.timestamp(
-                    datetime.strptime(
-                        exif_date,
-                        "%Y:%m:%d %H:%M:%S"
-                    )
-                )
-                logger.info(
-                    f'Found EXIF date_field="{date_field}" '
-                    f'with date_confidence="{date_confidence}", '
-                    f'collecting date_timestamp="{exif_date_timestamp}"'
-                )
+def iter_ebml_elements(
+    file_descriptor,
+    end_offset: int,
+):
+    """
+    Iterate over (id, data offset, data size) of elements up to
+    end_offset, seeking over the data of each element
+    """
+    while file_descriptor.tell() < end_offset:
+        element_id, _ = read_ebml_vint(file_descriptor, keep_marker=True)
+        element_size, size_length = read_ebml_vint(file_descriptor)
+        if element_id is None or element_size is None:
+            return
 
-                return (
-                    date_field,
-                    date_confidence,
-                    exif_date_timestamp,
-                )
+        data_offset = file_descriptor.tell()
+        if element_size == (1 << (7 * size_length)) - 1:
+            element_size = None
+
+        yield element_id, data_offset, element_size
+
+        if element_size is None:
+            return
+
+        file_descriptor.seek(data_offset + element_size)
+
+def read_ebml_children(
+    file_descriptor,
+    data_offset: int,
+    data_size: int,
+) -> dict:
+    """
+    Read leaf children of an element as raw bytes, keyed by
+    identifier, nested masters being listed under their own key
+    """
+    children_dict = dict()
+    file_descriptor.seek(data_offset)
+
+    for element_id, child_offset, child_size in iter_ebml_elements(
+        file_descriptor,
+        data_offset + data_size,
+    ):
+        if child_size is None or child_size > MAX_INDEX_SIZE:
+            break
+
+        children_dict.setdefault(element_id, list()).append(
+            (child_offset, file_descriptor.read(child_size))
+        )
+
+    return children_dict
+
+def get_ebml_uint(
+    children_dict: dict,
+    element_id: int,
+    default: int = None,
+) -> int:
+    if element_id not in children_dict:
+        return default
+
+    return int.from_bytes(children_dict[element_id][0][1], 'big')
 
-    return (
-        date_field,
-        date_confidence,
-        exif_date_timestamp,
+def get_ebml_buffer_children(
+    element_data: bytes,
+) -> dict:
+    """
+    Read children of an element already held in memory
+    """
+    element_descriptor = io.BytesIO(element_data)
+
+    return read_ebml_children(
+        file_descriptor=element_descriptor,
+        data_offset=0,
+        data_size=len(element_data),
     )
 
+def parse_matroska_info(
+    info_children: dict,
+    video_dict: dict,
+):
+    timecode_scale = get_ebml_uint(info_children, EBML_TIMECODE_SCALE, 1000000)
+
+    if EBML_DURATION in info_children:
+        duration_data = info_children[EBML_DURATION][0][1]
+        duration_format = '>f' if len(duration_data) == 4 else '>d'
+        video_dict["duration"] = struct.unpack(duration_format, duration_data)[0] * timecode_scale / 1e9
+
+    if EBML_DATE_UTC in info_children:
+        date_nanoseconds = int.from_bytes(info_children[EBML_DATE_UTC][0][1], 'big', signed=True)
+        video_dict["creation_time"] = date_nanoseconds / 1e9 + MATROSKA_EPOCH_OFFSET
 
-def get_image_quality(
-    file_path:str,
+def parse_matroska_tracks(
+    tracks_children: dict,
+    video_dict: dict,
 ):
-    image_object = Image.open(file_path)
-    quality_dict = {
-        "quality": {
-            "resolution":
-                {
-                    "width": image_object.width,
-                    "height": image_object.height,
-                },
-            "format": image_object.format.lower(),
-            "mode": image_object.mode.lower(),
-        }
+    for _, entry_data in tracks_children.get(EBML_TRACK_ENTRY, list()):
+        entry_children = get_ebml_buffer_children(entry_data)
+        track_type = MATROSKA_TRACK_TYPES.get(
+            get_ebml_uint(entry_children, EBML_TRACK_TYPE)
+        )
+        if track_type is None:
+            continue
+
+        if EBML_CODEC_ID in entry_children:
+            codec = entry_children[EBML_CODEC_ID][0][1].rstrip(b'\x00').decode('latin-1')
+            video_dict["codec"].setdefault(track_type, codec)
+
+        if track_type == "video" and EBML_VIDEO in entry_children:
+            video_children = get_ebml_buffer_children(entry_children[EBML_VIDEO][0][1])
+            video_dict.setdefault("resolution", {
+                "width": get_ebml_uint(video_children, EBML_PIXEL_WIDTH),
+                "height": get_ebml_uint(video_children, EBML_PIXEL_HEIGHT),
+            })
+
+def parse_matroska(
+    file_descriptor,
+    file_size: int,
+) -> dict:
+    """
+    Get creation time, duration, resolution and codecs from the
+    Info and Tracks elements of a Matroska or WebM file, seeking
+    over clusters or jumping to the seek head positions
+    """
+    video_dict = {
+        "format": "matroska",
+        "codec": dict(),
     }
-    return quality_dict
 
-def get_image_settings(
-    file_path: str,
+    file_descriptor.seek(0)
+    for element_id, data_offset, data_size in iter_ebml_elements(file_descriptor, file_size):
+
+        if element_id == EBML_HEADER and data_size is not None:
+            header_children = read_ebml_children(file_descriptor, data_offset, data_size)
+            if EBML_DOC_TYPE in header_children:
+                video_dict["format"] = header_children[EBML_DOC_TYPE][0][1].rstrip(b'\x00').decode('latin-1')
+
+        elif element_id == EBML_SEGMENT:
+            segment_end = file_size if data_size is None else min(data_offset + data_size, file_size)
+            parse_matroska_segment(
+                file_descriptor=file_descriptor,
+                segment_offset=data_offset,
+                segment_end=segment_end,
+                video_dict=video_dict,
+            )
+            break
+
+    return video_dict
+
+def parse_matroska_segment(
+    file_descriptor,
+    segment_offset: int,
+    segment_end: int,
+    video_dict: dict,
 ):
-    """
-    Process an input image file to get settings
+    parsers = {
+        EBML_INFO: parse_matroska_info,
+        EBML_TRACKS: parse_matroska_tracks,
+    }
+    seek_positions = dict()
+    file_descriptor.seek(segment_offset)
+
+    for element_id, data_offset, data_size in iter_ebml_elements(file_descriptor, segment_end):
+
+        if element_id == EBML_SEEK_HEAD and data_size is not None:
+            seek_children = read_ebml_children(file_descriptor, data_offset, data_size)
+            for _, seek_data in seek_children.get(EBML_SEEK, list()):
+                seek_entry = get_ebml_buffer_children(seek_data)
+                seek_id = get_ebml_uint(seek_entry, EBML_SEEK_ID)
+                seek_position = get_ebml_uint(seek_entry, EBML_SEEK_POSITION)
+                if seek_id is not None and seek_position is not None:
+                    seek_positions[seek_id] = segment_offset + seek_position
+
+        elif element_id in parsers and data_size is not None:
+            parsers.pop(element_id)(
+                read_ebml_children(file_descriptor, data_offset, data_size),
+                video_dict,
+            )
+
+        elif element_id == EBML_CLUSTER:
+            break
+
+        if not parsers:
+            return
+
+    for element_id, element_parser in parsers.items():
+        if element_id not in seek_positions:
+            continue
+
+        file_descriptor.seek(seek_positions[element_id])
+        for found_id, data_offset, data_size in iter_ebml_elements(file_descriptor, segment_end):
+            if found_id == element_id and data_size is not None:
+                element_parser(
+                    read_ebml_children(file_descriptor, data_offset, data_size),
+                    video_dict,
+                )
+            break
 
-    TODO: CLEANUP by reducing number of lines in this method (sub-methods?)
+def get_video_metadata(
+    file_path: str,
+) -> dict:
+    """
+    Get container metadata, reading only headers
+    and index regions of the file
     """
-    image_info = dict()
+    file_size = os.path.getsize(file_path)
 
-    exif_settings = image_settings["date_confidence"]["exif"]
+    with open(file_path, 'rb') as file_descriptor:
+        file_signature = file_descriptor.read(12)
+
+        if file_signature[4:8] in MP4_SIGNATURES:
+            return parse_mp4(file_descriptor, file_size)
+
+        if file_signature.startswith(MATROSKA_SIGNATURE):
+            return parse_matroska(file_descriptor, file_size)
+
+    return dict()
+
+@instrument("get_video_settings")
+def get_video_settings(
+    file_path: str,
+):
+    """
+    Process an input video file to get settings
+    """
+    video_info = dict()
 
     logger.info(
-        f'Processing file_path="{file_path}"'
+        'Processing file_path="%s"',
+        file_path,
+        extra=LOG_PER_FILE,
     )
 
-    exif_data = get_labeled_exif(
-        file_path=file_path,
-    )
+    try:
+        video_dict = get_video_metadata(
+            file_path=file_path,
+        )
 
-    (
-        date_field,
-        date_confidence,
-        date_timestamp,
-    ) = get_exif_date(
-        exif_settings=exif_settings,
-        exif_data=exif_data,
-    )
+    except (OSError, struct.error, ValueError, IndexError) as error:
+        logger.warning(
+            'Could not parse container of file_path="%s", error="%s"',
+            file_path,
+            error,
+            extra=LOG_PER_FILE,
+        )
+        video_dict = dict()
 
-    if (
-        date_field is None
-        or date_confidence is None
-        or date_timestamp == 0
-    ):
-        file_settings = image_settings["date_confidence"]["file"]
+    date_timestamp = video_dict.get("creation_time")
 
+    if date_timestamp:
+        date_type = "CONTAINER"
+        date_field = "creation_time"
+        date_confidence = get_settings().video_container_dates.get(
+            video_dict["format"]
+        )
+
+    else:
         date_type = "CREATION"
 
         (
@@ -162,41 +486,37 @@ def get_image_settings(
             date_value,
         ) = get_creation_date(
             file_path=file_path,
-            file_settings=file_settings,
+            date_confidences=get_settings().video_file_dates,
+            logger_object=logger,
         )
+        date_timestamp = getattr(os.stat(file_path), 'st_' + date_field)
 
-    else:
-        date_type = "EXIF"
-
-        exif_extras = dict()
-        for field_name in EXIF_EXTRA_FIELDS:
-            exif_extras.update({
-                field_name : exif_data.get(field_name)
-            })
-
-        image_info.update({"device":exif_extras})
-
-    date_human = datetime.strftime(
-        datetime.fromtimestamp(
-            date_timestamp,
-        ),
-        DATE_FORMAT,
-    )
-
-    image_info.update({
+    video_info.update({
         "date":{
             "date_type":date_type,
             "date_field":date_field,
             "date_confidence":date_confidence,
             "date_timestamp":date_timestamp,
-            "date_human":date_human,
+            "date_human":datetime.strftime(
+                datetime.fromtimestamp(
+                    date_timestamp,
+                ),
+                DATE_FORMAT,
+            ),
         }
     })
 
-    image_info.update(
-        get_image_quality(
-            file_path
-        )
-    )
+    if video_dict:
+        quality_dict = {
+            "format": video_dict["format"],
+            "codec": video_dict["codec"],
+        }
+        for quality_field in ("resolution", "duration"):
+            if video_dict.get(quality_field) is not None:
+                quality_dict[quality_field] = video_dict[quality_field]
+
+        video_info.update({
+            "quality": quality_dict
+        })
 
-    return image_info
\ No newline at end of file
+    return video_info
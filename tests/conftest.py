@@ -0,0 +1,44 @@
+import os
+import sys
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import utilities
+
+# CLASSES
+class TemporaryLogFiles(dict):
+	"""
+	Register log files of module loggers in a temporary
+	folder instead of the var/log folder of the repository
+	"""
+
+	def __init__(
+			self,
+			log_folder:str,
+	):
+		super().__init__()
+		self.log_folder = log_folder
+
+	def __setitem__(
+			self,
+			logger_name:str,
+			file_path:str,
+	):
+		super().__setitem__(
+			logger_name,
+			os.path.join(self.log_folder, os.path.basename(file_path)),
+		)
+
+# FUNCTIONS
+def pytest_configure(config):
+	log_folder = tempfile.mkdtemp(prefix='test_log_')
+	config.log_folder = log_folder
+	utilities.log_files = TemporaryLogFiles(log_folder)
+
+def pytest_unconfigure(config):
+	for handler in utilities.get_log_root().handlers:
+		handler.close()
+
+	shutil.rmtree(config.log_folder, ignore_errors=True)
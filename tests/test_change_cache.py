@@ -0,0 +1,97 @@
+import os
+
+from change_cache import (
+	ChangeCacheWriter,
+	get_stat_key,
+	read_change_cache,
+	lookup_change_cache,
+)
+
+# FUNCTIONS
+def make_entry(
+		file_path:str,
+) -> dict:
+	return {
+		"hashes": {
+			"abc": {
+				"file": {
+					"path": file_path,
+				},
+			},
+		},
+	}
+
+def write_cache(
+		cache_file:str,
+		signature:str,
+		file_paths:list,
+		merge_previous:bool=False,
+):
+	cache_writer = ChangeCacheWriter(
+		cache_file=cache_file,
+		signature=signature,
+	)
+	for file_path in file_paths:
+		cache_writer.append(
+			file_path=file_path,
+			stat_key=(1, 2, 3, len(file_path)),
+			entry_dict=make_entry(file_path),
+		)
+	cache_writer.commit(merge_previous=merge_previous)
+
+# TESTS
+def test_get_stat_key(tmp_path):
+	file_path = tmp_path / 'a.txt'
+	file_path.write_bytes(b'abc')
+	stat_key = get_stat_key(os.stat(file_path))
+
+	assert stat_key[2] == 3
+	assert stat_key == get_stat_key(os.stat(file_path))
+
+	os.utime(file_path, ns=(0, 10 ** 9))
+	assert stat_key != get_stat_key(os.stat(file_path))
+
+def test_lookup_unchanged_files(tmp_path):
+	cache_file = str(tmp_path / 'cache.jsonl')
+	write_cache(cache_file, "signature", ["/a", "/bb"])
+	cache_dict = read_change_cache(cache_file=cache_file, signature="signature")
+
+	assert lookup_change_cache(cache_dict, "/a", (1, 2, 3, 2)) == make_entry("/a")
+	assert lookup_change_cache(cache_dict, "/a", (1, 2, 3, 4)) is None
+	assert lookup_change_cache(cache_dict, "/c", (1, 2, 3, 2)) is None
+
+def test_cache_of_other_settings_is_ignored(tmp_path):
+	cache_file = str(tmp_path / 'cache.jsonl')
+	write_cache(cache_file, "signature", ["/a"])
+
+	assert read_change_cache(cache_file=cache_file, signature="other") == dict()
+	assert read_change_cache(cache_file=str(tmp_path / 'missing.jsonl'), signature="signature") == dict()
+
+def test_partial_run_merges_previous_cache(tmp_path):
+	cache_file = str(tmp_path / 'cache.jsonl')
+	write_cache(cache_file, "signature", ["/a", "/b"])
+	write_cache(cache_file, "signature", ["/b", "/c"], merge_previous=True)
+
+	cache_dict = read_change_cache(cache_file=cache_file, signature="signature")
+	assert sorted(cache_dict) == ["/a", "/b", "/c"]
+
+	write_cache(cache_file, "signature", ["/c"])
+	assert list(read_change_cache(cache_file=cache_file, signature="signature")) == ["/c"]
+
+def test_partial_run_skips_previous_cache_of_other_settings(tmp_path):
+	cache_file = str(tmp_path / 'cache.jsonl')
+	write_cache(cache_file, "signature", ["/a"])
+	write_cache(cache_file, "other", ["/b"], merge_previous=True)
+
+	assert list(read_change_cache(cache_file=cache_file, signature="other")) == ["/b"]
+
+def test_aborted_run_keeps_previous_cache(tmp_path):
+	cache_file = str(tmp_path / 'cache.jsonl')
+	write_cache(cache_file, "signature", ["/a"])
+
+	cache_writer = ChangeCacheWriter(cache_file=cache_file, signature="signature")
+	cache_writer.append(file_path="/b", stat_key=(1,), entry_dict=make_entry("/b"))
+	cache_writer.abort()
+
+	assert list(read_change_cache(cache_file=cache_file, signature="signature")) == ["/a"]
+	assert not os.path.exists(cache_file + '.tmp')
@@ -0,0 +1,111 @@
+import json
+
+from checkpoint_processor import (
+	CrawlCheckpoint,
+	Checkpointer,
+	create_checkpoint,
+	read_checkpoint,
+	write_checkpoint,
+)
+from folder_processor import FolderWalker
+
+# TESTS
+def test_folder_completes_after_files_and_subfolders():
+	checkpoint = CrawlCheckpoint(folder_paths=["/root"])
+	checkpoint.add_folder("/root")
+	checkpoint.add_file(folder_path="/root", file_path="/root/a")
+	checkpoint.add_folder("/root/sub", parent_path="/root")
+	checkpoint.release("/root")
+
+	checkpoint.add_file(folder_path="/root/sub", file_path="/root/sub/b")
+	checkpoint.release("/root/sub")
+	assert checkpoint.snapshot()["frontier"] == ["/root", "/root/sub"]
+
+	checkpoint.release_files(["/root/sub/b", "/root/unknown"])
+	assert checkpoint.snapshot()["completed"] == ["/root/sub"]
+	assert checkpoint.snapshot()["frontier"] == ["/root"]
+
+	checkpoint.release_files(["/root/a"])
+	checkpoint_dict = checkpoint.snapshot()
+	assert checkpoint_dict["completed"] == ["/root"]
+	assert checkpoint_dict["frontier"] == []
+	assert checkpoint.is_completed("/root")
+
+def test_unreleased_file_keeps_ancestors_pending():
+	checkpoint = CrawlCheckpoint(folder_paths=["/root"])
+	checkpoint.add_folder("/root")
+	checkpoint.add_folder("/root/sub", parent_path="/root")
+	checkpoint.add_folder("/root/other", parent_path="/root")
+	checkpoint.release("/root")
+	checkpoint.add_file(folder_path="/root/sub", file_path="/root/sub/failed")
+	checkpoint.release("/root/sub")
+	checkpoint.release("/root/other")
+
+	checkpoint_dict = checkpoint.snapshot()
+	assert checkpoint_dict["completed"] == ["/root/other"]
+	assert checkpoint_dict["frontier"] == ["/root", "/root/sub"]
+
+def test_checkpoint_file_round_trip(tmp_path):
+	checkpoint_file = str(tmp_path / 'checkpoint.json')
+	assert read_checkpoint(checkpoint_file=checkpoint_file) is None
+
+	checkpoint_dict = {
+		"roots": ["/root"],
+		"completed": ["/root/sub"],
+		"frontier": ["/root"],
+		"timestamp": 1.0,
+	}
+	write_checkpoint(checkpoint_dict=checkpoint_dict, checkpoint_file=checkpoint_file)
+
+	assert read_checkpoint(checkpoint_file=checkpoint_file) == checkpoint_dict
+	assert not (tmp_path / 'checkpoint.json.tmp').exists()
+
+	checkpoint = create_checkpoint(folder_paths=["/root"], resume=True, checkpoint_file=checkpoint_file)
+	assert checkpoint.is_completed("/root/sub")
+	assert not checkpoint.is_completed("/root")
+
+	checkpoint = create_checkpoint(folder_paths=["/root"], resume=False, checkpoint_file=checkpoint_file)
+	assert not checkpoint.is_completed("/root/sub")
+
+def test_checkpointer_acknowledges_before_snapshot(tmp_path):
+	checkpoint_file = tmp_path / 'checkpoint.json'
+	checkpoint = CrawlCheckpoint(folder_paths=["/root"])
+	checkpoint.add_folder("/root")
+	checkpoint.add_file(folder_path="/root", file_path="/root/a")
+	checkpoint.release("/root")
+
+	checkpointer = Checkpointer(
+		checkpoint=checkpoint,
+		flush_function=lambda: False,
+		interval=60,
+		acknowledge_function=lambda: checkpoint.release_files(["/root/a"]),
+		checkpoint_file=str(checkpoint_file),
+	)
+	checkpointer.store()
+	assert not checkpoint_file.exists()
+
+	checkpointer.flush_function = lambda: True
+	checkpointer.store()
+	assert json.loads(checkpoint_file.read_text())["completed"] == ["/root"]
+
+def test_resumed_walk_skips_completed_folders(tmp_path):
+	for folder_name in ('done', 'todo'):
+		(tmp_path / folder_name).mkdir()
+		(tmp_path / folder_name / 'file.txt').write_bytes(b'data')
+
+	handled_paths = list()
+	checkpoint = CrawlCheckpoint(
+		folder_paths=[str(tmp_path)],
+		completed_folders=[str(tmp_path / 'done')],
+	)
+	folder_walker = FolderWalker(
+		file_handler=lambda file_path, file_stat: handled_paths.append(file_path),
+		walker_count=2,
+		queue_size=4,
+		checkpoint=checkpoint,
+	)
+	folder_walker.walk([str(tmp_path)])
+
+	assert handled_paths == [str(tmp_path / 'todo' / 'file.txt')]
+	assert checkpoint.is_completed(str(tmp_path))
+	assert checkpoint.snapshot()["frontier"] == []
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+import io_throttle
+import metrics
+import inventory_processor
+import processing_settings
+from disk_crawler import run_crawl
+from inventory_processor import (
+	INVENTORY_BACKENDS,
+	JournalBackend,
+)
+
+# CLASSES
+class FailingBackend(JournalBackend):
+	"""
+	Journal backend refusing to store entries of bad.txt
+	"""
+
+	def store(
+			self,
+			entries:list,
+			lock=None,
+	):
+		for entry_dict in entries:
+			for file_details in entry_dict["hashes"].values():
+				if file_details["file"]["path"].endswith('bad.txt'):
+					raise ValueError('Refusing to store bad.txt')
+
+		super().store(
+			entries=entries,
+			lock=lock,
+		)
+
+# FIXTURES
+@pytest.fixture
+def crawl_paths(tmp_path, monkeypatch):
+	for module, name in (
+		(inventory_processor, "result_queue"),
+		(inventory_processor, "writer_stats"),
+		(metrics, "crawl_metrics"),
+		(io_throttle, "io_throttle"),
+		(processing_settings, "processing_settings"),
+	):
+		monkeypatch.setattr(module, name, getattr(module, name))
+	monkeypatch.setitem(INVENTORY_BACKENDS, "failing", FailingBackend)
+
+	source_folder = tmp_path / 'source'
+	(source_folder / 'sub').mkdir(parents=True)
+	(source_folder / 'good.txt').write_bytes(b'good')
+	(source_folder / 'sub' / 'bad.txt').write_bytes(b'bad')
+	(source_folder / 'sub' / 'other.txt').write_bytes(b'other')
+
+	return {
+		"source_folder": str(source_folder),
+		"journal_file": tmp_path / 'inventory.jsonl',
+		"checkpoint_file": tmp_path / 'checkpoint.json',
+		"crawl_options": {
+			"execution_mode": "thread",
+			"worker_count": 2,
+			"walker_count": 1,
+			"backend_options": {
+				"snapshot_file": str(tmp_path / 'inventory.json'),
+				"journal_file": str(tmp_path / 'inventory.jsonl'),
+			},
+			"cache_file": str(tmp_path / 'cache.jsonl'),
+			"checkpoint_file": str(tmp_path / 'checkpoint.json'),
+			"incremental": False,
+			"hash_names": ["md5"],
+			"metadata": False,
+			"tiered": False,
+		},
+	}
+
+# TESTS
+def test_crawl_stores_every_file(crawl_paths):
+	crawl_stats = run_crawl(
+		folder_paths=[crawl_paths["source_folder"]],
+		backend_name="journal",
+		**crawl_paths["crawl_options"],
+	)
+
+	assert not crawl_stats["writer_failed"]
+	assert crawl_stats["writer"]["written"] == 3
+	assert not crawl_paths["checkpoint_file"].exists()
+
+def test_crawl_keeps_checkpoint_when_writer_loses_results(crawl_paths):
+	crawl_stats = run_crawl(
+		folder_paths=[crawl_paths["source_folder"]],
+		backend_name="failing",
+		**crawl_paths["crawl_options"],
+	)
+
+	assert crawl_stats["writer_failed"]
+	assert crawl_stats["writer"]["written"] == 2
+	assert crawl_stats["writer"]["failed"] == 1
+
+	checkpoint_dict = json.loads(crawl_paths["checkpoint_file"].read_text())
+	assert checkpoint_dict["completed"] == []
+	assert crawl_paths["source_folder"] + '/sub' in checkpoint_dict["frontier"]
+
+	crawl_stats = run_crawl(
+		folder_paths=[crawl_paths["source_folder"]],
+		backend_name="journal",
+		resume=True,
+		**crawl_paths["crawl_options"],
+	)
+
+	assert not crawl_stats["writer_failed"]
+	assert not crawl_paths["checkpoint_file"].exists()
+
+	stored_paths = {
+		file_details["file"]["path"]
+		for line in crawl_paths["journal_file"].read_text().splitlines()
+		for file_details in json.loads(line)["hashes"].values()
+	}
+	assert crawl_paths["source_folder"] + '/sub/bad.txt' in stored_paths
+
+def test_incremental_crawl_reuses_unchanged_files(crawl_paths):
+	crawl_options = dict(crawl_paths["crawl_options"], incremental=True)
+	run_crawl(
+		folder_paths=[crawl_paths["source_folder"]],
+		backend_name="journal",
+		**crawl_options,
+	)
+	crawl_stats = run_crawl(
+		folder_paths=[crawl_paths["source_folder"]],
+		backend_name="journal",
+		**crawl_options,
+	)
+
+	assert crawl_stats["writer"]["cache_hits"] == 3
+	assert crawl_stats["writer"]["written"] == 0
+
+	crawl_options["hash_names"] = ["sha1"]
+	crawl_stats = run_crawl(
+		folder_paths=[crawl_paths["source_folder"]],
+		backend_name="journal",
+		**crawl_options,
+	)
+
+	assert crawl_stats["writer"]["cache_hits"] == 0
+	assert crawl_stats["writer"]["written"] == 3
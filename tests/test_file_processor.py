@@ -0,0 +1,239 @@
+import hashlib
+
+import pytest
+
+import io_throttle
+import processing_settings
+from file_processor import (
+    get_file_type,
+    hash_file,
+    hash_mapped_file,
+    sniff_file_type,
+    verify_collisions,
+)
+from inventory_index import build_index
+from inventory_processor import JournalBackend
+from inventory_sqlite import SqliteBackend
+
+# GLOBAL VARIABLES
+INDEX_HASH = 'f' * 16
+
+# CLASSES
+class RecordingThrottle:
+    """
+    Throttle recording reads instead of limiting them
+    """
+
+    def __init__(self):
+        self.acquired = list()
+        self.observed = list()
+
+    def acquire(self, byte_count):
+        self.acquired.append(byte_count)
+
+    def observe(self, elapsed_seconds):
+        self.observed.append(elapsed_seconds)
+
+# FUNCTIONS
+def make_entry(
+    file_path,
+    file_hash: str = INDEX_HASH,
+    digests: dict = None,
+) -> dict:
+    return {
+        "hashes": {
+            file_hash: {
+                "file": {
+                    "path": str(file_path),
+                    "name": file_path.stem,
+                    "extension": file_path.suffix.lstrip('.'),
+                    "type": "unknown",
+                    "bytes": file_path.stat().st_size,
+                },
+                "hash": dict(digests or {"xxh64": file_hash}),
+            },
+        },
+    }
+
+def get_record_paths(
+    backend,
+    file_hash: str,
+) -> list:
+    file_record = build_index(backend.lookup_hashes([file_hash])).get(file_hash)
+
+    return sorted(file_record.paths) if file_record is not None else []
+
+# FIXTURES
+@pytest.fixture
+def recording_throttle(monkeypatch):
+    throttle_object = RecordingThrottle()
+    monkeypatch.setattr(io_throttle, "io_throttle", throttle_object)
+
+    return throttle_object
+
+@pytest.fixture
+def default_settings(monkeypatch):
+    monkeypatch.setattr(processing_settings, "processing_settings", None)
+
+@pytest.fixture(params=["journal", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "journal":
+        backend = JournalBackend(
+            snapshot_file=str(tmp_path / 'inventory.json'),
+            journal_file=str(tmp_path / 'inventory.jsonl'),
+        )
+    else:
+        backend = SqliteBackend(
+            database_file=str(tmp_path / 'inventory.sqlite'),
+        )
+
+    yield backend
+    backend.close()
+
+@pytest.fixture
+def colliding_files(tmp_path):
+    file_paths = {
+        file_name: tmp_path / file_name
+        for file_name in ('first.txt', 'copy.txt', 'other.txt')
+    }
+    file_paths['first.txt'].write_bytes(b'same content')
+    file_paths['copy.txt'].write_bytes(b'same content')
+    file_paths['other.txt'].write_bytes(b'other content')
+
+    return file_paths
+
+@pytest.fixture
+def data_file(tmp_path):
+    file_path = tmp_path / 'data.bin'
+    file_path.write_bytes(bytes(range(256)) * 40)
+
+    return file_path
+
+# TESTS
+@pytest.mark.parametrize("drop_cache", [False, True])
+def test_hash_file_and_mapped_file_agree(data_file, drop_cache):
+    file_data = data_file.read_bytes()
+    expected_digests = {
+        "md5": hashlib.md5(file_data).hexdigest(),
+        "sha256": hashlib.sha256(file_data).hexdigest(),
+    }
+
+    with open(data_file, 'rb', buffering=0) as file_descriptor:
+        streamed = hash_file(
+            file_descriptor=file_descriptor,
+            hash_names=["md5", "sha256"],
+            block_size=4096,
+            header_size=5000,
+            drop_cache=drop_cache,
+        )
+
+    with open(data_file, 'rb', buffering=0) as file_descriptor:
+        mapped = hash_mapped_file(
+            file_descriptor=file_descriptor,
+            file_size=len(file_data),
+            hash_names=["md5", "sha256"],
+            block_size=4096,
+            header_size=5000,
+            drop_cache=drop_cache,
+        )
+
+    assert streamed == mapped == (expected_digests, len(file_data), file_data[:5000])
+
+@pytest.mark.parametrize("hash_function", [hash_file, hash_mapped_file])
+def test_reads_are_throttled_and_observed_per_block(data_file, recording_throttle, hash_function):
+    hash_arguments = {
+        "hash_names": ["md5"],
+        "block_size": 4096,
+    }
+    if hash_function is hash_mapped_file:
+        hash_arguments["file_size"] = data_file.stat().st_size
+
+    with open(data_file, 'rb', buffering=0) as file_descriptor:
+        hash_function(file_descriptor=file_descriptor, **hash_arguments)
+
+    assert recording_throttle.acquired == [4096, 4096, 2048]
+    assert len(recording_throttle.observed) == 3
+    assert all(elapsed_seconds >= 0 for elapsed_seconds in recording_throttle.observed)
+
+@pytest.mark.parametrize("header_bytes, sniffed_type", [
+    (b'\xff\xd8\xff\xe0\x00\x10JFIF', "image"),
+    (b'\x89PNG\r\n\x1a\n\x00\x00', "image"),
+    (b'RIFF\x00\x00\x00\x00WEBPVP8 ', "image"),
+    (b'RIFF\x00\x00\x00\x00AVI LIST', "video"),
+    (b'\x00\x00\x00\x18ftypheic\x00\x00', "image"),
+    (b'\x00\x00\x00\x18ftypisom\x00\x00', "video"),
+    (b'\x1a\x45\xdf\xa3\x01\x00', "video"),
+    (b'%PDF-1.7\n', "document"),
+    (b'PK\x03\x04\x14\x00', None),
+    (b'plain text', "unknown"),
+    (b'', "unknown"),
+])
+def test_sniff_file_type(header_bytes, sniffed_type):
+    assert sniff_file_type(header_bytes) == sniffed_type
+
+@pytest.mark.parametrize("file_ext, header_bytes, file_type", [
+    ("txt", b'\xff\xd8\xff\xe0\x00\x10JFIF', "image"),
+    ("jpg", b'\x00\x00\x00\x18ftypisom\x00\x00', "video"),
+    ("docx", b'PK\x03\x04\x14\x00', "document"),
+    ("jpg", b'PK\x03\x04\x14\x00', "image"),
+    ("png", b'plain text', "image"),
+    ("txt", b'plain text', "document"),
+    ("bin", b'plain text', "unknown"),
+    ("mp4", b'', "video"),
+])
+def test_content_wins_over_extension(default_settings, file_ext, header_bytes, file_type):
+    assert get_file_type(file_ext=file_ext, header_bytes=header_bytes) == file_type
+
+def test_verify_collisions_splits_different_contents(backend, colliding_files):
+    backend.store([
+        make_entry(file_path)
+        for file_path in colliding_files.values()
+    ])
+
+    verify_stats = verify_collisions(
+        backend=backend,
+        stored_paths={INDEX_HASH: {str(file_path) for file_path in colliding_files.values()}},
+        verify_name="sha1",
+    )
+
+    assert verify_stats == {"groups": 1, "files": 3, "collisions": 1, "split": 1}
+
+    same_digest = hashlib.sha1(b'same content').hexdigest()
+    other_digest = hashlib.sha1(b'other content').hexdigest()
+    assert get_record_paths(backend, INDEX_HASH) == sorted([
+        str(colliding_files['first.txt']),
+        str(colliding_files['copy.txt']),
+    ])
+    assert get_record_paths(backend, other_digest) == [str(colliding_files['other.txt'])]
+
+    file_record = build_index(backend.lookup_hashes([INDEX_HASH])).get(INDEX_HASH)
+    assert file_record.digests["sha1"] == bytes.fromhex(same_digest)
+
+def test_verified_group_checks_only_stored_paths(backend, colliding_files):
+    same_digest = hashlib.sha1(b'same content').hexdigest()
+    backend.store([
+        make_entry(colliding_files[file_name], digests={"xxh64": INDEX_HASH, "sha1": same_digest})
+        for file_name in ('first.txt', 'copy.txt')
+    ] + [
+        make_entry(colliding_files['other.txt'])
+    ])
+
+    verify_stats = verify_collisions(
+        backend=backend,
+        stored_paths={INDEX_HASH: {str(colliding_files['other.txt'])}},
+        verify_name="sha1",
+    )
+
+    assert verify_stats == {"groups": 1, "files": 1, "collisions": 1, "split": 1}
+    assert str(colliding_files['other.txt']) not in get_record_paths(backend, INDEX_HASH)
+
+def test_unique_index_hash_is_not_verified(backend, colliding_files):
+    backend.store([make_entry(colliding_files['first.txt'])])
+
+    verify_stats = verify_collisions(
+        backend=backend,
+        stored_paths={INDEX_HASH: {str(colliding_files['first.txt'])}},
+        verify_name="sha1",
+    )
+
+    assert verify_stats == {"groups": 0, "files": 0, "collisions": 0, "split": 0}
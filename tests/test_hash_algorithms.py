@@ -0,0 +1,51 @@
+import hashlib
+
+import pytest
+
+import hash_algorithms
+from hash_algorithms import (
+	HASH_FALLBACKS,
+	STANDARD_HASHES,
+	new_hash,
+	resolve_hash_name,
+)
+
+# FIXTURES
+@pytest.fixture
+def missing_modules(monkeypatch):
+	fast_hashes = {
+		hash_name: hash_factory
+		for hash_name, hash_factory in hash_algorithms.FAST_HASHES.items()
+		if hash_name not in HASH_FALLBACKS
+	}
+	monkeypatch.setattr(hash_algorithms, "FAST_HASHES", fast_hashes)
+	monkeypatch.setattr(hash_algorithms, "missing_hashes", set())
+
+# TESTS
+def test_standard_hashes_exclude_variable_length():
+	assert "sha1" in STANDARD_HASHES
+	assert not any(hash_name.startswith('shake_') for hash_name in STANDARD_HASHES)
+
+	with pytest.raises(ValueError):
+		resolve_hash_name("shake_128")
+
+def test_available_hashes_resolve_to_themselves():
+	assert resolve_hash_name("md5") == "md5"
+	assert resolve_hash_name("blake2b-64") == "blake2b-64"
+	assert new_hash("blake2b-64").digest_size == 8
+
+@pytest.mark.parametrize("hash_name", sorted(HASH_FALLBACKS))
+def test_missing_module_falls_back(missing_modules, hash_name):
+	fallback_name = HASH_FALLBACKS[hash_name]
+
+	assert resolve_hash_name(hash_name) == fallback_name
+	assert resolve_hash_name(hash_name) == fallback_name
+	assert hash_algorithms.missing_hashes == {hash_name}
+
+	hash_object = new_hash(resolve_hash_name(hash_name))
+	hash_object.update(b'data')
+	assert hash_object.hexdigest() == hashlib.new(fallback_name, b'data').hexdigest()
+
+def test_unsupported_hash_is_rejected():
+	with pytest.raises(ValueError, match='Unsupported hash algorithm'):
+		resolve_hash_name("crc32")
@@ -0,0 +1,196 @@
+import io
+import csv
+import json
+import math
+
+from inventory_processor import (
+	JournalBackend,
+	SnapshotReader,
+	load_inventory,
+	write_snapshot,
+)
+from inventory_export import (
+	EXPORT_COLUMNS,
+	ColumnarExporter,
+	ColumnarReader,
+	export_columns,
+	iter_rows,
+)
+
+# FUNCTIONS
+def make_details(
+		file_path:str,
+		file_bytes:int,
+		date_confidence:str="Low",
+		width:int=None,
+) -> dict:
+	file_details = {
+		"file": {
+			"path": file_path,
+			"bytes": file_bytes,
+			"type": "image" if width else "unknown",
+			"extension": file_path.rsplit('.', 1)[-1],
+		},
+		"date": {
+			"date_confidence": date_confidence,
+			"date_timestamp": float(file_bytes),
+		},
+	}
+	if width:
+		file_details["quality"] = {
+			"resolution": {
+				"width": width,
+				"height": width // 2,
+			},
+		}
+		file_details["device"] = {
+			"Make": "Canon",
+			"Model": None,
+		}
+
+	return file_details
+
+def make_backend(tmp_path) -> JournalBackend:
+	write_snapshot(
+		inventory_dict={
+			"hashes": {
+				"aaa": make_details("/a.jpg", 1, width=640),
+				"bbb": make_details("/b.txt", 2),
+			},
+		},
+		output_file=str(tmp_path / 'inventory.json'),
+	)
+	journal_entries = [
+		{"hashes": {"bbb": make_details("/c.txt", 2, date_confidence="High")}},
+		{"hashes": {"ccc": make_details("/d.txt", 3)}},
+		{"hashes": {"bbb": make_details("/b.txt", 2)}},
+	]
+	(tmp_path / 'inventory.jsonl').write_text(
+		''.join(json.dumps(entry_dict) + '\n' for entry_dict in journal_entries)
+	)
+
+	return JournalBackend(
+		snapshot_file=str(tmp_path / 'inventory.json'),
+		journal_file=str(tmp_path / 'inventory.jsonl'),
+	)
+
+# TESTS
+def test_snapshot_reader_decodes_records_across_chunks():
+	hashes_dict = {
+		f'hash_{index:03}': {
+			"file": {
+				"path": [f'/folder/{index}', '/other "quoted" {path}'],
+			},
+		}
+		for index in range(50)
+	}
+	snapshot_text = json.dumps({"hashes": hashes_dict, "version": [1, {"a": 2}]}, indent=4, sort_keys=True)
+
+	for chunk_size in (1, 7, 4096):
+		snapshot_reader = SnapshotReader(io.StringIO(snapshot_text), chunk_size=chunk_size)
+		assert dict(snapshot_reader.iter_records()) == hashes_dict
+
+	assert list(SnapshotReader(io.StringIO('')).iter_records()) == []
+	assert list(SnapshotReader(io.StringIO('{"hashes": {}}')).iter_records()) == []
+
+def test_journal_records_match_loaded_inventory(tmp_path):
+	backend = make_backend(tmp_path)
+	inventory_dict = load_inventory(
+		snapshot_file=backend.snapshot_file,
+		journal_file=backend.journal_file,
+	)
+
+	records_dict = dict()
+	for entry_dict in backend.iter_records():
+		records_dict.update(entry_dict["hashes"])
+
+	assert records_dict == inventory_dict["hashes"]
+	assert records_dict["bbb"]["file"]["path"] == ["/b.txt", "/c.txt"]
+	assert records_dict["bbb"]["date"]["date_confidence"] == "High"
+
+def test_iter_rows_yields_one_row_per_path(tmp_path):
+	row_values = list(iter_rows(make_backend(tmp_path).iter_records()))
+
+	assert [row[:3] for row in row_values] == [
+		("/a.jpg", 1, "aaa"),
+		("/b.txt", 2, "bbb"),
+		("/c.txt", 2, "bbb"),
+		("/d.txt", 3, "ccc"),
+	]
+	assert row_values[0][6:] == (640, 320, "Canon", None)
+	assert row_values[1][6:] == (None, None, None, None)
+
+def test_columnar_export_round_trip(tmp_path):
+	row_values = [
+		(f'/folder/é{index}', index, f'{index:x}', None, "txt", index / 2, None if index % 2 else index, 1, None, "")
+		for index in range(10)
+	]
+	output_file = str(tmp_path / 'export.cols')
+	exporter = ColumnarExporter(output_file, row_group_size=4)
+	for row in row_values:
+		exporter.write_row(row)
+	exporter.close()
+
+	column_reader = ColumnarReader(output_file)
+	try:
+		assert len(column_reader) == 10
+		assert len(column_reader.row_groups) == 3
+		assert [tuple(row.values()) for row in column_reader.iter_rows()] == row_values
+		assert list(column_reader.iter_column("width")) == [row[6] for row in row_values]
+
+		sizes, validity = column_reader.read_column("size", 1)
+		assert list(sizes) == [4, 5, 6, 7]
+		assert list(validity) == [1, 1, 1, 1]
+
+		widths, validity = column_reader.read_column("width", 0)
+		assert list(validity) == [1, 0, 1, 0]
+
+		timestamps, validity = column_reader.read_column("date_timestamp", 0)
+		assert list(timestamps) == [0, 0.5, 1, 1.5]
+
+		del sizes, widths, timestamps, validity
+
+	finally:
+		column_reader.close()
+
+def test_columnar_export_missing_float_is_nan(tmp_path):
+	output_file = str(tmp_path / 'export.cols')
+	exporter = ColumnarExporter(output_file)
+	exporter.write_row(("/a",) + (None,) * (len(EXPORT_COLUMNS) - 1))
+	exporter.close()
+
+	column_reader = ColumnarReader(output_file)
+	try:
+		timestamps, validity = column_reader.read_column("date_timestamp", 0)
+		assert math.isnan(timestamps[0])
+		assert validity[0] == 0
+		assert next(column_reader.iter_rows())["date_timestamp"] is None
+
+		del timestamps, validity
+
+	finally:
+		column_reader.close()
+
+def test_export_columns(tmp_path):
+	backend = make_backend(tmp_path)
+	expected_rows = list(iter_rows(backend.iter_records()))
+
+	columnar_file = str(tmp_path / 'export.cols')
+	assert export_columns(output_file=columnar_file, export_format="columnar", backend=backend) == 4
+
+	column_reader = ColumnarReader(columnar_file)
+	try:
+		assert [tuple(row.values()) for row in column_reader.iter_rows()] == expected_rows
+
+	finally:
+		column_reader.close()
+
+	csv_file = str(tmp_path / 'export.csv')
+	assert export_columns(output_file=csv_file, export_format="csv", backend=backend) == 4
+
+	with open(csv_file, newline='', encoding='utf8') as csv_stream:
+		csv_rows = list(csv.reader(csv_stream))
+
+	assert csv_rows[0] == [column_name for column_name, _ in EXPORT_COLUMNS]
+	assert csv_rows[1] == ["/a.jpg", "1", "aaa", "image", "jpg", "1.0", "640", "320", "Canon", ""]
+	assert not (tmp_path / 'export.csv.tmp').exists()
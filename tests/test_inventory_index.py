@@ -0,0 +1,209 @@
+from inventory_index import (
+	FileRecord,
+	InventoryIndex,
+	build_index,
+	get_digest_layout,
+)
+from inventory_processor import (
+	JournalBackend,
+	compact_inventory,
+	load_inventory,
+)
+from merge_engine import MergeEngine
+
+# GLOBAL VARIABLES
+MD5_A = 'a' * 32
+MD5_B = 'b' * 32
+SHA1_A = '1' * 40
+
+# FUNCTIONS
+def make_details(
+		file_path:str,
+		date_confidence:str,
+		date_human:str,
+) -> dict:
+	return {
+		"file": {
+			"bytes": 10,
+			"type": "image",
+			"path": file_path,
+			"name": file_path[1:].split('.')[0],
+			"extension": "jpg",
+		},
+		"hash": {
+			"md5": MD5_A,
+		},
+		"date": {
+			"date_type": "CREATION",
+			"date_field": "mtime",
+			"date_confidence": date_confidence,
+			"date_timestamp": 100.0,
+			"date_human": date_human,
+		},
+	}
+
+# TESTS
+def test_record_round_trip():
+	file_details = make_details("/a.jpg", "Medium", "first")
+	file_details["hash"]["sha1"] = SHA1_A
+	file_details["quality"] = {
+		"resolution": {
+			"width": 640,
+			"height": 480,
+		},
+		"format": "JPEG",
+		"mode": "RGB",
+		"duration": 1.5,
+	}
+	file_details["device"] = {
+		"Make": "Canon",
+		"Model": "EOS",
+		"Artist": None,
+	}
+	file_details["perceptual"] = {
+		"dhash": "ff00",
+	}
+
+	file_record = FileRecord.from_details(file_details)
+
+	assert file_record.to_details() == file_details
+	assert file_record.digests == {
+		"md5": bytes.fromhex(MD5_A),
+		"sha1": bytes.fromhex(SHA1_A),
+	}
+
+def test_record_paths_and_digests_merge():
+	file_record = FileRecord.from_details(make_details("/a.jpg", "Medium", "first"))
+	file_record.merge_details({
+		"file": {
+			"path": ["/b.jpg", "/a.jpg"],
+		},
+		"hash": {
+			"md5": MD5_A,
+			"sha1": SHA1_A,
+		},
+	})
+
+	assert file_record.paths == ["/a.jpg", "/b.jpg"]
+	assert list(file_record.digests) == ["md5", "sha1"]
+	assert file_record.to_details("/b.jpg")["file"]["path"] == "/b.jpg"
+
+def test_records_share_digest_layouts():
+	first_record = FileRecord.from_details(make_details("/a.jpg", "Medium", "first"))
+	second_record = FileRecord.from_details(make_details("/b.jpg", "Medium", "first"))
+
+	assert first_record.digest_layout is second_record.digest_layout
+	assert get_digest_layout((("md5", 16),)) is first_record.digest_layout
+
+def test_index_dates_follow_merge_engine():
+	entries = [
+		{"hashes": {MD5_A: make_details("/a.jpg", "Low", "low")}},
+		{"hashes": {MD5_A: make_details("/b.jpg", "High", "high")}},
+		{"hashes": {MD5_A: make_details("/c.jpg", "Medium", "medium")}},
+		{"hashes": {MD5_A: make_details("/d.jpg", "High", "other high")}},
+	]
+
+	inventory_dict = dict()
+	merge_engine = MergeEngine()
+	for entry_dict in entries:
+		merge_engine.merge(inventory_dict, entry_dict)
+
+	expected_date = inventory_dict["hashes"][MD5_A]["date"]
+	assert expected_date["date_human"] == "high"
+
+	assert build_index(entries).get(MD5_A).to_details()["date"] == expected_date
+
+	merged_index = build_index(entries[:1])
+	for entry_dict in entries[1:]:
+		merged_index.merge(build_index([entry_dict]))
+	assert merged_index.get(MD5_A).to_details()["date"] == expected_date
+
+def test_index_merge_takes_over_records():
+	first_index = build_index([{"hashes": {MD5_A: make_details("/a.jpg", "Low", "low")}}])
+	other_index = InventoryIndex()
+	other_index.add_entry({"hashes": {"b" * 32: make_details("/b.jpg", "Low", "low")}})
+	other_record = other_index.get("b" * 32)
+
+	first_index.merge(other_index)
+
+	assert len(first_index) == 2
+	assert first_index.get("b" * 32) is other_record
+	assert [file_hash for file_hash, _ in first_index] == [MD5_A, "b" * 32]
+	assert list(first_index.iter_entries())[1] == {
+		"hashes": {
+			"b" * 32: make_details("/b.jpg", "Low", "low"),
+		},
+	}
+
+def test_record_details_per_path():
+	file_record = FileRecord.from_details(make_details("/a.jpg", "Medium", "first"))
+	file_record.merge_details(make_details("/B.jpg", "Medium", "first"))
+
+	file_details = file_record.to_details()
+	assert file_details["file"]["path"] == ["/a.jpg", "/B.jpg"]
+	assert file_details["file"]["name"] == "a"
+
+	for file_path, file_name in (("/a.jpg", "a"), ("/B.jpg", "b")):
+		path_details = file_record.to_details(file_path)
+		assert path_details["file"]["path"] == file_path
+		assert path_details["file"]["name"] == file_name
+		assert path_details["hash"] == file_details["hash"]
+		assert path_details["date"] == file_details["date"]
+
+def test_record_without_optional_sections_round_trip():
+	file_details = make_details("/a.mp4", "Low", "low")
+	file_details["file"].update(type="video", name="a", extension="mp4")
+	del file_details["date"]
+	file_details["quality"] = {
+		"format": "mp4",
+		"codec": "avc1",
+	}
+	file_details["video"] = {
+		"streams": 2,
+	}
+
+	assert FileRecord.from_details(file_details).to_details() == file_details
+
+	file_details["quality"]["resolution"] = {
+		"width": 1920,
+		"height": 1080,
+	}
+	file_details["quality"]["duration"] = 12.5
+	file_record = FileRecord.from_details(file_details)
+	file_record.merge(FileRecord.from_details(make_details("/b.mp4", "Low", "low")))
+
+	assert file_record.to_details("/a.mp4")["quality"] == file_details["quality"]
+
+def test_index_matches_loaded_inventory(tmp_path):
+	snapshot_file = str(tmp_path / 'inventory.json')
+	journal_file = str(tmp_path / 'inventory.jsonl')
+	backend = JournalBackend(
+		snapshot_file=snapshot_file,
+		journal_file=journal_file,
+	)
+
+	backend.store([
+		{"hashes": {MD5_A: make_details("/a.jpg", "Low", "low")}},
+		{"hashes": {MD5_B: make_details("/b.jpg", "Medium", "medium")}},
+	])
+	compact_inventory(snapshot_file=snapshot_file, journal_file=journal_file)
+	backend.store([
+		{"hashes": {MD5_A: make_details("/c.jpg", "High", "high")}},
+	])
+
+	inventory_index = build_index(backend.iter_entries())
+	backend.close()
+	inventory_dict = load_inventory(snapshot_file=snapshot_file, journal_file=journal_file)
+
+	assert len(inventory_index) == len(inventory_dict["hashes"])
+	for file_hash, file_record in inventory_index:
+		expected_details = inventory_dict["hashes"][file_hash]
+		file_details = file_record.to_details()
+
+		assert sorted(file_record.paths) == sorted(
+			expected_details["file"]["path"]
+			if isinstance(expected_details["file"]["path"], list)
+			else [expected_details["file"]["path"]]
+		)
+		assert file_details["hash"] == expected_details["hash"]
+		assert file_details["date"] == expected_details["date"]
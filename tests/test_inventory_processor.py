@@ -0,0 +1,78 @@
+import json
+
+from inventory_processor import (
+	JournalBackend,
+	load_inventory,
+)
+
+# FUNCTIONS
+def make_entry(
+		file_hash:str,
+		file_path:str,
+) -> dict:
+	return {
+		"hashes": {
+			file_hash: {
+				"file": {
+					"path": file_path,
+					"bytes": 1,
+				},
+			},
+		},
+	}
+
+def make_backend(tmp_path) -> JournalBackend:
+	return JournalBackend(
+		snapshot_file=str(tmp_path / 'inventory.json'),
+		journal_file=str(tmp_path / 'inventory.jsonl'),
+	)
+
+# TESTS
+def test_journal_merges_paths_of_a_content(tmp_path):
+	backend = make_backend(tmp_path)
+	backend.store(entries=[
+		make_entry("abc", "/a"),
+		make_entry("abc", "/b"),
+		make_entry("abc", "/a"),
+		make_entry("def", "/c"),
+	])
+
+	inventory_dict = load_inventory(
+		snapshot_file=backend.snapshot_file,
+		journal_file=backend.journal_file,
+	)
+
+	assert inventory_dict["hashes"]["abc"]["file"]["path"] == ["/a", "/b"]
+	assert inventory_dict["hashes"]["def"]["file"]["path"] == ["/c"]
+
+def test_remove_paths_keeps_path_lists(tmp_path):
+	backend = make_backend(tmp_path)
+	backend.store(entries=[
+		make_entry("abc", "/a"),
+		make_entry("abc", "/b"),
+		make_entry("def", "/c"),
+	])
+
+	backend.remove_paths({
+		"abc": ["/b"],
+		"def": ["/c"],
+		"missing": ["/d"],
+	})
+
+	assert not (tmp_path / 'inventory.jsonl').exists()
+	snapshot_dict = json.loads((tmp_path / 'inventory.json').read_text())
+	assert snapshot_dict["hashes"] == {
+		"abc": {
+			"file": {
+				"path": ["/a"],
+				"bytes": 1,
+			},
+		},
+	}
+
+	backend.store(entries=[make_entry("abc", "/e")])
+	inventory_dict = load_inventory(
+		snapshot_file=backend.snapshot_file,
+		journal_file=backend.journal_file,
+	)
+	assert inventory_dict["hashes"]["abc"]["file"]["path"] == ["/a", "/e"]
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+from inventory_processor import JournalBackend
+from inventory_query import (
+	InventoryQuery,
+	get_folder_prefix,
+)
+from inventory_sqlite import SqliteBackend
+
+# GLOBAL VARIABLES
+MD5_A = 'a' * 32
+MD5_B = 'b' * 32
+SHA1_A = '1' * 40
+
+# FUNCTIONS
+def make_entry(
+		file_hash:str,
+		file_path:str,
+		digests:dict,
+		date_timestamp:float=None,
+		make:str=None,
+) -> dict:
+	file_details = {
+		"file": {
+			"path": file_path,
+			"name": os.path.splitext(os.path.basename(file_path))[0],
+			"extension": os.path.splitext(file_path)[1].lstrip('.'),
+			"type": "image" if make else "unknown",
+			"bytes": 1,
+		},
+		"hash": digests,
+	}
+	if date_timestamp is not None:
+		file_details["date"] = {
+			"date_type": "CREATION",
+			"date_field": "mtime",
+			"date_confidence": "Medium",
+			"date_timestamp": date_timestamp,
+			"date_human": None,
+		}
+	if make is not None:
+		file_details["quality"] = {
+			"resolution": {
+				"width": 1,
+				"height": 1,
+			},
+			"format": "jpeg",
+			"mode": "RGB",
+		}
+		file_details["device"] = {
+			"Make": make,
+			"Model": "Model 1",
+			"Artist": None,
+		}
+
+	return {
+		"hashes": {
+			file_hash: file_details,
+		},
+	}
+
+INVENTORY_ENTRIES = [
+	make_entry(MD5_A, '/photos/a.jpg', {"md5": MD5_A, "sha1": SHA1_A}, 100.0, ' Canon '),
+	make_entry(MD5_A, '/photos/copy/a.jpg', {"md5": MD5_A, "sha1": SHA1_A}, 100.0, ' Canon '),
+	make_entry(MD5_B, '/photos2/b.txt', {"md5": MD5_B}, 200.0),
+]
+
+# FIXTURES
+@pytest.fixture(params=["journal", "sqlite"])
+def backend(request, tmp_path):
+	if request.param == "journal":
+		backend = JournalBackend(
+			snapshot_file=str(tmp_path / 'inventory.json'),
+			journal_file=str(tmp_path / 'inventory.jsonl'),
+		)
+	else:
+		backend = SqliteBackend(
+			database_file=str(tmp_path / 'inventory.sqlite'),
+		)
+
+	backend.store(entries=INVENTORY_ENTRIES)
+	yield backend
+	backend.close()
+
+# TESTS
+def test_get_folder_prefix():
+	assert get_folder_prefix('/photos') == '/photos' + os.sep
+	assert get_folder_prefix('/photos' + os.sep) == '/photos' + os.sep
+
+def test_lookup_hash_by_any_digest(backend):
+	inventory_query = InventoryQuery(backend=backend)
+	expected_paths = [(MD5_A, '/photos/a.jpg'), (MD5_A, '/photos/copy/a.jpg')]
+
+	assert sorted(inventory_query.lookup_hash(MD5_A)) == expected_paths
+	assert sorted(inventory_query.lookup_hash(SHA1_A.upper())) == expected_paths
+	assert inventory_query.lookup_hash('c' * 32) == []
+	assert inventory_query.lookup_hash('not hex') == []
+
+def test_lookup_hash_uses_built_inventory(backend, monkeypatch):
+	inventory_query = InventoryQuery(backend=backend)
+	assert len(inventory_query.inventory) == 2
+
+	def fail_lookup(digest):
+		raise AssertionError('backend lookup while the inventory is built')
+
+	monkeypatch.setattr(backend, "lookup_digest", fail_lookup)
+
+	assert inventory_query.lookup_hash(SHA1_A) == [
+		(MD5_A, '/photos/a.jpg'),
+		(MD5_A, '/photos/copy/a.jpg'),
+	]
+	assert inventory_query.lookup_hash(MD5_B) == [(MD5_B, '/photos2/b.txt')]
+	assert inventory_query.lookup_hash('c' * 32) == []
+
+def test_select_prefix_excludes_sibling_folders(backend):
+	inventory_query = InventoryQuery(backend=backend)
+
+	assert inventory_query.select(path_prefix='/photos') == [
+		(MD5_A, '/photos/a.jpg'),
+		(MD5_A, '/photos/copy/a.jpg'),
+	]
+	assert inventory_query.select(path_prefix='/photos/copy/') == [
+		(MD5_A, '/photos/copy/a.jpg'),
+	]
+	assert inventory_query.select(path_prefix='/photo') == []
+
+def test_select_filters(backend):
+	inventory_query = InventoryQuery(backend=backend)
+
+	assert inventory_query.select(file_extension='.TXT') == [(MD5_B, '/photos2/b.txt')]
+	assert inventory_query.select(date_from=100.0, date_to=200.0) == [
+		(MD5_A, '/photos/a.jpg'),
+		(MD5_A, '/photos/copy/a.jpg'),
+	]
+	assert inventory_query.select(make='canon', model='MODEL 1', path_prefix='/photos/copy') == [
+		(MD5_A, '/photos/copy/a.jpg'),
+	]
+	assert inventory_query.select(make='nikon') == []
+	assert len(inventory_query.select()) == 3
@@ -0,0 +1,158 @@
+from inventory_sqlite import SqliteBackend
+
+# GLOBAL VARIABLES
+MD5_A = 'a' * 32
+MD5_B = 'b' * 32
+
+# FUNCTIONS
+def make_details(
+		file_path:str,
+		file_type:str="image",
+) -> dict:
+	file_details = {
+		"file": {
+			"bytes": 10,
+			"type": file_type,
+			"path": file_path,
+			"name": "a",
+			"extension": file_path.rsplit('.', 1)[-1],
+		},
+		"hash": {
+			"md5": MD5_A,
+			"sha1": '1' * 40,
+		},
+		"date": {
+			"date_type": "EXIF",
+			"date_field": "DateTimeOriginal",
+			"date_confidence": "High",
+			"date_timestamp": 100.0,
+			"date_human": "1970-01-01 - 00:01:40",
+		},
+	}
+	if file_type == "image":
+		file_details["quality"] = {
+			"resolution": {
+				"width": 640,
+				"height": 480,
+			},
+			"format": "JPEG",
+			"mode": "RGB",
+		}
+		file_details["device"] = {
+			"Make": "Canon",
+			"Model": "EOS",
+			"Artist": None,
+		}
+		file_details["perceptual"] = {
+			"dhash": "ff00",
+		}
+
+	return file_details
+
+# TESTS
+def test_store_and_lookup(tmp_path):
+	backend = SqliteBackend(database_file=str(tmp_path / 'inventory.sqlite'))
+	try:
+		backend.store(entries=[
+			{"hashes": {MD5_A: make_details("/a.jpg")}},
+			{"hashes": {MD5_A: make_details("/b.jpg")}},
+		])
+
+		assert backend.lookup_path("/a.jpg") == {"hashes": {MD5_A: make_details("/a.jpg")}}
+		assert backend.lookup_path("/missing.jpg") is None
+		assert sorted(
+			entry_dict["hashes"][MD5_A]["file"]["path"]
+			for entry_dict in backend.lookup_hash(MD5_A)
+		) == ["/a.jpg", "/b.jpg"]
+		assert backend.lookup_hash(MD5_B) == []
+
+	finally:
+		backend.close()
+
+def test_store_replaces_paths_and_keeps_first_details(tmp_path):
+	backend = SqliteBackend(database_file=str(tmp_path / 'inventory.sqlite'))
+	try:
+		backend.store(entries=[{"hashes": {MD5_A: make_details("/a.jpg")}}])
+
+		moved_details = make_details("/a.jpg")
+		moved_details["date"]["date_human"] = "other"
+		backend.store(entries=[
+			{"hashes": {MD5_B: moved_details}},
+		])
+
+		assert backend.lookup_hash(MD5_A) == []
+		assert backend.lookup_path("/a.jpg")["hashes"][MD5_B]["date"]["date_human"] == "other"
+		assert [
+			list(entry_dict["hashes"])
+			for entry_dict in backend.iter_entries()
+		] == [[MD5_B]]
+
+	finally:
+		backend.close()
+
+def test_lookup_digest_by_key_or_algorithm(tmp_path):
+	backend = SqliteBackend(database_file=str(tmp_path / 'inventory.sqlite'))
+	try:
+		backend.store(entries=[{"hashes": {MD5_A: make_details("/a.jpg", file_type="video")}}])
+
+		assert backend.lookup_digest(MD5_A) == backend.lookup_digest('1' * 40)
+		assert len(backend.lookup_digest(MD5_A)) == 1
+		assert backend.lookup_digest(MD5_B) == []
+		assert backend.connection.execute('SELECT COUNT(*) FROM images').fetchone() == (0,)
+
+	finally:
+		backend.close()
+
+def test_remove_paths(tmp_path):
+	backend = SqliteBackend(database_file=str(tmp_path / 'inventory.sqlite'))
+	try:
+		backend.store(entries=[
+			{"hashes": {MD5_A: make_details("/a.jpg")}},
+			{"hashes": {MD5_A: make_details("/b.jpg")}},
+		])
+		backend.remove_paths({MD5_A: ["/b.jpg"]})
+
+		assert [
+			entry_dict["hashes"][MD5_A]["file"]["path"]
+			for entry_dict in backend.lookup_hashes([MD5_A, MD5_B])
+		] == ["/a.jpg"]
+
+	finally:
+		backend.close()
+
+def test_select_paths_uses_indexes(tmp_path):
+	backend = SqliteBackend(database_file=str(tmp_path / 'inventory.sqlite'))
+	try:
+		backend.store(entries=[
+			{"hashes": {MD5_A: make_details("/photos/a.jpg")}},
+			{"hashes": {MD5_B: make_details("/photos2/b.txt", file_type="unknown")}},
+		])
+
+		assert backend.select_paths(path_prefix="/photos/") == [(MD5_A, "/photos/a.jpg")]
+		assert backend.select_paths(make=" CANON ", model="eos") == [(MD5_A, "/photos/a.jpg")]
+		assert backend.select_paths(date_from=100.0, date_to=101.0, file_extension=".JPG") == [
+			(MD5_A, "/photos/a.jpg"),
+		]
+		assert backend.select_paths(date_to=100.0) == []
+
+		query_plan = backend.connection.execute(
+			'EXPLAIN QUERY PLAN SELECT hash FROM files WHERE extension = ?',
+			("jpg",),
+		).fetchall()
+		assert "files_extension" in str(query_plan)
+
+	finally:
+		backend.close()
+
+def test_database_is_reopened(tmp_path):
+	database_file = str(tmp_path / 'inventory.sqlite')
+	backend = SqliteBackend(database_file=database_file)
+	backend.store(entries=[{"hashes": {MD5_A: make_details("/a.jpg")}}])
+	backend.close()
+
+	backend = SqliteBackend(database_file=database_file)
+	try:
+		assert list(backend.iter_records()) == [{"hashes": {MD5_A: make_details("/a.jpg")}}]
+
+	finally:
+		backend.close()
@@ -0,0 +1,83 @@
+import json
+import queue
+import multiprocessing
+
+import pytest
+
+import inventory_processor
+from inventory_processor import store_inventory
+from inventory_writer import (
+	WriterStats,
+	start_writer,
+	stop_writer,
+	get_acknowledged,
+)
+
+# FUNCTIONS
+def make_entry(
+		file_hash:str,
+		file_path:str,
+		**file_details,
+) -> dict:
+	file_details["file"] = {
+		"path": file_path,
+	}
+
+	return {
+		"hashes": {
+			file_hash: file_details,
+		},
+	}
+
+# TESTS
+def test_writer_skips_records_it_cannot_store(tmp_path, monkeypatch):
+	writer, result_queue, writer_stats = start_writer(
+		backend_name="journal",
+		backend_options={
+			"snapshot_file": str(tmp_path / 'inventory.json'),
+			"journal_file": str(tmp_path / 'inventory.jsonl'),
+		},
+		cache_file=str(tmp_path / 'cache.jsonl'),
+		acknowledge=True,
+	)
+	monkeypatch.setattr(inventory_processor, "result_queue", result_queue)
+	monkeypatch.setattr(inventory_processor, "writer_stats", writer_stats)
+
+	store_inventory(make_entry("good", "/a"), stat_key=(1, 2, 3))
+	store_inventory(make_entry("bad", "/b", unserializable={1, 2}), stat_key=(1, 2, 3))
+
+	acknowledged = list()
+	stop_writer(
+		writer=writer,
+		result_queue=result_queue,
+		acknowledge_function=lambda: acknowledged.extend(get_acknowledged(writer)),
+	)
+
+	assert writer.exitcode == 0
+	assert writer_stats.get("written") == 1
+	assert writer_stats.get("failed") == 1
+	assert acknowledged == [("good", "/a")]
+
+	journal_lines = (tmp_path / 'inventory.jsonl').read_text().splitlines()
+	assert [json.loads(line) for line in journal_lines] == [make_entry("good", "/a")]
+
+	cache_lines = (tmp_path / 'cache.jsonl').read_text().splitlines()
+	assert [json.loads(line)["path"] for line in cache_lines[1:]] == ["/a"]
+
+def test_store_inventory_fails_once_writer_stopped(monkeypatch):
+	result_queue = multiprocessing.Queue(maxsize=1)
+	writer_stats = WriterStats()
+	monkeypatch.setattr(inventory_processor, "result_queue", result_queue)
+	monkeypatch.setattr(inventory_processor, "writer_stats", writer_stats)
+	monkeypatch.setattr(inventory_processor, "RESULT_PUT_TIMEOUT", 0.01)
+
+	store_inventory(make_entry("abc", "/a"))
+	writer_stats.stopped.set()
+
+	with pytest.raises(RuntimeError):
+		store_inventory(make_entry("def", "/b"))
+
+	assert writer_stats.get("backpressure") == 1
+	assert result_queue.get(timeout=1)[0] == make_entry("abc", "/a")
+	with pytest.raises(queue.Empty):
+		result_queue.get(timeout=0.1)
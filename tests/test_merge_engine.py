@@ -0,0 +1,139 @@
+import pytest
+
+from merge_engine import (
+	MergeEngine,
+	compile_policies,
+	merge_union,
+	merge_first,
+	merge_last,
+	merge_max,
+	merge_confidence,
+)
+
+# FUNCTIONS
+def make_record(
+		file_path:str,
+		date_confidence:str=None,
+) -> dict:
+	file_details = {
+		"file": {
+			"path": file_path,
+			"bytes": 10,
+		},
+	}
+	if date_confidence is not None:
+		file_details["date"] = {
+			"date_confidence": date_confidence,
+			"date_human": file_path,
+		}
+
+	return {
+		"hashes": {
+			"abc": file_details,
+		},
+	}
+
+# TESTS
+def test_merge_union():
+	assert merge_union(None, "a") == ["a"]
+	assert merge_union("a", "a") == ["a"]
+	assert merge_union("a", ["b", "a"]) == ["a", "b"]
+	assert merge_union(["a", "b"], ["c"]) == ["a", "b", "c"]
+
+def test_merge_first_and_last():
+	assert merge_first(None, 2) == 2
+	assert merge_first(1, 2) == 1
+	assert merge_last(1, 2) == 2
+	assert merge_last(1, None) == 1
+
+def test_merge_max():
+	assert merge_max(None, 2) == 2
+	assert merge_max(3, None) == 3
+	assert merge_max(3, 5) == 5
+	assert merge_max(5, 3) == 5
+
+def test_merge_confidence():
+	low_date = {"date_confidence": "Low"}
+	high_date = {"date_confidence": "High"}
+	other_high_date = {"date_confidence": "High", "date_human": "other"}
+
+	assert merge_confidence(None, low_date) is low_date
+	assert merge_confidence(low_date, high_date) is high_date
+	assert merge_confidence(high_date, low_date) is high_date
+	assert merge_confidence(high_date, other_high_date) is high_date
+	assert merge_confidence("Medium", "Low") == "Medium"
+
+def test_compile_policies():
+	assert compile_policies({
+		"hashes.*.file.path": "union",
+		"hashes.*.file.bytes": "max",
+	}) == {
+		"hashes": {
+			"*": {
+				"file": {
+					"path": merge_union,
+					"bytes": merge_max,
+				},
+			},
+		},
+	}
+
+def test_compile_policies_rejects_unknown_policy():
+	with pytest.raises(KeyError):
+		compile_policies({"hashes.*.file.path": "newest"})
+
+def test_default_policies():
+	merge_engine = MergeEngine()
+	inventory_dict = dict()
+
+	merge_engine.merge(inventory_dict, make_record("/a", "Low"))
+	merge_engine.merge(inventory_dict, make_record("/b", "High"))
+	merge_engine.merge(inventory_dict, make_record("/a", "Medium"))
+
+	file_details = inventory_dict["hashes"]["abc"]
+	assert file_details["file"] == {
+		"path": ["/a", "/b"],
+		"bytes": 10,
+	}
+	assert file_details["date"] == {
+		"date_confidence": "High",
+		"date_human": "/b",
+	}
+
+def test_fields_without_policy_keep_first_value():
+	merge_engine = MergeEngine(policies=dict())
+	inventory_dict = dict()
+
+	merge_engine.merge(inventory_dict, make_record("/a"))
+	merge_engine.merge(inventory_dict, make_record("/b"))
+
+	assert inventory_dict["hashes"]["abc"]["file"]["path"] == "/a"
+
+def test_explicit_key_overrides_wildcard():
+	merge_engine = MergeEngine(policies={
+		"hashes.*.file.path": "union",
+		"hashes.abc.file.path": "last",
+		"hashes.*.file.bytes": "max",
+	})
+	inventory_dict = {
+		"hashes": {
+			"abc": {"file": {"path": "/a", "bytes": 10}},
+			"def": {"file": {"path": "/c", "bytes": 10}},
+		},
+	}
+
+	merge_engine.merge(inventory_dict, {
+		"hashes": {
+			"abc": {"file": {"path": "/b"}},
+			"def": {"file": {"path": "/d", "bytes": 20}},
+		},
+	})
+
+	assert inventory_dict["hashes"]["abc"]["file"] == {"path": "/b", "bytes": 10}
+	assert inventory_dict["hashes"]["def"]["file"] == {"path": ["/c", "/d"], "bytes": 20}
+
+def test_new_record_is_merged_through_policies():
+	merge_engine = MergeEngine()
+	inventory_dict = merge_engine.merge(dict(), make_record("/a"))
+
+	assert inventory_dict["hashes"]["abc"]["file"]["path"] == ["/a"]
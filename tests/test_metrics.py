@@ -0,0 +1,110 @@
+import time
+import threading
+import http.server
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import (
+	LATENCY_BUCKETS,
+	CrawlMetrics,
+	MetricsRequestHandler,
+	add_metric,
+	instrument,
+)
+
+# FIXTURES
+@pytest.fixture
+def crawl_metrics(monkeypatch):
+	metrics_object = CrawlMetrics()
+	monkeypatch.setattr(metrics, "crawl_metrics", metrics_object)
+
+	return metrics_object
+
+# TESTS
+def test_observe_fills_latency_buckets():
+	metrics_object = CrawlMetrics()
+	metrics_object.observe("process_folder", 0.002)
+	metrics_object.observe("process_folder", 0.005)
+	metrics_object.observe("process_folder", 120.0, failed=True)
+
+	stage_dict = metrics_object.snapshot()["stages"]["process_folder"]
+	assert stage_dict["buckets"][1] == 2
+	assert stage_dict["buckets"][len(LATENCY_BUCKETS)] == 1
+	assert stage_dict["count"] == 3
+	assert stage_dict["errors"] == 1
+	assert stage_dict["seconds"] == pytest.approx(120.007)
+
+def test_instrument_records_latency_and_failures(crawl_metrics):
+	@instrument("store_batch")
+	def store(value):
+		if value is None:
+			raise ValueError(value)
+		return value
+
+	assert store(1) == 1
+	with pytest.raises(ValueError):
+		store(None)
+
+	stage_dict = crawl_metrics.snapshot()["stages"]["store_batch"]
+	assert stage_dict["count"] == 2
+	assert stage_dict["errors"] == 1
+	assert store.__name__ == "store"
+
+def test_instrument_without_metrics(monkeypatch):
+	monkeypatch.setattr(metrics, "crawl_metrics", None)
+
+	@instrument("store_batch")
+	def store(value):
+		return value
+
+	assert store(2) == 2
+	add_metric("files_done")
+
+def test_progress(crawl_metrics):
+	add_metric("files_discovered", 4)
+	add_metric("bytes_discovered", 400)
+	add_metric("files_done", 2)
+	add_metric("bytes_done", 100)
+	crawl_metrics.set_walk_done()
+	crawl_metrics.start_time = time.time() - 100
+
+	progress_dict = crawl_metrics.get_progress()
+	assert progress_dict["files_done"] == 2
+	assert progress_dict["bytes_discovered"] == 400
+	assert progress_dict["walk_done"]
+	assert progress_dict["files_per_second"] == pytest.approx(0.02, rel=0.01)
+	assert progress_dict["eta_seconds"] == pytest.approx(300, rel=0.01)
+
+def test_render_prometheus_cumulates_buckets():
+	metrics_object = CrawlMetrics()
+	metrics_object.observe("get_file_settings", 0.0005)
+	metrics_object.observe("get_file_settings", 0.5)
+	metrics_object.add("files_done", 3)
+
+	metrics_lines = metrics_object.render_prometheus().splitlines()
+	assert 'disk_crawler_stage_seconds_bucket{stage="get_file_settings",le="0.001"} 1' in metrics_lines
+	assert 'disk_crawler_stage_seconds_bucket{stage="get_file_settings",le="0.1"} 1' in metrics_lines
+	assert 'disk_crawler_stage_seconds_bucket{stage="get_file_settings",le="0.5"} 2' in metrics_lines
+	assert 'disk_crawler_stage_seconds_bucket{stage="get_file_settings",le="+Inf"} 2' in metrics_lines
+	assert 'disk_crawler_stage_seconds_count{stage="get_file_settings"} 2' in metrics_lines
+	assert 'disk_crawler_files_done_total 3' in metrics_lines
+
+def test_metrics_endpoint(crawl_metrics):
+	metrics_server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MetricsRequestHandler)
+	threading.Thread(target=metrics_server.serve_forever, daemon=True).start()
+	metrics_url = f'http://127.0.0.1:{metrics_server.server_address[1]}'
+
+	try:
+		with urllib.request.urlopen(metrics_url + '/metrics') as response:
+			assert response.status == 200
+			assert response.read().decode('utf8') == crawl_metrics.render_prometheus()
+
+		with pytest.raises(urllib.error.HTTPError):
+			urllib.request.urlopen(metrics_url + '/other')
+
+	finally:
+		metrics_server.shutdown()
+		metrics_server.server_close()
@@ -0,0 +1,78 @@
+import os
+import copy
+
+import pytest
+
+import processing_settings
+from processing_settings import (
+	read_processing_settings,
+	validate_settings,
+)
+
+# FIXTURES
+@pytest.fixture
+def settings_dict():
+	return copy.deepcopy(read_processing_settings())
+
+# TESTS
+def test_default_settings_are_valid(settings_dict):
+	assert validate_settings(settings_dict) == []
+
+@pytest.mark.parametrize("settings_name, setting_name", [
+	("file_processor", "hash_block_size"),
+	("file_processor", "mmap_threshold"),
+	("file_processor", "image_header_size"),
+	("folder_processor", "walker_count"),
+	("folder_processor", "walker_queue_size"),
+])
+@pytest.mark.parametrize("setting_value", [0, -1, 1.5, "1024", True, None])
+def test_sizes_must_be_positive_integers(settings_dict, settings_name, setting_name, setting_value):
+	settings_dict[settings_name][setting_name] = setting_value
+
+	assert validate_settings(settings_dict) == [
+		f'{settings_name}.{setting_name} must be a positive integer'
+	]
+
+def test_missing_sizes_use_defaults(settings_dict):
+	for setting_name in ("hash_block_size", "mmap_threshold", "image_header_size"):
+		settings_dict["file_processor"].pop(setting_name, None)
+	for setting_name in ("walker_count", "walker_queue_size"):
+		settings_dict["folder_processor"].pop(setting_name, None)
+
+	assert validate_settings(settings_dict) == []
+
+def test_hash_states_and_confidences_are_checked(settings_dict):
+	settings_dict["file_processor"]["hash_algorithms"]["md5"] = "yes"
+	settings_dict["image_processor"]["perceptual_hashes"] = ["dhash"]
+	settings_dict["video_processor"]["date_confidence"]["container"] = {"creation_time": "Sure"}
+
+	problems = validate_settings(settings_dict)
+
+	assert len(problems) == 3
+	assert problems[0].startswith('file_processor.hash_algorithms.md5 must be one of')
+	assert problems[1] == 'image_processor.perceptual_hashes must be a mapping'
+	assert problems[2].startswith('video_processor.date_confidence.container.creation_time must be one of')
+
+def test_extension_listed_twice_is_rejected(settings_dict):
+	file_extensions = settings_dict["folder_processor"]["file_extensions"]
+	file_extensions["video"].append('JPG')
+
+	assert validate_settings(settings_dict) == [
+		'folder_processor.file_extensions lists "JPG" for both "image" and "video"'
+	]
+
+def test_invalid_settings_are_not_loaded(settings_dict, monkeypatch):
+	settings_dict["folder_processor"]["walker_count"] = 0
+	monkeypatch.setattr(processing_settings, "raw_settings", None)
+	monkeypatch.setattr(
+		processing_settings,
+		"read_settings",
+		lambda settings_file, logger_object: settings_dict[
+			os.path.splitext(os.path.basename(settings_file))[0]
+		],
+	)
+
+	with pytest.raises(ValueError, match='Invalid processing settings: folder_processor.walker_count'):
+		read_processing_settings()
+
+	assert processing_settings.raw_settings is None
@@ -0,0 +1,52 @@
+import random
+
+from similarity_processor import BKTree
+
+# FUNCTIONS
+def search_linear(
+		values:list,
+		value:int,
+		max_distance:int,
+) -> list:
+	return sorted(
+		((stored_value ^ value).bit_count(), stored_value)
+		for stored_value in values
+		if (stored_value ^ value).bit_count() <= max_distance
+	)
+
+# TESTS
+def test_search_empty_tree():
+	bk_tree = BKTree()
+
+	assert bk_tree.search(0b1010, 4) == []
+	assert len(bk_tree) == 0
+
+def test_search_radius_is_inclusive():
+	bk_tree = BKTree()
+	for value in (0b0000, 0b0001, 0b0011, 0b0111, 0b1111):
+		bk_tree.add(value)
+
+	assert sorted(bk_tree.search(0b0000, 0)) == [(0, 0b0000)]
+	assert sorted(bk_tree.search(0b0000, 2)) == [(0, 0b0000), (1, 0b0001), (2, 0b0011)]
+	assert sorted(bk_tree.search(0b1111, 1)) == [(0, 0b1111), (1, 0b0111)]
+	assert len(bk_tree) == 5
+
+def test_search_keeps_duplicate_values():
+	bk_tree = BKTree()
+	bk_tree.add(0b1100)
+	bk_tree.add(0b1100)
+
+	assert bk_tree.search(0b1100, 0) == [(0, 0b1100), (0, 0b1100)]
+
+def test_search_matches_linear_scan():
+	random_generator = random.Random(0)
+	values = [random_generator.getrandbits(64) for _ in range(500)]
+	values.extend(value ^ (1 << random_generator.randrange(64)) for value in values[:100])
+
+	bk_tree = BKTree()
+	for value in values:
+		bk_tree.add(value)
+
+	for value in values[::25] + [random_generator.getrandbits(64) for _ in range(10)]:
+		for max_distance in (0, 1, 6, 24):
+			assert sorted(bk_tree.search(value, max_distance)) == search_linear(values, value, max_distance)
@@ -0,0 +1,282 @@
+import io
+import struct
+
+from video_processor import (
+    MP4_EPOCH_OFFSET,
+    MATROSKA_EPOCH_OFFSET,
+    iter_mp4_boxes,
+    find_mp4_moov,
+    parse_mp4,
+    read_ebml_vint,
+    iter_ebml_elements,
+    parse_matroska,
+    get_video_settings,
+)
+from inventory_sqlite import SqliteBackend
+
+# FUNCTIONS
+def make_box(
+    box_type: bytes,
+    box_payload: bytes,
+) -> bytes:
+    return struct.pack('>I4s', 8 + len(box_payload), box_type) + box_payload
+
+def make_full_box(
+    box_type: bytes,
+    box_payload: bytes,
+    version: int = 0,
+) -> bytes:
+    return make_box(box_type, bytes([version, 0, 0, 0]) + box_payload)
+
+def make_mp4_track(
+    handler: bytes,
+    codec: bytes,
+    header_payload: bytes,
+) -> bytes:
+    handler_box = make_full_box(b'hdlr', b'\x00' * 4 + handler + b'\x00' * 13)
+    sample_box = make_full_box(b'stsd', struct.pack('>I', 1) + make_box(codec, b'\x00' * 8))
+
+    return make_box(b'trak', make_full_box(b'tkhd', header_payload) + make_box(
+        b'mdia',
+        handler_box + make_box(b'minf', make_box(b'stbl', sample_box)),
+    ))
+
+def make_mp4(
+    creation_time: int = 1600000000,
+) -> bytes:
+    movie_header = make_full_box(b'mvhd', struct.pack(
+        '>IIII',
+        creation_time + MP4_EPOCH_OFFSET,
+        0,
+        1000,
+        12500,
+    ) + b'\x00' * 80)
+    video_track = make_mp4_track(
+        handler=b'vide',
+        codec=b'avc1',
+        header_payload=b'\x00' * 72 + struct.pack('>II', 1920 << 16, 1080 << 16),
+    )
+    audio_track = make_mp4_track(
+        handler=b'soun',
+        codec=b'mp4a',
+        header_payload=b'\x00' * 80,
+    )
+
+    return (
+        make_box(b'ftyp', b'isom\x00\x00\x00\x00')
+        + make_box(b'mdat', b'\x00' * 4096)
+        + make_box(b'moov', movie_header + video_track + audio_track)
+    )
+
+def make_ebml_size(
+    data_size: int,
+) -> bytes:
+    if data_size < 0x7F:
+        return bytes([0x80 | data_size])
+
+    return (0x10000000 | data_size).to_bytes(4, 'big')
+
+def make_element(
+    element_id: int,
+    element_data: bytes,
+) -> bytes:
+    return (
+        element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+        + make_ebml_size(len(element_data))
+        + element_data
+    )
+
+def make_matroska_tracks() -> bytes:
+    video_settings = make_element(0xE0, (
+        make_element(0xB0, (640).to_bytes(2, 'big'))
+        + make_element(0xBA, (480).to_bytes(2, 'big'))
+    ))
+
+    return make_element(0x1654AE6B, (
+        make_element(0xAE, make_element(0x83, b'\x01') + make_element(0x86, b'V_VP9') + video_settings)
+        + make_element(0xAE, make_element(0x83, b'\x02') + make_element(0x86, b'A_OPUS'))
+    ))
+
+def make_matroska_info() -> bytes:
+    return make_element(0x1549A966, (
+        make_element(0x2AD7B1, (1000000).to_bytes(3, 'big'))
+        + make_element(0x4489, struct.pack('>d', 5000.0))
+        + make_element(0x4461, (600000000 * 10 ** 9).to_bytes(8, 'big'))
+    ))
+
+def parse_bytes(
+    parser,
+    file_data: bytes,
+) -> dict:
+    return parser(io.BytesIO(file_data), len(file_data))
+
+# TESTS
+def test_iter_mp4_boxes_handles_extended_and_open_sizes():
+    box_data = (
+        make_box(b'free', b'abc')
+        + struct.pack('>I4sQ', 1, b'wide', 20) + b'\x01\x02\x03\x04'
+        + struct.pack('>I4s', 0, b'mdat') + b'rest'
+    )
+
+    assert list(iter_mp4_boxes(box_data)) == [
+        (b'free', b'abc'),
+        (b'wide', b'\x01\x02\x03\x04'),
+        (b'mdat', b'rest'),
+    ]
+
+def test_iter_mp4_boxes_stops_on_truncated_size():
+    box_data = make_box(b'free', b'abc') + struct.pack('>I4s', 4, b'bad!')
+
+    assert list(iter_mp4_boxes(box_data)) == [(b'free', b'abc')]
+
+def test_find_mp4_moov_seeks_over_media_data():
+    file_data = make_mp4()
+    moov_data = find_mp4_moov(io.BytesIO(file_data), len(file_data))
+
+    assert moov_data is not None
+    assert [box_type for box_type, _ in iter_mp4_boxes(moov_data)] == [b'mvhd', b'trak', b'trak']
+
+def test_find_mp4_moov_without_movie_box():
+    file_data = make_box(b'ftyp', b'isom') + make_box(b'mdat', b'\x00' * 16)
+
+    assert find_mp4_moov(io.BytesIO(file_data), len(file_data)) is None
+
+def test_parse_mp4():
+    video_dict = parse_bytes(parse_mp4, make_mp4())
+
+    assert video_dict == {
+        "format": "mp4",
+        "codec": {
+            "video": "avc1",
+            "audio": "mp4a",
+        },
+        "creation_time": 1600000000,
+        "duration": 12.5,
+        "resolution": {
+            "width": 1920,
+            "height": 1080,
+        },
+    }
+
+def test_parse_mp4_version_1_movie_header():
+    movie_header = make_full_box(b'mvhd', struct.pack(
+        '>QQIQ',
+        1600000000 + MP4_EPOCH_OFFSET,
+        0,
+        600,
+        1200,
+    ), version=1)
+    video_dict = parse_bytes(parse_mp4, make_box(b'moov', movie_header))
+
+    assert video_dict["creation_time"] == 1600000000
+    assert video_dict["duration"] == 2
+
+def test_read_ebml_vint():
+    assert read_ebml_vint(io.BytesIO(b'\x81')) == (1, 1)
+    assert read_ebml_vint(io.BytesIO(b'\x40\x02')) == (2, 2)
+    assert read_ebml_vint(io.BytesIO(b'\x1a\x45\xdf\xa3'), keep_marker=True) == (0x1A45DFA3, 4)
+    assert read_ebml_vint(io.BytesIO(b'')) == (None, 0)
+    assert read_ebml_vint(io.BytesIO(b'\x00')) == (None, 0)
+
+def test_iter_ebml_elements_seeks_over_data():
+    element_data = make_element(0x4282, b'webm') + make_element(0x4287, b'\x04')
+    file_descriptor = io.BytesIO(element_data)
+
+    assert list(iter_ebml_elements(file_descriptor, len(element_data))) == [
+        (0x4282, 3, 4),
+        (0x4287, 10, 1),
+    ]
+
+def test_iter_ebml_elements_stops_on_unknown_size():
+    element_data = b'\x18\x53\x80\x67\xff' + make_element(0x4282, b'webm')
+    file_descriptor = io.BytesIO(element_data)
+
+    assert list(iter_ebml_elements(file_descriptor, len(element_data))) == [
+        (0x18538067, 5, None),
+    ]
+
+def test_parse_matroska():
+    file_data = (
+        make_element(0x1A45DFA3, make_element(0x4282, b'webm'))
+        + make_element(0x18538067, make_matroska_info() + make_matroska_tracks())
+    )
+    video_dict = parse_bytes(parse_matroska, file_data)
+
+    assert video_dict == {
+        "format": "webm",
+        "codec": {
+            "video": "V_VP9",
+            "audio": "A_OPUS",
+        },
+        "duration": 5,
+        "creation_time": 600000000 + MATROSKA_EPOCH_OFFSET,
+        "resolution": {
+            "width": 640,
+            "height": 480,
+        },
+    }
+
+def test_parse_matroska_follows_seek_head_over_clusters():
+    cluster = make_element(0x1F43B675, b'\x00' * 4096)
+
+    def make_seek_head(tracks_position):
+        return make_element(0x114D9B74, make_element(0x4DBB, (
+            make_element(0x53AB, (0x1654AE6B).to_bytes(4, 'big'))
+            + make_element(0x53AC, tracks_position.to_bytes(4, 'big'))
+        )))
+
+    segment_tail = make_matroska_info() + cluster
+    tracks_position = len(make_seek_head(0)) + len(segment_tail)
+    file_data = (
+        make_element(0x1A45DFA3, make_element(0x4282, b'matroska'))
+        + make_element(0x18538067, make_seek_head(tracks_position) + segment_tail + make_matroska_tracks())
+    )
+    video_dict = parse_bytes(parse_matroska, file_data)
+
+    assert video_dict["format"] == "matroska"
+    assert video_dict["duration"] == 5
+    assert video_dict["resolution"] == {"width": 640, "height": 480}
+
+def test_parse_matroska_unknown_segment_size():
+    file_data = (
+        make_element(0x1A45DFA3, make_element(0x4282, b'matroska'))
+        + b'\x18\x53\x80\x67\x01\xff\xff\xff\xff\xff\xff\xff'
+        + make_matroska_info()
+        + make_matroska_tracks()
+        + b'\x1f\x43\xb6\x75\x01\xff\xff\xff\xff\xff\xff\xff'
+        + b'\x00' * 64
+    )
+    video_dict = parse_bytes(parse_matroska, file_data)
+
+    assert video_dict["codec"] == {"video": "V_VP9", "audio": "A_OPUS"}
+    assert video_dict["duration"] == 5
+
+def test_truncated_container_is_stored(tmp_path):
+    video_path = tmp_path / 'truncated.mp4'
+    video_path.write_bytes(make_box(b'ftyp', b'isom\x00\x00\x00\x00') + make_box(b'mdat', b'\x00' * 64)[:32])
+
+    file_details = {
+        "file": {
+            "bytes": video_path.stat().st_size,
+            "type": "video",
+            "path": str(video_path),
+            "name": "truncated",
+            "extension": "mp4",
+        },
+    }
+    file_details.update(get_video_settings(str(video_path)))
+
+    assert file_details["quality"] == {
+        "format": "mp4",
+        "codec": dict(),
+    }
+
+    backend = SqliteBackend(database_file=str(tmp_path / 'inventory.sqlite'))
+    try:
+        backend.store(entries=[{"hashes": {"abc": file_details}}])
+
+        assert backend.lookup_path(str(video_path))["hashes"]["abc"]["file"]["type"] == "video"
+        assert backend.connection.execute('SELECT COUNT(*) FROM images').fetchone() == (0,)
+
+    finally:
+        backend.close()